@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+"""
+Benchmark of the verbose and of the logs of one C-STORE response in quiet mode
+
+Usage: python scripts/bench_quiet_verbose.py [number of C-STORE]
+"""
+import logging
+import sys
+import time
+
+from pydicom.dataset import Dataset
+
+from sphere.logs.verbose import Verbose
+from sphere.utilities.log_tools import log_dataset
+
+# Number of times the C-STORE are repeated (the best time is kept)
+REPEAT = 5
+
+
+def cstore_verbose(verbose, log, ds):
+    """ The verbose and the logs of one cstore_response"""
+    dict_verbose = verbose.init_verbose(context=None, **{
+        'action': 'CSTORE', 'service': 'SCP',
+        'log': 'Start cstore_response', 'aec': 'PACS1'})
+    log_dataset(log, ds)
+    if verbose.verbose_enabled(dict_verbose):
+        verbose.create_verbose(dict_verbose, **{
+            'study_uid': ds.StudyInstanceUID, 'log': 'Get dicom'})
+    for msg in ('Check Association', 'Start create FS Access',
+                'Start store', 'End store'):
+        verbose.create_verbose(dict_verbose, **{'log': msg})
+    verbose.create_verbose(dict_verbose, **{'final_status': 0x0000})
+
+
+def main(number=10000):
+    """
+    Print the best time of the verbose of one C-STORE in quiet mode
+
+    :param number: The number of C-STORE of each repeat
+    :type number: int, optional
+    """
+    verbose = Verbose(ae=None)
+    verbose.console_verbose = 0
+    log = logging.getLogger('quiet')
+    log.setLevel(logging.INFO)
+    ds = Dataset()  # pylint: disable=invalid-name
+    ds.StudyInstanceUID = '1.2.3'
+    ds.SeriesInstanceUID = '1.2.3.4'
+    ds.SOPInstanceUID = '1.2.3.4.5'
+    best = None
+    for _repeat in range(REPEAT):
+        start = time.perf_counter()
+        for _image in range(number):
+            cstore_verbose(verbose, log, ds)
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    print("Verbose of one C-STORE in quiet mode: %.1f us" % (best * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
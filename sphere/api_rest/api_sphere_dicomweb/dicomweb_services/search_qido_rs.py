@@ -10,12 +10,17 @@ sys.path.insert(0, BASE_DIR)
 
 
 from sphere.dicmeta.database_pacs import DatabasePACS
+from sphere.dicmeta.requests.filter_compiler import compile_filter
+from sphere.dicmeta.requests.query_planner import QueryPlanner
 from sphere.api_rest.api_sphere_dicomweb.utils import return_list_uid, \
     filter_dataset, get_group_element_number
 from sphere.api_rest.api_sphere_dicomweb.metadata_tags_configuration import \
-    get_filter_columns, QS_FILTERS, parse_metadata_configuration
+    QS_FILTERS, parse_metadata_configuration
 from sphere.logs.logs import LOG_API_DICOMWEB
 
+# The levels of the metadata configuration, from the parent to the children
+MODEL_NAMES = ('Patient', 'Study', 'Series', 'Instance')
+
 
 class SearchOrmSqlalchemy:
     """ Search with ORM SqlAlchemy:
@@ -28,6 +33,7 @@ class SearchOrmSqlalchemy:
     def __init__(self, session):
         self.db_pacs = DatabasePACS()
         self.session = session
+        self.planner = QueryPlanner(self.db_pacs)
         file_storage_metadata_model = self.db_pacs.FileStorageMetadataDicomModel()
         self.table_fsm = file_storage_metadata_model.table_full_name()
 
@@ -54,10 +60,8 @@ class SearchOrmSqlalchemy:
         """
         list_path = False
         if filters:
-            filters = self.get_filter_patient_id(filters)
-            columns_filters = get_filter_columns(filters, 'Instance')
-            result = self.request_filter_like(
-                self.db_pacs.FileStorageMetadataDicomModel, columns_filters).all()[offset:offset + limit]
+            result = self.request_levels('Instance', filters).offset(
+                offset).limit(limit).all()
         else:
             result = self.session.query(
                 self.db_pacs.FileStorageMetadataDicomModel.filePath).all()[
@@ -91,11 +95,9 @@ class SearchOrmSqlalchemy:
         """
         list_path = False
         if filters:
-            filters = self.get_filter_patient_id(filters)
-            filters['StudyInstanceUID'] = study_uid
-            columns_filters = get_filter_columns(filters, 'Instance')
-            result = self.request_filter_like(
-                self.db_pacs.FileStorageMetadataDicomModel, columns_filters).all()[offset:offset + limit]
+            result = self.request_levels('Instance', dict(
+                filters, StudyInstanceUID=study_uid)).offset(
+                    offset).limit(limit).all()
         else:
             result = self.session.query(
                 self.db_pacs.FileStorageMetadataDicomModel.filePath).filter(
@@ -131,12 +133,10 @@ class SearchOrmSqlalchemy:
         """
         list_path = False
         if filters:
-            filters = self.get_filter_patient_id(filters)
-            filters['StudyInstanceUID'] = study_uid
-            filters['SeriesInstanceUID'] = series_uid
-            columns_filters = get_filter_columns(filters, 'Instance')
-            result = self.request_filter_like(
-                self.db_pacs.FileStorageMetadataDicomModel, columns_filters).all()[offset:offset + limit]
+            result = self.request_levels('Instance', dict(
+                filters, StudyInstanceUID=study_uid,
+                SeriesInstanceUID=series_uid)).offset(
+                    offset).limit(limit).all()
         else:
             result = self.session.query(
                 self.db_pacs.FileStorageMetadataDicomModel.filePath).filter(
@@ -169,10 +169,7 @@ class SearchOrmSqlalchemy:
         :rtype: list
         """
         if filters:
-            filters = self.get_filter_patient_id(filters)
-            columns_filters = get_filter_columns(filters, 'Series')
-            result = self.request_filter_like(
-                self.db_pacs.SeriesModel, columns_filters).all()
+            result = self.request_levels('Series', filters).all()
 
             list_series_uid = self.get_list_uid(result, "series")
         else:
@@ -210,10 +207,8 @@ class SearchOrmSqlalchemy:
         :rtype: list
         """
         if filters:
-            filters = self.get_filter_patient_id(filters)
-            filters['StudyInstanceUID'] = study_uid
-            columns_filters = get_filter_columns(filters, 'Instance')
-            result = self.request_filter_like(self.db_pacs.SeriesModel, columns_filters).all()
+            result = self.request_levels('Series', dict(
+                filters, StudyInstanceUID=study_uid)).all()
         else:
             result = self.session.query(
                 self.db_pacs.SeriesModel).filter(
@@ -250,9 +245,7 @@ class SearchOrmSqlalchemy:
         :rtype: list
         """
         if filters:
-            filters = self.get_filter_patient_id(filters)
-            columns_filters = get_filter_columns(filters, 'Study')
-            result = self.request_filter_like(self.db_pacs.StudyModel, columns_filters).all()
+            result = self.request_levels('Study', filters).all()
         else:
             result = self.session.query(self.db_pacs.StudyModel.studyUID).all()
 
@@ -290,101 +283,45 @@ class SearchOrmSqlalchemy:
         :return: The query
         :rtype: :py:class:`sqlalchemy.orm.query.Query`
         """
-        list_del_key = []
-        list_string = []
-
-        for key, value in dict_filter.items():
-            print(key, value)
-            if "*" in value or isinstance(value, list) or \
-                    ('-' in value and key in ["dateStudy", "dateSeries"]):
-                if "*" in value:  # Implement the ``like`` operator
-                    search = value.replace('*', '%')
-                    string = "model." + key + ".like('" + search + "')"
-                elif isinstance(value, list):  # Implement the ``in_`` operator
-                    string = "model." + key + ".in_(" + str(value) + ")"
-                else:  # Implement the ``between`` operator
-                    date = value.split('-')
-                    string = "model." + key + ".between ('" \
-                             + str(date[0]) + "', '" + str(date[1]) + "')"
-
-                list_string.append(string)
-                list_del_key.append(key)
-        # remove the keys where we have filters ``like`` or ``in_``
-        for key in list(set(list_del_key)):
-            del dict_filter[key]
-
-        query_filter = "self.session.query(model).filter_by(**dict_filter).filter("
-        for st in list_string:
-            query_filter = query_filter + st + ","
-        query_filter = query_filter + ").distinct()"
-
-        sqlalchemy_orm_query = eval(query_filter)
-        return sqlalchemy_orm_query
-
-    def get_filter_patient_id(self, filters):
-        """
-        Get filter of patient_id
+        return self.session.query(model).filter(
+            *compile_filter(model, dict_filter)).distinct()
 
-        :param filters: column filters
-        :type filters: dict
-        :return: the filter patient_id
-        :rtype: dict
+    def request_levels(self, level, filters):
         """
-        filter_by_model = self.get_filter_by_model(filters)
-        for model, filter_m in filter_by_model.items():
-            if model == "Patient":
-                result = self.get_result_query('Patient', filter_m, self.db_pacs.PatientModel)
-            elif model == "Study":
-                result = self.get_result_query('Study', filter_m, self.db_pacs.StudyModel)
-            elif model == "Series":
-                result = self.get_result_query('Series', filter_m, self.db_pacs.SeriesModel)
-            else:  # model == "Instance"
-                result = self.get_result_query('Instance', filter_m, self.db_pacs.FileStorageMetadataDicomModel)
-            if 'PatientID' in filters:
-                list_patient_uid = self.get_list_uid(result, "patient")
-                patient_uid = filters['PatientID']
-                if isinstance(patient_uid, str):
-                    patient_uid = [patient_uid]
-
-                set_patient_uid = set(list_patient_uid) & set(patient_uid)
-                filters.clear()
-                filters['PatientID'] = list(set_patient_uid)
-            else:
-                filters.clear()
-                filters['PatientID'] = self.get_list_uid(result, "patient")
+        Create request of a level with the filters on the attributes of all
+        the levels, as one query
 
-        return filters
+        :param level: The level
 
-    @staticmethod
-    def get_filter_by_model(filters):
-        """
-        get filter by model
+            The possible value:
+                - ``Patient``
+                - ``Study``
+                - ``Series``
+                - ``Instance``
 
-        :param filters: List of filters
-        :type filters:dict
-        :return:filter by model
-        :rtype:dict
+        :type level: str
+        :param filters: Search filter criteria as key-value pairs, where
+            *key* is a keyword or a tag of the attribute
+        :type filters: dict
+        :return: The query
+        :rtype: :py:class:`sqlalchemy.orm.query.Query`
         """
-        _a, _b, keyword_by_model, tag_by_model = parse_metadata_configuration()
-        filter_by_model = {}
+        by_tag, by_keyword, _a, _b = parse_metadata_configuration()
+        filters_by_level = {}
         for key, value in filters.items():
-            if key in keyword_by_model:
-                model = keyword_by_model[key]
-            elif key in tag_by_model:
-                model = tag_by_model[key]
+            # The attribute of the level itself, else of the first level
+            for model_name in (level,) + MODEL_NAMES:
+                metadata = by_keyword[model_name].get(key) or \
+                    by_tag[model_name].get(key)
+                if metadata:
+                    filters_by_level.setdefault(model_name.lower(), {})[
+                        metadata['column']] = value
+                    break
             else:
-                list_keyword_tag = list(keyword_by_model) + list(tag_by_model)
-                print("This keyword or tag '{}' does not exists in {}".format(
-                    key, list_keyword_tag))
-                model = ""
-            if model:
-                if model in filter_by_model:
-                    filter_by_model[model] = {**filter_by_model[model],
-                                              **{key: value}}
-                else:
-                    filter_by_model[model] = {key: value}
-
-        return filter_by_model
+                LOG_API_DICOMWEB.warning(
+                    "This keyword or tag '%s' can not be searched", key)
+        return self.planner.query(self.session, level.lower(),
+                                  filters_by_level)
 
     @staticmethod
     def get_list_uid(result, level):
@@ -418,36 +355,6 @@ class SearchOrmSqlalchemy:
 
         return list_uid
 
-    def get_result_query(self, table, filter_m, model):
-        """
-        Get result of query
-
-        :param table: The table name
-
-            The possible value:
-                    - ``Patient``
-                    - ``Study``
-                    - ``Series``
-                    - ``Instance``
-        :type table: str
-        :param filter_m: The filter
-        :type filter_m: dict
-        :param model: The model
-
-            The possible value:
-                - ``sphere.dicmeta.models.dicom_models.patient_model.PatientModel``
-                - ``sphere.dicmeta.models.dicom_models.study_model.StudyModel``
-                - ``sphere.dicmeta.models.dicom_models.series_model.SeriesModel``
-                - ``sphere.dicmeta.models.dicom_models.file_storage_metadata_model.FileStorageMetadataDicomModel``
-
-        :type model: :py:class:`sqlalchemy.ext.declarative.api.DeclarativeMeta`
-        :return: The result of query
-        :rtype:list
-        """
-        columns_filters = get_filter_columns(filter_m, table)
-        result = self.request_filter_like(model, columns_filters).all()
-        return result
-
     def dataset_list(self, result, level, includefield="all", list_path=False):
         """
         Get metadata of dataset for study, series and instance
@@ -9,7 +9,8 @@ from sphere.utilities.string_tools import upper_first_letter, replace_id_uid
 from sphere.dicmeta.requests.patient_request import PatientRequest
 from sphere.dicmeta.requests.study_request import StudyRequest
 from sphere.dicmeta.requests.series_request import SeriesRequest
-from sphere.dicmeta.requests.file_storage_metadata_request import FileStorageMetadataDicomRequest
+from sphere.dicmeta.requests.file_storage_metadata_request import (
+    FileStorageMetadataDicomRequest, UID_CHUNK_SIZE)
 
 
 class CommandDatabase:
@@ -185,7 +186,11 @@ class CommandDatabase:
 
     def execute_check(self):
         """ Execute check"""
-        data = self.check_value({id: self.check(id) for id in read_file_return_list(self.list_filepath)})
+        list_id = read_file_return_list(self.list_filepath)
+        if self.mode == 'diff':
+            data = self.check_missing(list_id)
+        else:
+            data = self.check_value({id: self.check(id) for id in list_id})
         if self.output_filepath is not None:
             file = open(self.output_filepath, 'w')
             data.append('')
@@ -216,6 +221,26 @@ class CommandDatabase:
                     list_id.append(value)
         return list_id
 
+    def check_missing(self, list_id, chunk_size=UID_CHUNK_SIZE):
+        """
+        Return the ids not in the table, with one query for each chunk of ids
+
+        :param list_id: The list of ids
+        :type list_id: list [str]
+        :param chunk_size: Number of ids in each query
+        :type chunk_size: int, optional
+        :return: The list of the ids not found
+        :rtype: list [str]
+        """
+        req_class = eval(upper_first_letter(self.concept)+'Request(self.db)')
+        list_id = list(dict.fromkeys(list_id))
+        missing = []
+        for index in range(0, len(list_id), chunk_size):
+            chunk = list_id[index:index + chunk_size]
+            existing = req_class.get_existing_keys(chunk)
+            missing.extend(uid for uid in chunk if uid not in existing)
+        return missing
+
     def check(self, identifier):
         """
         Check if id exists in table and return the data
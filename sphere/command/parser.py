@@ -104,6 +104,10 @@ def cstore_action(kwargs):
             | dicom_path    : The path of the dicom files (required if get_path = fs)
             | context       : The context (optional)
             | many_assoc    : Many or one assoc (True | False) [default: True] (optional)
+            | checkpoint    : The checkpoint file of the instances sent (optional)
+            | resume        : The job to resume (optional)
+            | rate_mb       : Maximum MB sent per second (optional)
+            | rate_images   : Maximum files sent per second (optional)
             | verbose       : The verbose (optional)
 
                 list of possible value of verbose:
@@ -309,7 +313,8 @@ def database_action(kwargs):
             | action    : Type of action, possible value is ``database``
             | db_action : The action
 
-                The possible value: ``create``, ``drop`` or ``clean``
+                The possible value: ``create``, ``drop``, ``clean`` or
+                ``migrate``
 
         Example of kwargs:
             | {
@@ -334,6 +339,9 @@ def database_action(kwargs):
         dbp.drop_tables(f_drop)
     elif action == 'clean':
         dbp.clean_tables(f_drop)
+    elif action == 'migrate':
+        dbp.create_partitions()
+        dbp.create_indexes()
 
 
 def monitor_action(kwargs):
@@ -572,6 +580,23 @@ def executeAction():
     parser_store.add_argument(
         '-ma', '--many_assoc', dest='many_assoc', default='True',
         help='Many associate [default: True]', type=str2bool)
+    parser_store.add_argument(
+        '-cp', '--checkpoint', default=None, dest='checkpoint',
+        help='A file keeping the number of instances already sent; if it '
+             'exists the store resumes after them')
+    parser_store.add_argument(
+        '-rs', '--resume', default=None, dest='resume',
+        help='The job to resume (db source with uids): the uids already '
+             'sent by this job are skipped')
+    parser_store.add_argument(
+        '-rmb', '--rate_mb', type=float, default=None, dest='rate_mb',
+        help='Maximum MB sent per second, 0 = no limit '
+             '[default: rate_limit.mb_per_second of the settings]')
+    parser_store.add_argument(
+        '-rimg', '--rate_images', type=float, default=None,
+        dest='rate_images',
+        help='Maximum DICOM files sent per second, 0 = no limit '
+             '[default: rate_limit.images_per_second of the settings]')
     parser_store.add_argument("-v", "--verbosity", type=int, choices=[0, 1, 2],
                               dest='verbose', help='Increase output verbosity; '
                                                    '0=quiet mode, '
@@ -623,6 +648,10 @@ def executeAction():
                                      ' cmove and the one one receiving the data'
                                      ' are the same or share the same database',
         default=True, dest='reload_study', nargs='?', type=str2bool)
+    parser_move.add_argument(
+        '-rs', '--resume', default=None, dest='resume',
+        help='The job to resume: the uids already moved by this job are '
+             'skipped')
     parser_move.add_argument("-v", "--verbosity", type=int, choices=[0, 1, 2],
                              dest='verbose', help='Increase output verbosity; '
                                                   '0=quiet mode, '
@@ -683,6 +712,10 @@ def executeAction():
                                      ' cmove and the one one receiving the data'
                                      ' are the same or share the same database',
         default=True, dest='reload_study', nargs='?', type=str2bool)
+    parser_move_existing.add_argument(
+        '-rs', '--resume', default=None, dest='resume',
+        help='The job to resume: the uids already moved by this job are '
+             'skipped')
     parser_move_existing.add_argument("-v", "--verbosity", type=int,
                                       choices=[0, 1, 2],
                                       dest='verbose',
@@ -765,6 +798,10 @@ def executeAction():
     parser_database_create = subparsers_database.add_parser(
         'create', help='Create/Initialize Database')
     parser_database_create.set_defaults(func=database_action)
+    # --
+    parser_database_migrate = subparsers_database.add_parser(
+        'migrate', help='Add the missing indexes and partitions to an existing Database')
+    parser_database_migrate.set_defaults(func=database_action)
 
     # Sub Command for request
     # --
@@ -1,22 +1,33 @@
 """ The methods of the database """
 # pylint: disable=superfluous-parens
-from sqlalchemy import create_engine
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm.session import sessionmaker
 from sqlalchemy.orm.scoping import scoped_session
 from sqlalchemy import func
-from sqlalchemy.sql import exists
+from sqlalchemy.sql import exists, text
 
 from sphere import settings
 from sphere.utilities.utils_database import create_file_json
+from sphere.dicmeta.extended_db import EXTENDED_DB
+from sphere.dicmeta.models.partition import PARTITION_METHOD, month_start, \
+    partition_ddl
 from sphere.logs.logs import LOG_DATABASE
 
 
 class Database:
+    # The trigram indexes ((index name, table, column name), ...)
+    trigram_indexes = ()
+    # The indexes no longer declared ((index name, table), ...)
+    dropped_indexes = ()
 
     def __init__(self):
         self.sgbd = settings.DB_ENGINE
         self.engine = self.create_engine()
         self.session = None
+        # The partitions already created (or which failed)
+        self.partitions = set()
 
     def create_engine(self):
         """ Create engine"""
@@ -40,11 +51,160 @@ class Database:
     def create_tables(self):
         """ Create Tables """
         create_file_json(settings.EXTENDED)
+        EXTENDED_DB.reload()
         self.metadata_table.create_all(self.engine, checkfirst=True)
+        self.create_partitions()
+        self.create_indexes()
         if self.sgbd == 'postgresql' or self.sgbd == 'pgsql':
             self.create_views()
         LOG_DATABASE.info('I create all tables.')
 
+    def create_indexes(self):
+        """
+        Create the indexes of the models missing in the existing tables
+        (migration of a database created before the indexes were declared),
+        the trigram indexes (postgresql) and drop the indexes no longer
+        declared
+        """
+        for table in self.metadata_table.sorted_tables:
+            if not table.indexes or not self.engine.dialect.has_table(
+                    self.engine, table.name, table.schema):
+                continue
+            existing = self.index_names(table)
+            for index in table.indexes:
+                if index.name not in existing:
+                    LOG_DATABASE.info('Create the index %s on %s',
+                                      index.name, table.fullname)
+                    index.create(self.engine)
+        if self.trigram_indexes and self.engine.dialect.name == 'postgresql':
+            self.create_trigram_indexes()
+        for name, table in self.dropped_indexes:
+            if self.engine.dialect.has_table(self.engine, table.name,
+                                             table.schema) \
+                    and name in self.index_names(table):
+                LOG_DATABASE.info('Drop the index %s of %s', name,
+                                  table.fullname)
+                self.engine.execute('DROP INDEX %s' % '.'.join(
+                    filter(None, [table.schema, name])))
+
+    def index_names(self, table):
+        """
+        Return the names of the indexes of a table, read in the catalog: the
+        reflection of SQLAlchemy skips the indexes on an expression
+
+        :param table: The table
+        :type table: :py:class:`sqlalchemy.schema.Table`
+        :return: The names of the indexes
+        :rtype: set [str]
+        """
+        dialect = self.engine.dialect.name
+        if dialect == 'postgresql':
+            query = text("SELECT indexname FROM pg_indexes "
+                         "WHERE schemaname = "
+                         "coalesce(:schema, current_schema()) "
+                         "AND tablename = :name")
+            rows = self.engine.execute(query, schema=table.schema,
+                                       name=table.name)
+        elif dialect == 'sqlite':
+            master = '.'.join(filter(None, [table.schema, 'sqlite_master']))
+            query = text("SELECT name FROM %s "
+                         "WHERE type = 'index' AND tbl_name = :name" % master)
+            rows = self.engine.execute(query, name=table.name)
+        else:
+            return {index['name'] for index in inspect(self.engine).
+                    get_indexes(table.name, schema=table.schema)}
+        return {name for name, in rows}
+
+    def create_trigram_indexes(self):
+        """ Create the trigram indexes (the pg_trgm extension is needed)"""
+        try:
+            self.engine.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for name, table, column in self.trigram_indexes:
+                self.engine.execute(
+                    'CREATE INDEX IF NOT EXISTS %s ON %s USING gin '
+                    '(%s gin_trgm_ops)' % (name, table.fullname, column))
+        except Exception as exc:
+            LOG_DATABASE.warning("The trigram indexes are not created (the "
+                                 "pg_trgm extension is needed): %s", exc)
+
+    def partitioned_tables(self):
+        """
+        Return the partitioned tables
+
+        :return: The tables
+        :rtype: list [:py:class:`sqlalchemy.schema.Table`]
+        """
+        return [table for table in self.metadata_table.sorted_tables
+                if table.dialect_options['postgresql']['partition_by']]
+
+    def is_partitioned(self, table):
+        """
+        Check if a table of the database is partitioned
+
+        :param table: The table
+        :type table: :py:class:`sqlalchemy.schema.Table`
+        :return: False if the table was created without its partitioning
+        :rtype: bool
+        """
+        query = text("SELECT 1 FROM pg_partitioned_table p "
+                     "JOIN pg_class c ON c.oid = p.partrelid "
+                     "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                     "WHERE n.nspname = coalesce(:schema, current_schema()) "
+                     "AND c.relname = :name")
+        return self.engine.execute(query, schema=table.schema,
+                                   name=table.name).scalar() is not None
+
+    def create_partitions(self, months=None):
+        """
+        Create the partitions of the partitioned tables
+
+            - ``HASH`` - the settings.DB_PARTITION_MODULUS partitions
+            - ``RANGE`` - the default partition and the monthly partitions
+              from the current month to settings.DB_PARTITION_MONTHS_AHEAD
+              months ahead
+
+        :param months: The first days of the months of the range partitions
+            [default: the current month and the next ones]
+        :type months: list [:py:class:`datetime.date`], optional
+        """
+        if months is None:
+            today = datetime.utcnow().date()
+            months = [month_start(today, shift) for shift in
+                      range(settings.DB_PARTITION_MONTHS_AHEAD + 1)]
+        for table in self.partitioned_tables():
+            if not self.is_partitioned(table):
+                LOG_DATABASE.warning("The table %s was created before its "
+                                     "partitioning, it is not partitioned.",
+                                     table.fullname)
+                continue
+            if PARTITION_METHOD == 'HASH':
+                keys = range(settings.DB_PARTITION_MODULUS)
+            else:
+                keys = [None] + list(months)
+            for key in keys:
+                self.create_partition(table, key)
+
+    def create_partition(self, table, key=None):
+        """
+        Create a partition of a table if it was not already created
+
+        :param table: The partitioned table
+        :type table: :py:class:`sqlalchemy.schema.Table`
+        :param key: The month of the partition (``RANGE``, None for the
+            default partition) or its remainder (``HASH``)
+        :type key: :py:class:`datetime.date` or int, optional
+        """
+        name, request = partition_ddl(table, key)
+        if name in self.partitions:
+            return
+        self.partitions.add(name)
+        try:
+            self.engine.execute(request)
+            LOG_DATABASE.debug('Partition %s of %s', name, table.fullname)
+        except Exception as exc:
+            LOG_DATABASE.error("The partition %s is not created: %s",
+                               name, exc)
+
     def create_views(self):
         """ Create view """
         for _k, view in self.views.items():
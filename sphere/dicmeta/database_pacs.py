@@ -1,6 +1,6 @@
 """ Database pacs"""
 # pylint: disable=invalid-name
-from sphere.dicmeta.models.dicom_models.patient_model import PatientModel
+from sphere.dicmeta.models.dicom_models.patient_model import PatientModel, TRIGRAM_INDEXES, DROPPED_INDEXES
 from sphere.dicmeta.models.dicom_models.study_model import StudyModel
 from sphere.dicmeta.models.dicom_models.series_model import SeriesModel
 from sphere.dicmeta.models.dicom_models.file_storage_metadata_model import FileStorageMetadataDicomModel
@@ -32,6 +32,9 @@ from .models.base import DB_BASE_PACS
 
 class DatabasePACS(Database):
     """ Bring together all pacs modules"""
+    trigram_indexes = TRIGRAM_INDEXES
+    dropped_indexes = DROPPED_INDEXES
+
     def __init__(self, db_queue=None):
         self.metadata_table = DB_BASE_PACS.metadata
         super().__init__()
@@ -1,9 +1,50 @@
-# pylint: disable=eval-used
-from datetime import datetime
-
+from pydicom.datadict import tag_for_keyword
 from pydicom.dataset import Dataset
-
-from sphere.utilities.utils_database import read_copy_extended_db
+from pydicom.tag import Tag
+
+from sphere.dicmeta.extended_db import EXTENDED_DB
+
+# The fields of each table: ((field_name, keyword), ...)
+LEVEL_FIELDS = {
+    'patient': (
+        ('patientID', 'PatientID'),
+        ('patientName', 'PatientName'),
+        ('patientSex', 'PatientSex'),
+        ('patientBirthDate', 'PatientBirthDate')),
+    'study': (
+        ('studyUID', 'StudyInstanceUID'),
+        ('patientID', 'PatientID'),
+        ('dateStudy', 'StudyDate'),
+        ('institutionName', 'InstitutionName'),
+        ('accessionNumber', 'AccessionNumber'),
+        ('protocolName', 'ProtocolName'),
+        ('studyDescription', 'StudyDescription')),
+    'series': (
+        ('seriesUID', 'SeriesInstanceUID'),
+        ('studyUID', 'StudyInstanceUID'),
+        ('patientID', 'PatientID'),
+        ('seriesDate', 'SeriesDate'),
+        ('seriesDescription', 'SeriesDescription'),
+        ('stationName', 'StationName'),
+        ('bodyPartExamined', 'BodyPartExamined'),
+        ('manufacturer', 'Manufacturer'),
+        ('manufacturerModelName', 'ManufacturerModelName'),
+        ('modality', 'Modality')),
+    'instance': (
+        ('instanceUID', 'SOPInstanceUID'),
+        ('seriesUID', 'SeriesInstanceUID'),
+        ('studyUID', 'StudyInstanceUID'),
+        ('patientID', 'PatientID')),
+}
+# The keywords which must be in each DICOM file
+REQUIRED_KEYWORDS = ('PatientID', 'StudyInstanceUID', 'SeriesInstanceUID',
+                     'SOPInstanceUID')
+# The value of the modality if the file has none
+UNKNOWN_MODALITY = 'Unknown'
+# The tags read for the tables, in the order of the dataset: ((tag, keyword),)
+READ_TAGS = tuple(sorted(
+    {(Tag(tag_for_keyword(keyword)), keyword)
+     for fields in LEVEL_FIELDS.values() for _field, keyword in fields}))
 
 
 class DcmFile(Dataset):
@@ -19,6 +60,46 @@ class DcmFile(Dataset):
         self.seriesUID = self.SeriesInstanceUID
         self.patientID = self.PatientID
 
+    def read_values(self):
+        """
+        Read the values of the fields of all the tables in one pass on the
+        dataset
+
+        :return: {keyword: value} (None if the keyword is not in the dataset)
+        :rtype: dict
+        :raises AttributeError: if one of the UIDs is missing
+        """
+        values = {}
+        for tag, keyword in READ_TAGS:
+            value = self[tag].value if tag in self else None
+            values[keyword] = None if value is None else str(value)
+        for keyword in REQUIRED_KEYWORDS:
+            if values[keyword] is None:
+                raise AttributeError(
+                    "The dataset has no attribute '%s'" % keyword)
+        if values['Modality'] is None:
+            values['Modality'] = UNKNOWN_MODALITY
+        return values
+
+    def metadata(self, table_names=None):
+        """
+        Get the metadata of all the tables
+
+        :param table_names: The tables [default: ``patient``, ``study``,
+            ``series`` and ``instance``]
+        :type table_names: tuple [str], optional
+        :return: {table: metadata}
+        :rtype: dict
+        """
+        values = self.read_values()
+        all_meta = {}
+        for table_name in table_names or LEVEL_FIELDS:
+            meta = {field: values[keyword]
+                    for field, keyword in LEVEL_FIELDS[table_name]}
+            self.extended(meta, table_name)
+            all_meta[table_name] = meta
+        return all_meta
+
     def file_storage_metadata(self):
         """
         Get file storage  metadata
@@ -26,14 +107,7 @@ class DcmFile(Dataset):
         :return: The metadata
         :rtype: dict
         """
-        meta = {
-            'instanceUID': str(self.SOPInstanceUID),
-            'seriesUID': str(self.SeriesInstanceUID),
-            'studyUID': str(self.StudyInstanceUID),
-            'patientID': str(self.PatientID)
-        }
-        self.extended(meta, 'instance')
-        return meta
+        return self.metadata(('instance',))['instance']
 
     def series_metadata(self):
         """
@@ -42,25 +116,7 @@ class DcmFile(Dataset):
         :return: The metadata
         :rtype: dict
         """
-        meta = {
-            'seriesUID': str(self.SeriesInstanceUID),
-            'studyUID': str(self.StudyInstanceUID),
-            'patientID': str(self.PatientID),
-            'seriesDate': self.check_attribute_dicom('SeriesDate'),
-            'seriesDescription': self.check_attribute_dicom('SeriesDescription'),
-            'stationName': self.check_attribute_dicom('StationName'),
-            'bodyPartExamined': self.check_attribute_dicom('BodyPartExamined'),
-            'manufacturer': self.check_attribute_dicom('Manufacturer'),
-            'manufacturerModelName': self.check_attribute_dicom('ManufacturerModelName')
-        }
-
-        try:
-            meta['modality'] = str(str(self.Modality))
-        except Exception:
-            meta['modality'] = 'Unknown'
-
-        self.extended(meta, 'series')
-        return meta
+        return self.metadata(('series',))['series']
 
     def study_metadata(self):
         """
@@ -69,17 +125,7 @@ class DcmFile(Dataset):
         :return: The metadata
         :rtype: dict
         """
-        meta = {
-            'studyUID': str(self.StudyInstanceUID),
-            'patientID': str(self.PatientID),
-            'dateStudy': self.check_attribute_dicom('StudyDate'),
-            'institutionName': self.check_attribute_dicom('InstitutionName'),
-            'accessionNumber': self.check_attribute_dicom('AccessionNumber'),
-            'protocolName': self.check_attribute_dicom('ProtocolName'),
-            'studyDescription': self.check_attribute_dicom('StudyDescription')
-        }
-        self.extended(meta, 'study')
-        return meta
+        return self.metadata(('study',))['study']
 
     def patient_metadata(self):
         """
@@ -88,14 +134,7 @@ class DcmFile(Dataset):
         :return: The metadata
         :rtype: dict
         """
-        meta = {
-            'patientID': str(self.PatientID),
-            'patientName': self.check_attribute_dicom('PatientName'),
-            'patientSex': self.check_attribute_dicom('PatientSex'),
-            'patientBirthDate': self.check_attribute_dicom('PatientBirthDate')
-        }
-        self.extended(meta, 'patient')
-        return meta
+        return self.metadata(('patient',))['patient']
 
     def check_attribute_dicom(self, keyword):
         """
@@ -106,12 +145,8 @@ class DcmFile(Dataset):
         :return: Return value
         :rtype: str
         """
-        try:
-            value = str(eval("self." + keyword))
-        except Exception:
-            value = None
-
-        return value
+        value = self.get(keyword)
+        return None if value is None else str(value)
 
     def extended(self, meta, table_name):
         """
@@ -128,21 +163,4 @@ class DcmFile(Dataset):
                 - instance
         :type table_name: str
         """
-        json_extended = read_copy_extended_db()
-        if json_extended and table_name in json_extended.keys():
-            for tag, dic in json_extended[table_name].items():
-                field_name = dic['field_name']
-                if 'parents' in dic:
-                    parents_list_tags = dic['parents'].split(',')
-                    list_res_p = []
-                    for p_tag in parents_list_tags:
-                        list_res_p.extend([str([p_tag[:4], p_tag[4:]]), str([0])])
-                    try:
-                        meta[field_name] = str(eval("self" + ''.join(list_res_p) + str([tag[:4], tag[4:]]) + '.value'))
-                    except Exception:
-                        meta[field_name] = None
-                else:
-                    try:
-                        meta[field_name] = str(self[tag[:4], tag[4:]].value)
-                    except Exception:
-                        meta[field_name] = None
+        EXTENDED_DB.extract(self, table_name, meta)
@@ -38,16 +38,12 @@ class DcmManager:
         :type queue_to_load: class queue.Queue, optional
         """
         for dcm in self.dataset:
-            patient = self.db_pacs.PatientModel(**dcm.patient_metadata())
-            study = self.db_pacs.StudyModel(**dcm.study_metadata(), **{'patient': patient})
-            series = self.db_pacs.SeriesModel(**dcm.series_metadata(), **{'patient': patient, 'study': study})
-            #instance = self.db_pacs.FileStorageMetadataDicomModel(**dcm.instance_metadata(),
-            #                                      **{'patient': patient,
-            #                                         'study': study,
-            #                                         'series': series,
-            #                                         'storage_metadata': storage_metadata})
-
-            d = {**dcm.file_storage_metadata(),
+            meta = dcm.metadata()
+            patient = self.db_pacs.PatientModel(**meta['patient'])
+            study = self.db_pacs.StudyModel(**meta['study'], **{'patient': patient})
+            series = self.db_pacs.SeriesModel(**meta['series'], **{'patient': patient, 'study': study})
+
+            d = {**meta['instance'],
                  **{'patient': patient,
                     'study': study,
                     'series': series},
@@ -0,0 +1,166 @@
+"""
+The extended fields of the database (``extended_db.yml``), read once and kept
+with the tags of each field already parsed
+"""
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from pydicom.tag import Tag
+
+from sphere.utilities.utils_database import read_copy_extended_db
+
+# The tables with extended fields
+TABLES = ('patient', 'study', 'series', 'instance')
+
+# field_name: the column, keyword: the DICOM keyword, tag: the tag of the
+# value, parents: the tags of the sequences containing the tag (the first
+# item of each sequence is used), type: ``String`` or ``Text``, size: the
+# size of a ``String``
+ExtendedField = namedtuple(
+    'ExtendedField',
+    ['field_name', 'keyword', 'tag', 'parents', 'type', 'size'])
+
+
+def parse_tag(tag):
+    """
+    Convert a tag of the extended configuration
+
+    :param tag: The tag (example: ``'00101010'``)
+    :type tag: str
+    :return: The tag
+    :rtype: :py:class:`pydicom.tag.BaseTag`
+    """
+    tag = str(tag).strip()
+    return Tag(int(tag[:4], 16), int(tag[4:], 16))
+
+
+class ExtendedDb:
+    """
+    The extended fields of each table.
+
+    The configuration (the copy of ``extended_db.yml`` made when the tables
+    are created) is read at the first use, then only :py:meth:`reload`
+    reads it again.
+    """
+    def __init__(self, config=None):
+        """
+        :param config: The configuration {table: {tag: {'field_name': ...,
+            'keyword': ..., 'parents': ..., 'type': ..., 'size': ...}}}
+            [default: read with read_copy_extended_db()]
+        :type config: dict, optional
+        """
+        self.lock = threading.Lock()
+        # ({table: (field, ...)}, {table: (field_name, ...)})
+        self._loaded = None
+        if config is not None:
+            self.load(config)
+
+    def load(self, config=None):
+        """
+        Parse the configuration
+
+        :param config: The configuration
+            [default: read with read_copy_extended_db()]
+        :type config: dict, optional
+        """
+        if config is None:
+            config = read_copy_extended_db() or {}
+        tables = {}
+        for table_name in TABLES:
+            fields = []
+            for tag, dic in (config.get(table_name) or {}).items():
+                type_value = dic.get('type', 'String')
+                fields.append(ExtendedField(
+                    field_name=dic['field_name'],
+                    keyword=dic.get('keyword'),
+                    tag=parse_tag(tag),
+                    parents=tuple(parse_tag(parent) for parent in
+                                  dic['parents'].split(','))
+                    if dic.get('parents') else (),
+                    type=type_value,
+                    size=dic.get('size', '64') if type_value == 'String'
+                    else ''))
+            tables[table_name] = tuple(fields)
+        field_names = {
+            table_name: tuple(field.field_name for field in fields)
+            for table_name, fields in tables.items()}
+        self._loaded = (MappingProxyType(tables),
+                        MappingProxyType(field_names))
+
+    def reload(self):
+        """ Read the configuration again (after the tables are created)"""
+        with self.lock:
+            self.load()
+
+    def loaded(self):
+        """
+        Return the parsed configuration, read at the first call
+
+        :return: ({table: (field, ...)}, {table: (field_name, ...)})
+        :rtype: tuple (dict, dict)
+        """
+        if self._loaded is None:
+            with self.lock:
+                if self._loaded is None:
+                    self.load()
+        return self._loaded
+
+    def fields(self, table_name):
+        """
+        Return the extended fields of a table
+
+        :param table_name: The table (``patient``, ``study``, ``series`` or
+            ``instance``)
+        :type table_name: str
+        :return: The fields
+        :rtype: tuple [:py:class:`ExtendedField`]
+        """
+        return self.loaded()[0].get(table_name, ())
+
+    def field_names(self, table_name):
+        """
+        Return the names of the extended fields of a table
+
+        :param table_name: The table
+        :type table_name: str
+        :return: The names of the fields
+        :rtype: tuple [str]
+        """
+        return self.loaded()[1].get(table_name, ())
+
+    @staticmethod
+    def value(ds, field):
+        """
+        Return the value of an extended field in a dataset
+
+        :param ds: The dataset
+        :type ds: :py:class:`pydicom.dataset.Dataset`
+        :param field: The field
+        :type field: :py:class:`ExtendedField`
+        :return: The value (None if the tag is not in the dataset)
+        :rtype: str
+        """
+        try:
+            for parent in field.parents:
+                ds = ds[parent].value[0]
+            return str(ds[field.tag].value)
+        except Exception:
+            return None
+
+    def extract(self, ds, table_name, meta):
+        """
+        Add the values of the extended fields of a table in the metadata
+
+        :param ds: The dataset
+        :type ds: :py:class:`pydicom.dataset.Dataset`
+        :param table_name: The table
+        :type table_name: str
+        :param meta: The metadata {field_name: value}
+        :type meta: dict
+        """
+        for field in self.fields(table_name):
+            meta[field.field_name] = self.value(ds, field)
+
+
+EXTENDED_DB = ExtendedDb()
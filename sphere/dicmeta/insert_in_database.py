@@ -1,6 +1,8 @@
 """ Insert data in database with bulk"""
 # pylint: disable=too-many-locals
 from sphere.dicmeta.database_pacs import DatabasePACS
+from sphere.dicmeta.models.partition import PARTITION_METHOD, \
+    conflict_target, partition_key
 from sphere.logs.logs import LOG_DATABASE
 
 
@@ -32,19 +34,16 @@ class InsertData:
         size = 0
         while not queue.empty() and size < 10000:
             LOG_DATABASE.debug('in while dcm save %s', queue.qsize())
-            #print('in while dcm save ', queue.qsize())
             for model, m_inst in queue.get().items():
                 group_dict[model][getattr(m_inst, m_inst.KEY)] = m_inst
             size += 1
             if size > 10000:
                 break
         LOG_DATABASE.info('Prepare to insert :')
-        print('Prepare to insert :')
         self.number_insert = size
         for model in group_dict:
             msg = " - %s %s" % (len(group_dict[model]), model)
             LOG_DATABASE.debug(msg)
-            print(msg)
 
         session = self.db_pacs.create_session()
 
@@ -96,6 +95,49 @@ class InsertData:
                 sub_columns += ['.'.join(filter(None, [table, v]))]
         return sub_columns
 
+    @staticmethod
+    def conflict_clause(model, key, tmp_table):
+        """
+        Return the end of the upsert of a temporary table: the rows whose key
+        is already in the table are skipped
+
+        :param model: The model of the table
+        :type model: object
+        :param key: The key column
+        :type key: str
+        :param tmp_table: The temporary table
+        :type tmp_table: str
+        :return: ``ON CONFLICT`` or, without unique key (table partitioned by
+            range), ``WHERE NOT EXISTS``
+        :rtype: str
+        """
+        target = conflict_target(model.__tablename__, key)
+        if target is not None:
+            return "ON CONFLICT (%s) DO NOTHING" % ', '.join(target)
+        return "WHERE NOT EXISTS (SELECT 1 FROM %s existing " \
+               "WHERE existing.%s = %s.%s)" % (model.table_full_name(), key,
+                                               tmp_table, key)
+
+    def create_range_partitions(self, model, tmp_table, session):
+        """
+        Create the missing monthly partitions of the rows of a temporary
+        table (table partitioned by range)
+
+        :param model: The model of the table
+        :type model: object
+        :param tmp_table: The temporary table
+        :type tmp_table: str
+        :param session: The session
+        :type session: :py:class:`sqlalchemy.orm.session.Session`
+        """
+        key = partition_key(model.__tablename__)
+        if key is None or PARTITION_METHOD != 'RANGE':
+            return
+        request = "SELECT DISTINCT date_trunc('month', %s) FROM %s " \
+                  "WHERE %s IS NOT NULL" % (key, tmp_table, key)
+        for month, in session.execute(request):
+            self.db_pacs.create_partition(model.__table__, month.date())
+
     def patient_bulk_insert(self, data, session):
         """
         Insert the patients in the temporary patient table then in the base table
@@ -115,14 +157,12 @@ class InsertData:
 
         msg = "---- Start patient bulk temporary insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
         data_to_insert = [v.dict_data() for k, v in data.items()]
         session.bulk_insert_mappings(tmp_model, data_to_insert)
         session.commit()
 
         msg = "---- Start de-duplicate patient insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
         request_deduplicate = """DELETE FROM
                                 %s x
                                 USING %s y
@@ -136,23 +176,20 @@ class InsertData:
 
         msg = "---- Start merge upsert patient ---"
         LOG_DATABASE.info(msg)
-        print(msg)
 
         upsert_request = """INSERT INTO %s (%s)
                         SELECT %s
                         FROM %s
-                        ON CONFLICT (%s)
-                        DO NOTHING""" % (table, ','.join(columns),
+                        %s""" % (table, ','.join(columns),
                                          ','.join(columns),
                                          tmp_table,
-                                         key,)
+                                         self.conflict_clause(model, key, tmp_table),)
 
         session.execute(upsert_request)
         session.commit()
 
         msg = "---- End patient insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
 
     def study_bulk_insert(self, data, session):
         """
@@ -179,14 +216,12 @@ class InsertData:
 
         msg = "---- Start study bulk temporary insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
         data_to_insert = [v.dict_data() for k, v in data.items()]
         session.bulk_insert_mappings(tmp_model, data_to_insert)
         session.commit()
 
         msg = "---- Start de-duplicate study insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
         request_deduplicate = """DELETE FROM
                                 %s x
                                 USING %s y
@@ -200,26 +235,22 @@ class InsertData:
 
         msg = "---- Start merge upsert study ---"
         LOG_DATABASE.info(msg)
-        print(msg)
 
         upsert_request = """INSERT INTO %s (%s, %s)
                         SELECT %s, %s
                         FROM %s JOIN %s ON (%s=%s)
-                        ON CONFLICT (%s)
-                        DO NOTHING""" % (table, ','.join(columns), patient_id,
+                        %s""" % (table, ','.join(columns), patient_id,
                                          ','.join(columns_table), patient_id,
                                          tmp_table, patient_table,
                                          '.'.join([patient_table, patient_key]),
                                          '.'.join([tmp_table, patient_key]),
-                                         key,)
+                                         self.conflict_clause(model, key, tmp_table),)
         LOG_DATABASE.debug("upsert_request = %s", upsert_request)
-        print(upsert_request)
         session.execute(upsert_request)
         session.commit()
 
         msg = "---- End study insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
 
     def series_bulk_insert(self, data, session):
         """
@@ -250,14 +281,12 @@ class InsertData:
 
         msg = "---- Start series bulk temporary insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
         data_to_insert = [v.dict_data() for k, v in data.items()]
         session.bulk_insert_mappings(tmp_model, data_to_insert)
         session.commit()
 
         msg = "---- Start de-duplicate series insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
         request_deduplicate = """DELETE FROM
                                 %s x
                                 USING %s y
@@ -271,30 +300,26 @@ class InsertData:
 
         msg = "---- Start merge upsert series ---"
         LOG_DATABASE.info(msg)
-        print(msg)
 
         upsert_request = """INSERT INTO %s (%s, %s, %s)
                         SELECT %s, %s, %s
                         FROM %s JOIN %s ON (%s=%s)
                         JOIN %s ON (%s=%s)
-                        ON CONFLICT (%s)
-                        DO NOTHING""" % (
+                        %s""" % (
             table, ','.join(columns), patient_id, study_id,
             ','.join(columns_table), '.'.join(['patient', patient_id]), study_id,
             tmp_table, patient_table, '.'.join([patient_table, patient_key]),
             '.'.join([tmp_table, patient_key]),
             study_table, '.'.join([study_table, study_key]),
             '.'.join([tmp_table, study_key]),
-            key,)
+            self.conflict_clause(model, key, tmp_table),)
 
         LOG_DATABASE.debug("upsert_request = %s", upsert_request)
-        print(upsert_request)
         session.execute(upsert_request)
         session.commit()
 
         msg = "---- End series insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
 
     def instance_bulk_insert(self, data, session):
         """
@@ -329,14 +354,12 @@ class InsertData:
 
         msg = "---- Start instance bulk temporary insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
         data_to_insert = [v.dict_data() for k, v in data.items()]
         session.bulk_insert_mappings(tmp_model, data_to_insert)
         session.commit()
 
         msg = "---- Start de-duplicate instance insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
 
         request_deduplicate = """DELETE FROM
                                 %s x
@@ -351,15 +374,14 @@ class InsertData:
 
         msg = "---- Start merge upsert instance ---"
         LOG_DATABASE.info(msg)
-        print(msg)
+        self.create_range_partitions(model, tmp_table, session)
 
         upsert_request = """INSERT INTO %s (%s, %s, %s, %s)
                         SELECT %s, %s, %s, %s
                         FROM %s JOIN %s ON (%s=%s)
                         JOIN %s ON (%s=%s)
                         JOIN %s ON (%s=%s)
-                        ON CONFLICT (%s)
-                        DO NOTHING""" % (
+                        %s""" % (
             table, ','.join(columns), patient_id, study_id, series_id,
             ','.join(columns_table), '.'.join(['patient', patient_id]),
             '.'.join(['study', study_id]), series_id,
@@ -369,13 +391,11 @@ class InsertData:
             '.'.join([tmp_table, study_key]),
             series_table, '.'.join([series_table, series_key]),
             '.'.join([tmp_table, series_key]),
-            key,)
+            self.conflict_clause(model, key, tmp_table),)
 
         LOG_DATABASE.debug("upsert_request = %s", upsert_request)
-        print(upsert_request)
         session.execute(upsert_request)
         session.commit()
 
         msg = "---- End instance insert ---"
         LOG_DATABASE.info(msg)
-        print(msg)
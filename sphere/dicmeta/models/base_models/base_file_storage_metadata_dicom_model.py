@@ -1,5 +1,5 @@
 """ Create the base model of the table instance"""
-# pylint: disable=bad-whitespace, line-too-long, exec-used, eval-used
+# pylint: disable=bad-whitespace, line-too-long, exec-used
 from sqlalchemy import Column
 # Type 'Text' use with extended_db
 from sqlalchemy.types import String, Text
@@ -54,7 +54,7 @@ class BaseFileStorageMetadataDicomModel(CoreStorageMetadataModel):
         }
 
         for field_name in self.extended_fields('instance'):
-            args[field_name] = eval("self." + eval("field_name"))
+            args[field_name] = getattr(self, field_name)
 
         return self.add_value_none(include_none, args)
 
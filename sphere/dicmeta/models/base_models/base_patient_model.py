@@ -1,5 +1,5 @@
 """ Create the base model of the table patient"""
-# pylint: disable=bad-whitespace, exec-used, eval-used, unused-import
+# pylint: disable=bad-whitespace, exec-used, unused-import
 from sqlalchemy import Column
 # Type 'Text' use with extended_db
 from sqlalchemy.types import String, Text
@@ -41,7 +41,7 @@ class BasePatientModel(CoreModel):
             'patientBirthDate': self.patientBirthDate}
 
         for field_name in self.extended_fields('patient'):
-            args[field_name] = eval("self." + eval("field_name"))
+            args[field_name] = getattr(self, field_name)
 
         return self.add_value_none(include_none, args)
 
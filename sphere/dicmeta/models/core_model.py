@@ -1,4 +1,3 @@
-# pylint: disable=eval-used
 import json
 from datetime import datetime
 
@@ -8,7 +7,7 @@ from sqlalchemy.types import Integer, DateTime, BigInteger
 from sphere import settings
 from sphere.logs.logs import LOG_DATABASE
 from sphere.dicmeta.models.base import SCHEMA
-from sphere.utilities.utils_database import read_copy_extended_db
+from sphere.dicmeta.extended_db import EXTENDED_DB
 
 
 class CoreModel:
@@ -79,37 +78,22 @@ class CoreModel:
         :return: return list of attribute and size_value
         :rtype: list [list[str, str]]
         """
-        json_extended = read_copy_extended_db()
         list_attributes = []
-        if json_extended and table_name in json_extended.keys():
-            for _tag, dic in json_extended[table_name].items():
-                field_name = dic['field_name']
-                size_value = ""
-                if 'type' in dic:
-                    type_value = dic['type']
-                else:
-                    type_value = 'String'
-                if type_value == 'String':
-                    if 'size' in dic:
-                        size_value = dic['size']
-                    else:
-                        size_value = '64'
-
-                attribute = ''
-                if type_value == 'String':
-                    attribute = eval("field_name") + " = Column('" + eval(
-                        "field_name") + "', " + eval(
-                            "type_value") + "(size_value))"
-                elif type_value == 'Text':
-                    attribute = eval("field_name") + " = Column('" + eval(
-                        "field_name") + "', " + eval("type_value") + ")"
-                else:
-                    LOG_DATABASE.error(
-                        "We don't treat this type '%s'. So we will "
-                        "not add this field '%s' in the database",
-                        type_value, field_name)
-                if attribute:
-                    list_attributes.append([attribute, size_value])
+        for field in EXTENDED_DB.fields(table_name):
+            attribute = ''
+            if field.type == 'String':
+                attribute = "%s = Column('%s', String(size_value))" % (
+                    field.field_name, field.field_name)
+            elif field.type == 'Text':
+                attribute = "%s = Column('%s', Text)" % (
+                    field.field_name, field.field_name)
+            else:
+                LOG_DATABASE.error(
+                    "We don't treat this type '%s'. So we will "
+                    "not add this field '%s' in the database",
+                    field.type, field.field_name)
+            if attribute:
+                list_attributes.append([attribute, field.size])
 
         return list_attributes
 
@@ -121,15 +105,9 @@ class CoreModel:
         :param table_name: Table name
         :type table_name: str
         :return: list of fields_name
-        :rtype: list
+        :rtype: tuple [str]
         """
-        json_extended = read_copy_extended_db()
-        list_fields = []
-        if json_extended and table_name in json_extended.keys():
-            for _tag, dic in json_extended[table_name].items():
-                list_fields.append(dic['field_name'])
-
-        return list_fields
+        return EXTENDED_DB.field_names(table_name)
 
     @staticmethod
     def add_value_none(include_none, args):
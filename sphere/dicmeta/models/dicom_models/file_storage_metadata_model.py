@@ -1,12 +1,14 @@
 """ Create the model of the table file_storage_metadata_dicom"""
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, ForeignKeyConstraint, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import String
 
 from sphere.dicmeta.models.base_models.base_file_storage_metadata_dicom_model import \
     BaseFileStorageMetadataDicomModel
 from sphere.dicmeta.models.core_model import CoreModel
 from sphere.dicmeta.models.base import DB_BASE_PACS
 from sphere.dicmeta.models.base import table_full_name
+from sphere.dicmeta.models.partition import partition_key, table_args, unique_uid
 try:
     from sphere.settings import START_ANNOTATION
 except ImportError:
@@ -17,10 +19,26 @@ class FileStorageMetadataDicomModel(DB_BASE_PACS, BaseFileStorageMetadataDicomMo
     """ Create instances model """
     __tablename__ = 'file_storage_metadata_dicom'
 
-    id = Column(__tablename__+'_id', CoreModel.ID_TYPE, primary_key=True)
+    id = Column(__tablename__+'_id', CoreModel.ID_TYPE, primary_key=True,
+                autoincrement=True)
+    # The identity of the rows, also when the partition key is in the
+    # primary key of the table
+    __mapper_args__ = {'primary_key': [id]}
 
-    series_id = Column(
-        CoreModel.ID_TYPE, ForeignKey(table_full_name('series.series_id')))
+    if not unique_uid(__tablename__):
+        instanceUID = Column('instance_uid', String(64), nullable=False, index=True)
+
+    if partition_key('series'):
+        # The key of the partitioned series includes their study
+        series_id = Column(CoreModel.ID_TYPE)
+        __table_args__ = table_args(__tablename__, ForeignKeyConstraint(
+            ['series_id', 'study_uid'],
+            [table_full_name('series.series_id'),
+             table_full_name('series.study_uid')]))
+    else:
+        series_id = Column(
+            CoreModel.ID_TYPE, ForeignKey(table_full_name('series.series_id')))
+        __table_args__ = table_args(__tablename__)
     series = relationship(
         "SeriesModel", back_populates="instances", cascade="all,delete")
 
@@ -40,3 +58,16 @@ class FileStorageMetadataDicomModel(DB_BASE_PACS, BaseFileStorageMetadataDicomMo
             uselist=False,
             back_populates="relationship_file_sm",
             cascade="all,delete")
+
+
+# The instances of a series, of a study (by series) or of a patient and the
+# joins with the series, the study and the patient
+Index('ix_instance_series_uid', FileStorageMetadataDicomModel.seriesUID)
+Index('ix_instance_study_uid_series_uid', FileStorageMetadataDicomModel.studyUID,
+      FileStorageMetadataDicomModel.seriesUID)
+Index('ix_instance_patient_uid', FileStorageMetadataDicomModel.patientID)
+Index('ix_instance_series_id', FileStorageMetadataDicomModel.series_id)
+Index('ix_instance_study_id', FileStorageMetadataDicomModel.study_id)
+Index('ix_instance_patient_id', FileStorageMetadataDicomModel.patient_id)
+# The last instances inserted (speed of the storage)
+Index('ix_instance_d8ins', FileStorageMetadataDicomModel.d8ins)
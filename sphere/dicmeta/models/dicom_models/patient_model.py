@@ -19,3 +19,17 @@ class PatientModel(DB_BASE_PACS, BasePatientModel):
         "SeriesModel", back_populates="patient", cascade="all,delete")
     studies = relationship(
         "StudyModel", back_populates="patient", cascade="all,delete")
+
+
+# The indexes of the previous versions that no search uses, dropped from the
+# existing databases by Database.create_indexes: ((index name, table), ...)
+DROPPED_INDEXES = (
+    ('ix_patient_lower_name', PatientModel.__table__),
+)
+
+# The trigram indexes of the searches with wildcards, only with postgresql
+# and the pg_trgm extension (created by Database.create_indexes):
+# ((index name, table, column name), ...)
+TRIGRAM_INDEXES = (
+    ('ix_patient_name_trgm', PatientModel.__table__, 'patient_name'),
+)
@@ -1,18 +1,28 @@
 """ Create the model of the table series"""
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import String
 
 from sphere.dicmeta.models.core_model import CoreModel
 from sphere.dicmeta.models.base_models.base_series_model import BaseSeriesModel
 from sphere.dicmeta.models.base import DB_BASE_PACS
 from sphere.dicmeta.models.base import table_full_name
+from sphere.dicmeta.models.partition import table_args, unique_uid
 
 
 class SeriesModel(DB_BASE_PACS, BaseSeriesModel):
     """ Create series model """
     __tablename__ = 'series'
+    __table_args__ = table_args(__tablename__)
 
-    id = Column(__tablename__+'_id', CoreModel.ID_TYPE, primary_key=True)
+    id = Column(__tablename__+'_id', CoreModel.ID_TYPE, primary_key=True,
+                autoincrement=True)
+    # The identity of the rows, also when the partition key is in the
+    # primary key of the table
+    __mapper_args__ = {'primary_key': [id]}
+
+    if not unique_uid(__tablename__):
+        seriesUID = Column('series_uid', String(64), nullable=False, index=True)
 
     study_id = Column(
         CoreModel.ID_TYPE, ForeignKey(table_full_name('study.study_id')))
@@ -26,3 +36,12 @@ class SeriesModel(DB_BASE_PACS, BaseSeriesModel):
 
     instances = relationship(
         "FileStorageMetadataDicomModel", back_populates="series", cascade="all,delete")
+
+
+# The series of a study (by modality), the joins with the study and the
+# patient and the searches on the modality
+Index('ix_series_study_uid_modality', SeriesModel.studyUID, SeriesModel.modality)
+Index('ix_series_patient_uid', SeriesModel.patientID)
+Index('ix_series_study_id', SeriesModel.study_id)
+Index('ix_series_patient_id', SeriesModel.patient_id)
+Index('ix_series_modality', SeriesModel.modality)
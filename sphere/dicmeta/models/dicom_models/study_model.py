@@ -1,5 +1,5 @@
 """ Create the model of the table study"""
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from sphere.dicmeta.models.core_model import CoreModel
@@ -22,3 +22,11 @@ class StudyModel(DB_BASE_PACS, BaseStudyModel):
         "FileStorageMetadataDicomModel", back_populates="study", cascade="all,delete")
     series = relationship(
         "SeriesModel", back_populates="study", cascade="all,delete")
+
+
+# The patients' studies (by date), the joins with the patient and the
+# searches on the date and the accession number
+Index('ix_study_patient_uid_date', StudyModel.patientID, StudyModel.dateStudy)
+Index('ix_study_patient_id', StudyModel.patient_id)
+Index('ix_study_date_study', StudyModel.dateStudy)
+Index('ix_study_accession_number', StudyModel.accessionNumber)
@@ -0,0 +1,168 @@
+"""
+The partitioning (postgresql) of the instance and series tables, chosen with
+``db.partition.method`` in the settings:
+
+    - ``RANGE`` - the instances by month of insertion (``d8ins``)
+    - ``HASH`` - the instances and the series by study (``study_uid``)
+
+Postgresql needs the partition key in the primary key and in the unique
+constraints of a partitioned table, so the keys of these tables include it.
+"""
+from datetime import date
+
+from sqlalchemy import PrimaryKeyConstraint, UniqueConstraint
+
+from sphere import settings
+from sphere.dicmeta.models.core_model import CoreModel
+from sphere.logs.logs import LOG_DATABASE
+try:
+    from sphere.settings import START_ANNOTATION
+except ImportError:
+    START_ANNOTATION = False
+
+# The partition key of the partitioned tables for each method
+PARTITION_KEYS = {
+    'RANGE': {'file_storage_metadata_dicom': 'd8ins'},
+    'HASH': {'file_storage_metadata_dicom': 'study_uid',
+             'series': 'study_uid'},
+}
+# The (id, uid) columns of the tables which can be partitioned
+TABLE_KEYS = {
+    'file_storage_metadata_dicom': ('file_storage_metadata_dicom_id',
+                                    'instance_uid'),
+    'series': ('series_id', 'series_uid'),
+}
+
+
+def partition_method():
+    """
+    Return the partitioning method of the settings
+
+    The annotations reference the instances by their id alone, which a
+    partitioned table does not allow.
+
+    :return: ``NONE``, ``RANGE`` or ``HASH``
+    :rtype: str
+    """
+    method = getattr(settings, 'DB_PARTITION', 'NONE')
+    if method != 'NONE' and START_ANNOTATION:
+        LOG_DATABASE.error("The tables are not partitioned: the partitioning "
+                           "is not compatible with the annotations.")
+        return 'NONE'
+    return method
+
+
+PARTITION_METHOD = partition_method()
+
+
+def partition_key(table_name):
+    """
+    Return the partition key of a table
+
+    :param table_name: The table name
+    :type table_name: str
+    :return: The column name (None if the table is not partitioned)
+    :rtype: str
+    """
+    return PARTITION_KEYS.get(PARTITION_METHOD, {}).get(table_name)
+
+
+def unique_uid(table_name):
+    """
+    Check if the uid column alone can be unique
+
+    :param table_name: The table name
+    :type table_name: str
+    :return: False if the table is partitioned
+    :rtype: bool
+    """
+    return partition_key(table_name) is None
+
+
+def table_args(table_name, *constraints):
+    """
+    Return the ``__table_args__`` of a model: the primary key and the unique
+    uid extended with the partition key when the table is partitioned
+
+    :param table_name: The table name
+    :type table_name: str
+    :param constraints: The other constraints of the table
+    :type constraints: :py:class:`sqlalchemy.schema.Constraint`
+    :return: The arguments of the table
+    :rtype: dict or tuple
+    """
+    key = partition_key(table_name)
+    if key is None:
+        return (*constraints, CoreModel.args) if constraints else \
+            CoreModel.args
+    id_name, uid_name = TABLE_KEYS[table_name]
+    constraints += (PrimaryKeyConstraint(id_name, key),)
+    if PARTITION_METHOD == 'HASH':
+        constraints += (UniqueConstraint(uid_name, key),)
+    return (*constraints, dict(
+        CoreModel.args,
+        postgresql_partition_by='%s (%s)' % (PARTITION_METHOD, key)))
+
+
+def conflict_target(table_name, uid_name):
+    """
+    Return the columns of the unique constraint of the uid (``ON CONFLICT``
+    of the upserts)
+
+    :param table_name: The table name
+    :type table_name: str
+    :param uid_name: The uid column
+    :type uid_name: str
+    :return: The columns (None if the uid has no unique constraint: a range
+        partition key can not be in it)
+    :rtype: tuple [str]
+    """
+    key = partition_key(table_name)
+    if key is None:
+        return (uid_name,)
+    if PARTITION_METHOD == 'HASH':
+        return (uid_name, key)
+    return None
+
+
+def month_start(day, months=0):
+    """
+    Return the first day of the month of a day, shifted by a number of months
+
+    :param day: The day
+    :type day: :py:class:`datetime.date`
+    :param months: The shift
+    :type months: int, optional
+    :return: The first day of the month
+    :rtype: :py:class:`datetime.date`
+    """
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_ddl(table, key=None):
+    """
+    Return the creation of a partition
+
+    :param table: The partitioned table
+    :type table: :py:class:`sqlalchemy.schema.Table`
+    :param key: The month of the partition (RANGE, None for the default
+        partition) or its remainder (HASH)
+    :type key: :py:class:`datetime.date` or int, optional
+    :return: The name of the partition and the request
+    :rtype: tuple (str, str)
+    """
+    if PARTITION_METHOD == 'HASH':
+        name = '%s_p%s' % (table.name, key)
+        bounds = 'FOR VALUES WITH (MODULUS %s, REMAINDER %s)' % (
+            settings.DB_PARTITION_MODULUS, key)
+    elif key is None:
+        name = '%s_default' % table.name
+        bounds = 'DEFAULT'
+    else:
+        name = '%s_p%s' % (table.name, key.strftime('%Y%m'))
+        bounds = "FOR VALUES FROM ('%s') TO ('%s')" % (
+            key, month_start(key, 1))
+    full_name = '.'.join(filter(None, [table.schema, name]))
+    return name, 'CREATE TABLE IF NOT EXISTS %s PARTITION OF %s %s' % (
+        full_name, table.fullname, bounds)
@@ -1,6 +1,11 @@
 """ Request for the table file_storage_metadata_dicom"""
 from .request import Request
 
+# Number of uids in each ``IN`` of get_file_path_by_uid_list
+UID_CHUNK_SIZE = 500
+# Number of rows fetched at a time
+YIELD_PER = 1000
+
 
 class FileStorageMetadataDicomRequest(Request):
 
@@ -149,6 +154,81 @@ class FileStorageMetadataDicomRequest(Request):
         uid = self.check_instance(instance, model_name='FileStorageMetadataDicomModel')
         return self.request(self.db.FileStorageMetadataDicomModel.instanceUID == uid).first()
 
+    def get_file_path(self, patient_id=None, study_uid=None, series_uid=None):
+        """
+        Get the file paths of the instances matching the uids (None or empty
+        matches all)
+
+        :param patient_id: The patient ID
+        :type patient_id: str, optional
+        :param study_uid: The study UID
+        :type study_uid: str, optional
+        :param series_uid: The series UID
+        :type series_uid: str, optional
+        :return: List of file path
+        :rtype: list [str]
+        """
+        session = self.db.create_session()
+        query = session.query(self.modelTable.filePath)
+        for column, value in ((self.modelTable.patientID, patient_id),
+                              (self.modelTable.studyUID, study_uid),
+                              (self.modelTable.seriesUID, series_uid)):
+            if value:
+                query = query.filter(column == value)
+        try:
+            return [file_path for file_path, in query]
+        finally:
+            session.close()
+
+    def get_file_path_by_uid_list(self, key, list_uid,
+                                  chunk_size=UID_CHUNK_SIZE, with_uid=False):
+        """
+        Get the file paths of the instances of a list of uids. One query is
+        done for each chunk of uids and the rows are fetched by block of
+        YIELD_PER, ordered by uid and id so that the order is the same from
+        one call to the next and the paths of an uid follow each other. The
+        session is closed at the end of the iteration or when the generator is
+        closed.
+
+        :param key: The attribute of the uids
+
+            list of possible value:
+                - ``patientID``
+                - ``studyUID``
+                - ``seriesUID``
+                - ``instanceUID``
+        :type key: str
+        :param list_uid: List of uids (``['*']`` for all the instances)
+        :type list_uid: list [str]
+        :param chunk_size: Number of uids in each query
+        :type chunk_size: int, optional
+        :param with_uid: Yield (uid, file path) instead of the file path
+        :type with_uid: bool, optional
+        :return: Generator of file path
+        :rtype: generator [str] or generator [tuple (str, str)]
+        """
+        session = self.db.create_session()
+        column = getattr(self.modelTable, key)
+        id_column = getattr(self.modelTable, self.modelTable.ID)
+        query = session.query(self.modelTable.filePath, column).order_by(
+            id_column).execution_options(stream_results=True)
+        try:
+            if list_uid and list_uid[0] == '*':
+                for file_path, uid in query.yield_per(YIELD_PER):
+                    yield (uid, file_path) if with_uid else file_path
+                return
+
+            # Remove the duplicates, keeping the order
+            list_uid = list(dict.fromkeys(list_uid))
+            for index in range(0, len(list_uid), chunk_size):
+                chunk = list_uid[index:index + chunk_size]
+                for file_path, uid in query.filter(column.in_(chunk)).\
+                        order_by(None).order_by(column, id_column).\
+                        yield_per(YIELD_PER):
+                    yield (uid, file_path) if with_uid else file_path
+        finally:
+            session.close()
+
     def get_all_instance_uid(self):
         """
         Get all instance_uid in the database
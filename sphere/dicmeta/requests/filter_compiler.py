@@ -0,0 +1,93 @@
+"""
+Translate the DICOM matching of the C-FIND and QIDO-RS keys into SQLAlchemy
+conditions with bound parameters:
+
+    - list of values (``list``, or ``\\`` between the values) - ``IN``
+    - wildcard (``*`` and ``?``) - ``LIKE``
+    - range of dates (``20200101-20201231``, ``-20201231`` or
+      ``20200101-``) - ``BETWEEN``, ``<=`` or ``>=``
+    - single value - ``=``
+"""
+from sqlalchemy import bindparam
+
+# The columns matched by range
+RANGE_KEYS = ('dateStudy', 'dateSeries', 'seriesDate', 'patientBirthDate')
+# The delimiter of the values of a list (DICOM multiple values)
+VALUE_DELIMITER = '\\'
+# The escape character of the LIKE patterns
+LIKE_ESCAPE = '\\'
+
+
+def like_pattern(value):
+    """
+    Convert a DICOM wildcard value to a LIKE pattern
+
+    :param value: The value (example: ``'Brain*'``)
+    :type value: str
+    :return: The pattern (example: ``'Brain%'``)
+    :rtype: str
+    """
+    for char in (LIKE_ESCAPE, '%', '_'):
+        value = value.replace(char, LIKE_ESCAPE + char)
+    return value.replace('*', '%').replace('?', '_')
+
+
+def match(column, value, range_matching=False):
+    """
+    Return the condition of the DICOM matching of a value
+
+    :param column: The column
+    :type column: :py:class:`sqlalchemy.orm.attributes.InstrumentedAttribute`
+    :param value: The value
+    :type value: str or list [str]
+    :param range_matching: True if a ``-`` is a range
+    :type range_matching: bool, optional
+    :return: The condition (None for the universal matching ``*``)
+    :rtype: :py:class:`sqlalchemy.sql.elements.ColumnElement`
+    """
+    if isinstance(value, str) and VALUE_DELIMITER in value:
+        value = value.split(VALUE_DELIMITER)
+    if isinstance(value, (list, tuple, set)):
+        return column.in_(bindparam(None, list(value), expanding=True))
+    value = str(value)
+    if value == '*':
+        return None
+    if '*' in value or '?' in value:
+        return column.like(like_pattern(value), escape=LIKE_ESCAPE)
+    if range_matching and '-' in value:
+        start, end = value.split('-', 1)
+        if start and end:
+            return column.between(start, end)
+        if start:
+            return column >= start
+        return column <= end
+    return column == value
+
+
+def compile_filter(model, dict_filter, range_keys=RANGE_KEYS):
+    """
+    Return the conditions of a filter
+
+    :param model: The model
+    :type model: :py:class:`sqlalchemy.ext.declarative.api.DeclarativeMeta`
+    :param dict_filter: The filter {attribute of the model: value}
+
+        Example of dict_filter:
+        | {
+        |     'dateStudy': '20030505-20031231',
+        |     'studyDescription': 'Brain*'
+        | }
+
+    :type dict_filter: dict
+    :param range_keys: The attributes matched by range
+    :type range_keys: tuple [str], optional
+    :return: The conditions
+    :rtype: list [:py:class:`sqlalchemy.sql.elements.ColumnElement`]
+    :raises AttributeError: if an attribute is not in the model
+    """
+    conditions = []
+    for key, value in dict_filter.items():
+        condition = match(getattr(model, key), value, key in range_keys)
+        if condition is not None:
+            conditions.append(condition)
+    return conditions
@@ -143,20 +143,4 @@ class PatientRequest(Request):
         :return: List of patient_id
         :rtype: list [(str)]
         """
-        if "studyUID" in dict_filter or "seriesUID" in dict_filter:
-            if "seriesUID" in dict_filter:
-                series_uid = dict_filter.pop('seriesUID')
-                result = self.request(
-                    self.db.SeriesModel.seriesUID == series_uid).join(
-                    self.modelTable.series).first()
-            else:  # "studyUID" in dict_filter
-                study_uid = dict_filter.pop('studyUID')
-                result = self.request(
-                    self.db.StudyModel.studyUID == study_uid).join(
-                    self.modelTable.studies).first()
-            if dict_filter:
-                dict_filter['patientID'] = result.patientID
-                result = self.request_filter_like(self.modelTable, dict_filter).all()
-        else:
-            result = self.request_filter_like(self.modelTable, dict_filter).all()
-        return result
+        return self.request_filter_levels('patient', dict_filter).all()
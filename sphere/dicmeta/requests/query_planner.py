@@ -0,0 +1,142 @@
+"""
+Plan the searches (C-FIND and QIDO-RS) whose filters are on several levels as
+one query: the filters of each level are applied to the table of the level,
+the parent levels are joined and the child levels are checked with
+``EXISTS``, so neither the uids of a level nor duplicated rows are loaded
+"""
+from sqlalchemy import and_
+
+from sphere.dicmeta.requests.filter_compiler import compile_filter
+
+# The levels, from the parent to the children
+LEVELS = ('patient', 'study', 'series', 'instance')
+# The level of the uid attributes
+UID_LEVELS = {
+    'patientID': 'patient',
+    'studyUID': 'study',
+    'seriesUID': 'series',
+    'instanceUID': 'instance',
+}
+# The relationship of the model of a level with the model of another level
+RELATIONSHIPS = {
+    'patient': {'study': 'studies', 'series': 'series',
+                'instance': 'instances'},
+    'study': {'patient': 'patient', 'series': 'series',
+              'instance': 'instances'},
+    'series': {'patient': 'patient', 'study': 'study',
+               'instance': 'instances'},
+    'instance': {'patient': 'patient', 'study': 'study', 'series': 'series'},
+}
+
+
+class QueryPlanner:
+    """ Build the query of a level with the filters of all the levels """
+
+    def __init__(self, db):
+        """
+        :param db: The database
+        :type db: :py:class:`sphere.dicmeta.database_pacs.DatabasePACS`
+        """
+        self.models = {
+            'patient': db.PatientModel,
+            'study': db.StudyModel,
+            'series': db.SeriesModel,
+            'instance': db.FileStorageMetadataDicomModel,
+        }
+
+    def level_of(self, level, key):
+        """
+        Return the level of an attribute of a filter: the level of the query
+        if its model has the attribute, the level of an uid, or the first
+        level whose model has the attribute
+
+        :param level: The level of the query
+        :type level: str
+        :param key: The attribute
+        :type key: str
+        :return: The level
+        :rtype: str
+        """
+        if key in self.models[level].__mapper__.column_attrs:
+            return level
+        if key in UID_LEVELS:
+            return UID_LEVELS[key]
+        for other in LEVELS:
+            if key in self.models[other].__mapper__.column_attrs:
+                return other
+        return level
+
+    def split_filter(self, level, dict_filter):
+        """
+        Split a filter by level
+
+        :param level: The level of the query
+        :type level: str
+        :param dict_filter: The filter {attribute: value}
+        :type dict_filter: dict
+        :return: The filters {level: {attribute: value}}
+        :rtype: dict
+        """
+        filters = {}
+        for key, value in dict_filter.items():
+            filters.setdefault(self.level_of(level, key), {})[key] = value
+        return filters
+
+    def query(self, session, level, filters):
+        """
+        Create the query of a level
+
+        :param session: The session
+        :type session: :py:class:`sqlalchemy.orm.session.Session`
+        :param level: The level of the query (``patient``, ``study``,
+            ``series`` or ``instance``)
+        :type level: str
+        :param filters: The filters {level: {attribute: value}}
+        :type filters: dict
+        :return: The query
+        :rtype: :py:class:`sqlalchemy.orm.query.Query`
+        """
+        model = self.models[level]
+        query = session.query(model)
+        conditions = []
+        for other in LEVELS:
+            other_conditions = compile_filter(self.models[other],
+                                              filters.get(other) or {})
+            if not other_conditions:
+                continue
+            if other == level:
+                conditions += other_conditions
+                continue
+            relationship = getattr(model, RELATIONSHIPS[level][other])
+            if LEVELS.index(other) < LEVELS.index(level):
+                # One parent by row
+                query = query.join(relationship)
+                conditions += other_conditions
+            else:
+                conditions.append(relationship.any(and_(*other_conditions)))
+        return query.filter(*conditions)
+
+    def search(self, session, level, dict_filter):
+        """
+        Create the query of a level with a filter on the attributes of any
+        level
+
+        :param session: The session
+        :type session: :py:class:`sqlalchemy.orm.session.Session`
+        :param level: The level of the query
+        :type level: str
+        :param dict_filter: The filter {attribute: value}
+
+            Example of dict_filter at the ``study`` level:
+            | {
+            |     'dateStudy': '20190101-20191231',
+            |     'modality': 'MR',
+            |     'patientName': 'DOE*'
+            | }
+
+        :type dict_filter: dict
+        :return: The query
+        :rtype: :py:class:`sqlalchemy.orm.query.Query`
+        """
+        return self.query(session, level,
+                          self.split_filter(level, dict_filter))
@@ -1,8 +1,13 @@
 from sre_compile import isstring
 
 from sphere.dicmeta.database import Database
+from sphere.dicmeta.requests.filter_compiler import compile_filter
+from sphere.dicmeta.requests.query_planner import QueryPlanner
 from sphere.logs.logs import LOG_DATABASE
 
+# Number of rows fetched at a time by the server-side cursors
+YIELD_PER = 1000
+
 
 class Request:
 
@@ -129,19 +134,65 @@ class Request:
 
         return res
 
-    def get_all(self):
+    def query_all(self):
         """
-        Get all data of table
+        Create the query of all data of table
 
-        :return: The data
-        :rtype: object
+        :return: The query
+        :rtype: :py:class:`sqlalchemy.orm.query.Query`
         """
         session = self.db.create_session()
         req = session.query(self.modelTable).\
                           distinct()
         if hasattr(self.modelTable, 'ORDER_BY'):
             req = req.order_by(getattr(self.modelTable, 'ORDER_BY'))
-        return req.all()
+        return req
+
+    def get_all(self):
+        """
+        Get all data of table
+
+        :return: The data
+        :rtype: object
+        """
+        return self.query_all().all()
+
+    @staticmethod
+    def stream(query, yield_per=YIELD_PER):
+        """
+        Iterate the rows of a query with a server-side cursor: the rows are
+        fetched by block of yield_per instead of being loaded all at once.
+        The session of the query is closed at the end of the iteration or
+        when the generator is closed, which stops the query.
+
+        :param query: The query
+        :type query: :py:class:`sqlalchemy.orm.query.Query`
+        :param yield_per: Number of rows fetched at a time
+        :type yield_per: int, optional
+        :return: Generator of rows
+        :rtype: generator
+        """
+        try:
+            for row in query.execution_options(stream_results=True).\
+                    yield_per(yield_per):
+                yield row
+        finally:
+            query.session.close()
+
+    def get_existing_keys(self, list_key):
+        """
+        Return the keys (``KEY`` of the model) of the list present in the table,
+        with one query
+
+        :param list_key: The list of keys (patient id, study uid, ...)
+        :type list_key: list [str]
+        :return: The keys present in the table
+        :rtype: set [str]
+        """
+        session = self.db.create_session()
+        column = getattr(self.modelTable, self.modelTable.KEY)
+        return {key for key, in
+                session.query(column).filter(column.in_(list_key))}
 
     def get_by(self, col_filter, val_filter):
         """
@@ -177,33 +228,43 @@ class Request:
             |     'studyDescription': 'Brain*'
             | }
 
+            The matching of the values: see
+            :py:mod:`sphere.dicmeta.requests.filter_compiler`
+
         :type dict_filter: dict
         :return: The query
         :rtype: :py:class:`sqlalchemy.orm.query.Query`
         """
-        list_del_key = []
-        list_string = []
-
-        for key, value in dict_filter.items():
-            if "*" in value or isinstance(value, list):
-                if "*" in value:  # Implement the ``like`` operator
-                    search = value.replace('*', '%')
-                    string = "model." + key + ".like('" + search + "')"
-                else:  # Implement the ``in_`` operator
-                    string = "model." + key + ".in_(" + str(value) + ")"
-                list_string.append(string)
-                list_del_key.append(key)
-        # remove the keys where we have filters ``like`` or ``in_``
-        for key in list(set(list_del_key)):
-            del dict_filter[key]
+        session = self.db.create_session()
+        conditions = compile_filter(model, dict_filter)
+        LOG_DATABASE.debug("request_filter_like %s: %s", model.__name__,
+                           conditions)
+        return session.query(model).filter(*conditions).distinct()
+
+    def request_filter_levels(self, level, dict_filter):
+        """
+        Create request with a filter on the attributes of several levels, as
+        one query (see :py:class:`sphere.dicmeta.requests.query_planner.QueryPlanner`)
 
+        :param level: The level of the result
+
+            list of possible value of level:
+                - patient
+                - study
+                - series
+                - instance
+        :type level: str
+        :param dict_filter: The dict filter request
+
+            Example of dict_filter at the study level:
+            | {
+            |     'dateStudy': '20030505',
+            |     'seriesUID': '1.2.3.4'
+            | }
+
+        :type dict_filter: dict
+        :return: The query
+        :rtype: :py:class:`sqlalchemy.orm.query.Query`
+        """
         session = self.db.create_session()
-        query_filter = "session.query(model).filter_by(**dict_filter).filter("
-        for st in list_string:
-            query_filter = query_filter + st + ","
-        query_filter = query_filter + ").distinct()"
-
-        LOG_DATABASE.info("query_filter = %s", query_filter)
-        sqlalchemy_orm_query = eval(query_filter)
-        #print("Sqlalchemy.orm.query = {}".format(sqlalchemy_orm_query))
-        return sqlalchemy_orm_query
+        return QueryPlanner(self.db).search(session, level, dict_filter)
@@ -140,26 +140,4 @@ class SeriesRequest(Request):
         :return: List of series
         :rtype: list [(str)]
         """
-        if "patientID" in dict_filter or "studyUID" in dict_filter:
-            if "studyUID" in dict_filter:
-                study_uid = dict_filter.pop('studyUID')
-                result = self.request(
-                    self.db.StudyModel.studyUID == study_uid).join(
-                    self.modelTable.study).all()
-            else:  # "patientID" in dict_filter
-                patient_uid = dict_filter.pop('patientID')
-                result = self.request(
-                    self.db.PatientModel.patientID == patient_uid).join(
-                    self.modelTable.patient).all()
-            if dict_filter:
-                list_series_uid = []
-                if isinstance(result, list):
-                    for obj in result:
-                        list_series_uid.append(obj.seriesUID)
-                else:
-                    list_series_uid.append(result.seriesUID)
-                dict_filter['seriesUID'] = list_series_uid
-                result = self.request_filter_like(self.modelTable, dict_filter).all()
-        else:
-            result = self.request_filter_like(self.modelTable, dict_filter).all()
-        return result
+        return self.request_filter_levels('series', dict_filter).all()
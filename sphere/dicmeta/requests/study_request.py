@@ -139,26 +139,4 @@ class StudyRequest(Request):
         :return: List of study
         :rtype: list [(str)]
         """
-        if "patientID" in dict_filter or "seriesUID" in dict_filter:
-            if "seriesUID" in dict_filter:
-                series_uid = dict_filter.pop('seriesUID')
-                result = self.request(
-                    self.db.SeriesModel.seriesUID == series_uid).join(
-                    self.modelTable.series).fisrt()
-            else:  # "patientID" in dict_filter
-                patient_uid = dict_filter.pop('patientID')
-                result = self.request(
-                    self.db.PatientModel.patientID == patient_uid).join(
-                    self.modelTable.patient).all()
-            if dict_filter:
-                list_study_uid = []
-                if isinstance(result, list):
-                    for obj in result:
-                        list_study_uid.append(obj.studyUID)
-                else:
-                    list_study_uid.append(result.studyUID)
-                dict_filter['studyUID'] = list_study_uid
-                result = self.request_filter_like(self.modelTable, dict_filter).all()
-        else:
-            result = self.request_filter_like(self.modelTable, dict_filter).all()
-        return result
+        return self.request_filter_levels('study', dict_filter).all()
@@ -32,18 +32,19 @@ class ThreadDatabase(threading.Thread):
         self.queue = g_queue_to_load
 
     def run(self):
-        print("Starting " + self.name)
+        LOG_DATABASE.info("Starting %s", self.name)
         self.state = term_bold(term_green('ON'))
         while True:
-            print('=========== SIZE QUEUE %s : %s' % (settings.SCP_AET,
-                                                      self.queue.qsize()))
+            LOG_DATABASE.debug('Size of the queue %s : %s', settings.SCP_AET,
+                               self.queue.qsize())
             try:
                 if not self.queue.empty():
                     self.fsa.insert_data.bulk_insert_from_queue(self.queue)
                 elif self.stop:
                     break
                 elif self.queue.empty():
-                    print("I'm waiting for the data to be saved in the database")
+                    LOG_DATABASE.debug("I'm waiting for the data to be saved "
+                                       "in the database")
             except Exception as exc:
                 try:
                     LOG_DATABASE.exception(exc)
@@ -54,7 +55,7 @@ class ThreadDatabase(threading.Thread):
                     print(exc)
 
             sleep(settings.DB_SAVE_DELAY)
-        print("Exiting " + self.name)
+        LOG_DATABASE.info("Exiting %s", self.name)
         self.state = term_bold(term_red('OFF'))
 
     def stop_thread(self):
@@ -4,7 +4,7 @@ Search the paths of all DICOM
 from sphere.dicmeta.requests.file_storage_metadata_request import FileStorageMetadataDicomRequest
 from sphere.dicmeta.database_pacs import DatabasePACS
 from sphere import settings
-from sphere.utilities.dicom_utils import all_dicom_instance_path
+from sphere.fsa.file_catalogue import FileCatalogue
 from sphere.utilities.utils_database import check_db_pacs
 from sphere.logs.logs import LOG_TRANSACTION
 
@@ -16,38 +16,37 @@ class DicomPathCMove:
     def __init__(self, db_pacs=None):
         self.db_pacs = DatabasePACS() if db_pacs is None else db_pacs
         self.file_storage_metadata_request = FileStorageMetadataDicomRequest(self.db_pacs)
-        # self.ds = ds
+        self.file_catalogue = None
         self.all_dicom = ['*', '', '?']
-        self.__search_file = "The search is done in the file : \n"
-        self.__search_database = "The search is done in the database : \n"
+        self.__search_file = "The search is done in the file"
+        self.__search_database = "The search is done in the database"
 
-    @staticmethod
-    def get_list_file_path(result, type_search):
+    def match_keys(self, ds, query_model):
         """
-        Returns the path of all DICOM instances
+        Return the unique keys of the request for the query level (the keys
+        with a wildcard are ignored)
 
-        :param result: Result of search
-        :type result: str
-        :param type_search: Type of search (db or folder)
-
-            list of possible value of type_search:
-                - db
-                - file
-
-        :type type_search: str
-        :return: List file path
-        :rtype: dict
+        :param ds: The dataset
+        :type ds: :py:class:`pydicom.dataset.Dataset`
+        :param query_model: Query retrieve level DICOM
+        :type query_model: str
+        :return: (patient id, study uid, series uid), '' if not used
+        :rtype: tuple (str, str, str)
         """
-        list_file_path = []
-        if type_search == "db":
-            for element in result:
-                list_file_path.append(element.filePath)
-        return list_file_path
+        levels = ['PATIENT', 'STUDY', 'SERIES']
+        keys = []
+        for level, keyword in zip(levels, ['PatientID', 'StudyInstanceUID',
+                                           'SeriesInstanceUID']):
+            value = ''
+            if levels.index(level) <= levels.index(query_model):
+                value = str(ds.get(keyword, ''))
+            keys.append('' if value in self.all_dicom else value)
+        return tuple(keys)
 
     def get_list_dicom_path(
             self, patient_id, study_uid, series_uid, query_model):
         """
-        Search the file in the file and return the path DICOM
+        Search the file in the file catalogue and return the path DICOM
 
         :param patient_id: The patient id
         :type patient_id: str
@@ -66,81 +65,25 @@ class DicomPathCMove:
         :return: List path DICOM
         :rtype: list
         """
-        def all_uid():
-            return [path_dicom for path_dicom in dic_instance_path]
-
-        dic_instance_path = all_dicom_instance_path(
-            settings.FS_PATH_STORAGE, "dict")
-
-        list_path_dicom = []
-        if query_model == 'PATIENT':
-            if patient_id:
-                # all patients
-                if patient_id in self.all_dicom and not study_uid \
-                        and not series_uid:
-                    list_path_dicom = all_uid()
-                # One patient
-                else:
-                    for path, inst in dic_instance_path.items():
-                        if inst.PatientID == patient_id:
-                            list_path_dicom.append(path)
-            else:
-                list_path_dicom = all_uid()
-        elif query_model == 'STUDY':
-            if study_uid:
-                # all study
-                if study_uid in self.all_dicom and not patient_id \
-                        and not series_uid:
-                    list_path_dicom = all_uid()
-                # All study for a patient
-                elif study_uid in self.all_dicom and patient_id \
-                        and not series_uid:
-                    for path, inst in dic_instance_path.items():
-                        if inst.PatientID == patient_id:
-                            list_path_dicom.append(path)
-                # One study
-                else:
-                    for path, inst in dic_instance_path.items():
-                        if inst.StudyInstanceUID == study_uid:
-                            list_path_dicom.append(path)
-            else:
-                list_path_dicom = all_uid()
-
-        elif query_model == 'SERIES':
-            if series_uid:
-                # All series
-                if series_uid in self.all_dicom and not patient_id \
-                        and not study_uid:
-                    list_path_dicom = all_uid()
-                # All series for a patient
-                elif series_uid in self.all_dicom and patient_id:
-                    for path, inst in dic_instance_path.items():
-                        if inst.PatientID == patient_id:
-                            list_path_dicom.append(path)
-                # All series for a study
-                elif series_uid in self.all_dicom and study_uid:
-                    for path, inst in dic_instance_path.items():
-                        if inst.StudyInstanceUID == study_uid:
-                            list_path_dicom.append(path)
-                # One series
-                else:
-                    for path, inst in dic_instance_path.items():
-                        if inst.SeriesInstanceUID == series_uid:
-                            list_path_dicom.append(path)
-            else:
-                list_path_dicom = all_uid()
-        else:
-            LOG_TRANSACTION.error("The query model: %s not exits", query_model)
-
+        LOG_TRANSACTION.info(self.__search_file)
+        if self.file_catalogue is None:
+            self.file_catalogue = FileCatalogue()
+        list_path_dicom = self.file_catalogue.paths(
+            patient_id, study_uid, series_uid)
+        LOG_TRANSACTION.info("\t Number of %s : %s", query_model,
+                             len(list_path_dicom))
         return list_path_dicom
 
-    # pylint: disable=invalid-name, no-else-return
+    # pylint: disable=invalid-name
     def path_found(self, ds, query_model):
         """
         Returns the path of all DICOM files
 
+        The paths are searched in the database; the files are searched only if
+        the database is not reachable and ``search_in_file`` is True.
+
         :param ds: The dataset
-        :type ds: str
+        :type ds: :py:class:`pydicom.dataset.Dataset`
         :param query_model: Query retrieve level DICOM
 
         list of possible value of query_model:
@@ -152,78 +95,28 @@ class DicomPathCMove:
         :return: List of DICOM file paths
         :rtype: list
         """
+        if query_model not in ('PATIENT', 'STUDY', 'SERIES'):
+            LOG_TRANSACTION.error(
+                'Error: we have not yet deal with the case where '
+                'query_model= %s', query_model)
+            return None
 
-        patient_id = ds.PatientID if 'PatientID' in ds else ''
-        study_uid = ds.StudyInstanceUID if 'StudyInstanceUID' in ds else ''
-        series_uid = ds.SeriesInstanceUID if 'SeriesInstanceUID' in ds else ''
-
+        patient_id, study_uid, series_uid = self.match_keys(ds, query_model)
         try:
             # if connection db PACS okay
             if check_db_pacs():
-                if query_model == "PATIENT":
-                    if patient_id not in self.all_dicom:  # If one patient
-                        result =\
-                            self.file_storage_metadata_request.get_by_patient_id(
-                                patient_id)
-                    else:  # If all patient
-                        result = self.file_storage_metadata_request.get_all()
-                elif query_model == "STUDY":
-                    if patient_id:  # all study for a patient
-                        result =\
-                            self.file_storage_metadata_request.get_by_patient_id(
-                                patient_id)
-                    elif study_uid not in self.all_dicom:  # If one study
-                        result = self.file_storage_metadata_request.get_by_study_uid(
-                            study_uid)
-                    else:  # If all study
-                        result = self.file_storage_metadata_request.get_all()
-
-                elif query_model == "SERIES":
-                    # all series for a patient
-                    if patient_id:
-                        result =\
-                            self.file_storage_metadata_request.get_by_patient_id(
-                                patient_id)
-                    # all series for a study
-                    elif study_uid:
-                        result = \
-                            self.file_storage_metadata_request.get_by_study_uid(
-                                study_uid)
-                    elif series_uid not in self.all_dicom:  # If one series
-                        result = \
-                            self.file_storage_metadata_request.get_by_series_uid(
-                                series_uid)
-                    else:  # If all series
-                        result = self.file_storage_metadata_request.get_all()
-                else:
-                    LOG_TRANSACTION.error(
-                        'Error: we have not yet deal with the case where '
-                        'query_model= %s', query_model)
-                    return None
-                print(self.__search_database)
                 LOG_TRANSACTION.info(self.__search_database)
-                if result:
-                    return self.get_list_file_path(result, "db")
-                else:
-                    list_path_dicom = []
-
-            else:  # check in file system
-                print(self.__search_file)
-                LOG_TRANSACTION.info(self.__search_file)
-                list_path_dicom = self.get_list_dicom_path(
-                    patient_id, study_uid, series_uid, query_model)
-            msg = "\t Number of {0} : {1}".format(query_model,
-                                                  len(list_path_dicom))
-            print(msg)
-            LOG_TRANSACTION.info(msg)
-            return list_path_dicom
+                list_path_dicom = self.file_storage_metadata_request.\
+                    get_file_path(patient_id, study_uid, series_uid)
+                LOG_TRANSACTION.info("\t Number of %s : %s", query_model,
+                                     len(list_path_dicom))
+                return list_path_dicom
         except Exception as exc:
             LOG_TRANSACTION.exception(exc)
-            print(self.__search_file)
-            list_path_dicom = self.get_list_dicom_path(
+
+        if settings.SEARCH_FILE:
+            return self.get_list_dicom_path(
                 patient_id, study_uid, series_uid, query_model)
-            msg = "\t Number of {0} : {1}".format(query_model,
-                                                  len(list_path_dicom))
-            print(msg)
-            LOG_TRANSACTION.info(msg)
-            return list_path_dicom
+        LOG_TRANSACTION.error("I can't connect to the database and "
+                              "search_in_file is False")
+        return []
@@ -0,0 +1,338 @@
+"""
+Persistent catalogue of the DICOM files of the storage folder, used when the
+search is done in the files instead of the database: the uids and the
+attributes searched by the C-FIND are read once for each file
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from pydicom import dcmread
+from pydicom.errors import InvalidDicomError
+
+from sphere import settings
+from sphere.logs.logs import LOG_TRANSACTION
+
+# The attributes kept for each file: ((column, keyword), ...)
+CATALOGUE_COLUMNS = (
+    ('patient_id', 'PatientID'),
+    ('study_uid', 'StudyInstanceUID'),
+    ('series_uid', 'SeriesInstanceUID'),
+    ('instance_uid', 'SOPInstanceUID'),
+    ('patient_name', 'PatientName'),
+    ('patient_sex', 'PatientSex'),
+    ('patient_birth_date', 'PatientBirthDate'),
+    ('study_date', 'StudyDate'),
+    ('institution_name', 'InstitutionName'),
+    ('accession_number', 'AccessionNumber'),
+    ('protocol_name', 'ProtocolName'),
+    ('study_description', 'StudyDescription'),
+    ('modality', 'Modality'),
+    ('manufacturer', 'Manufacturer'),
+    ('manufacturer_model_name', 'ManufacturerModelName'),
+    ('body_part_examined', 'BodyPartExamined'),
+    ('series_date', 'SeriesDate'),
+    ('series_description', 'SeriesDescription'),
+    ('station_name', 'StationName'),
+)
+# Tags read in each file (the pixels are never read)
+CATALOGUE_TAGS = [keyword for _column, keyword in CATALOGUE_COLUMNS]
+# {keyword: column}
+KEYWORD_COLUMNS = {keyword: column for column, keyword in CATALOGUE_COLUMNS}
+# The attributes matched by range
+RANGE_KEYWORDS = ('StudyDate', 'SeriesDate', 'PatientBirthDate')
+# The version of the tables (an older catalogue is read again)
+CATALOGUE_VERSION = 3
+
+
+def predicate(column, value, range_matching=False):
+    """
+    Return the condition of the DICOM matching of a value (see
+    :py:mod:`sphere.dicmeta.requests.filter_compiler`)
+
+    :param column: The column
+    :type column: str
+    :param value: The value (``\\`` between the values of a list)
+    :type value: str
+    :param range_matching: True if a ``-`` is a range
+    :type range_matching: bool, optional
+    :return: The condition and its parameters (None for the universal
+        matching ``*``)
+    :rtype: tuple (str, list)
+    """
+    value = str(value)
+    if '\\' in value:
+        values = value.split('\\')
+        return '{0} IN ({1})'.format(
+            column, ', '.join('?' * len(values))), values
+    if value == '*':
+        return None
+    if '*' in value or '?' in value:
+        # GLOB has the same wildcards, '[' is the only other special char
+        return '{0} GLOB ?'.format(column), [value.replace('[', '[[]')]
+    if range_matching and '-' in value:
+        start, end = value.split('-', 1)
+        if start and end:
+            return '{0} BETWEEN ? AND ?'.format(column), [start, end]
+        if start:
+            return '{0} >= ?'.format(column), [start]
+        return '{0} <= ?'.format(column), [end]
+    return '{0} = ?'.format(column), [value]
+
+
+class FileCatalogue:
+    """
+    Keep {path: patient id, study, series and instance uid} of the DICOM files
+    in a SQLite file. :py:meth:`refresh` only lists the folders modified since
+    the last refresh and only reads the files added or modified (size or
+    mtime) in them.
+
+    The storage moves each file in its folder, which changes the mtime of the
+    folder: a file rewritten in place is only read again by
+    ``refresh(force=True)``.
+    """
+    # Only one thread writes in the catalogue
+    lock = threading.Lock()
+    # {catalogue path: time.monotonic() of the last refresh}
+    refreshed = {}
+
+    def __init__(self, dicom_folder=None, catalogue_path=None):
+        """
+        :param dicom_folder: The folder of the DICOM files
+            [default: settings.FS_PATH_STORAGE]
+        :type dicom_folder: str, optional
+        :param catalogue_path: The SQLite file of the catalogue
+            [default: settings.FILE_CATALOGUE_PATH]
+        :type catalogue_path: str, optional
+        """
+        self.dicom_folder = settings.FS_PATH_STORAGE \
+            if dicom_folder is None else dicom_folder
+        self.catalogue_path = settings.FILE_CATALOGUE_PATH \
+            if catalogue_path is None else catalogue_path
+        with self.lock, closing(self.connect()) as connection, connection:
+            version, = connection.execute("PRAGMA user_version").fetchone()
+            if version != CATALOGUE_VERSION:
+                connection.execute("DROP TABLE IF EXISTS dicom_file")
+                connection.execute("DROP TABLE IF EXISTS dicom_folder")
+                connection.execute(
+                    "PRAGMA user_version = {0}".format(CATALOGUE_VERSION))
+                self.refreshed.pop(self.catalogue_path, None)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS dicom_folder ("
+                "path TEXT PRIMARY KEY, mtime INTEGER)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS dicom_file ("
+                "path TEXT PRIMARY KEY, folder TEXT, mtime REAL, "
+                "size INTEGER, " +
+                ", ".join("{0} TEXT".format(column)
+                          for column, _keyword in CATALOGUE_COLUMNS) + ")")
+            for column in ('folder', 'patient_id', 'study_uid', 'series_uid'):
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS ix_dicom_file_{0} "
+                    "ON dicom_file ({0})".format(column))
+
+    def connect(self):
+        """
+        Connect to the catalogue
+
+        :return: The connection
+        :rtype: :py:class:`sqlite3.Connection`
+        """
+        return sqlite3.connect(self.catalogue_path)
+
+    def walk(self, folders=None):
+        """
+        List the folders and the files of the folders modified (the hidden
+        files and folders are ignored)
+
+        :param folders: {folder: mtime in ns} of the last refresh, the files
+            of the folders with the same mtime are not listed [default: list
+            the files of all the folders]
+        :type folders: dict, optional
+        :return: {folder: mtime in ns} of all the folders and
+            {folder: [(path, mtime, size), ...]} of the folders modified
+        :rtype: tuple (dict, dict)
+        """
+        folders = {} if folders is None else folders
+        current, modified = {}, {}
+        stack = [self.dicom_folder]
+        while stack:
+            folder = stack.pop()
+            try:
+                # Before the listing: a file added meanwhile changes the mtime
+                mtime = os.stat(folder).st_mtime_ns
+                with os.scandir(folder) as entries:
+                    entries = list(entries)
+            except FileNotFoundError:
+                continue
+            current[folder] = mtime
+            files = None if folders.get(folder) == mtime else []
+            for entry in entries:
+                if entry.name[0] == '.':
+                    continue
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        stack.append(entry.path)
+                    continue
+                if files is None:
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((entry.path, stat.st_mtime, stat.st_size))
+            if files is not None:
+                modified[folder] = files
+        return current, modified
+
+    @staticmethod
+    def read_attributes(path):
+        """
+        Read the attributes of the catalogue in a DICOM file
+
+        :param path: The path of the DICOM file
+        :type path: str
+        :return: The values of CATALOGUE_TAGS (None if the attribute is
+            missing), all None if this is not a DICOM file
+        :rtype: tuple
+        """
+        try:
+            dataset = dcmread(path, stop_before_pixels=True,
+                              specific_tags=CATALOGUE_TAGS)
+            values = (dataset.get(tag) for tag in CATALOGUE_TAGS)
+            return tuple(None if value is None else str(value)
+                         for value in values)
+        except (InvalidDicomError, OSError):
+            LOG_TRANSACTION.error("%s is not a DICOM regular file", path)
+            return (None,) * len(CATALOGUE_TAGS)
+
+    def refresh(self, force=False):
+        """
+        Update the catalogue with the files added, modified or removed.
+
+        The catalogue is not refreshed if the last refresh is more recent than
+        settings.FILE_CATALOGUE_REFRESH seconds. The folders are listed and
+        the files read without lock, only the update of the catalogue is done
+        under the lock.
+
+        :param force: Refresh now and list the files of all the folders
+        :type force: bool, optional
+        :return: The number of files read
+        :rtype: int
+        """
+        last = self.refreshed.get(self.catalogue_path)
+        if (not force and last is not None
+                and time.monotonic() - last < settings.FILE_CATALOGUE_REFRESH):
+            return 0
+        self.refreshed[self.catalogue_path] = time.monotonic()
+        with closing(self.connect()) as connection:
+            folders = None if force else dict(connection.execute(
+                "SELECT path, mtime FROM dicom_folder"))
+            current, modified = self.walk(folders)
+            changed, removed = [], []
+            for folder, files in modified.items():
+                known = {path: (mtime, size) for path, mtime, size in
+                         connection.execute(
+                             "SELECT path, mtime, size FROM dicom_file "
+                             "WHERE folder = ?", (folder,))}
+                for path, mtime, size in files:
+                    if known.pop(path, None) != (mtime, size):
+                        changed.append((path, folder, mtime, size) +
+                                       self.read_attributes(path))
+                removed += known
+            removed_folders = [
+                (path,) for path, in connection.execute(
+                    "SELECT path FROM dicom_folder") if path not in current]
+            with self.lock, connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO dicom_file VALUES (?, ?, ?, ?, " +
+                    ", ".join('?' * len(CATALOGUE_COLUMNS)) + ")", changed)
+                connection.executemany(
+                    "DELETE FROM dicom_file WHERE path = ?",
+                    [(path,) for path in removed])
+                connection.executemany(
+                    "DELETE FROM dicom_file WHERE folder = ?", removed_folders)
+                connection.executemany(
+                    "DELETE FROM dicom_folder WHERE path = ?", removed_folders)
+                connection.executemany(
+                    "INSERT OR REPLACE INTO dicom_folder VALUES (?, ?)",
+                    current.items())
+        LOG_TRANSACTION.info("File catalogue: %s folders modified, %s files "
+                             "read, %s removed", len(modified), len(changed),
+                             len(removed))
+        return len(changed)
+
+    def paths(self, patient_id=None, study_uid=None, series_uid=None):
+        """
+        Return the paths of the DICOM files matching the uids (None or empty
+        matches all)
+
+        :param patient_id: The patient id
+        :type patient_id: str, optional
+        :param study_uid: The study uid
+        :type study_uid: str, optional
+        :param series_uid: The series uid
+        :type series_uid: str, optional
+        :return: List path DICOM
+        :rtype: list [str]
+        """
+        self.refresh()
+        query = "SELECT path FROM dicom_file WHERE instance_uid IS NOT NULL"
+        params = []
+        for column, value in (('patient_id', patient_id),
+                              ('study_uid', study_uid),
+                              ('series_uid', series_uid)):
+            if value:
+                query += " AND {0} = ?".format(column)
+                params.append(value)
+        with closing(self.connect()) as connection:
+            return [path for path, in connection.execute(query, params)]
+
+    def find(self, unique_key, dict_find):
+        """
+        Return one DICOM file of each patient, study or series matching the
+        filter
+
+        :param unique_key: The keyword of the unique key of the level
+            (``PatientID``, ``StudyInstanceUID`` or ``SeriesInstanceUID``)
+        :type unique_key: str
+        :param dict_find: The filter {keyword: value}, on the keywords of
+            CATALOGUE_TAGS (the other keywords are ignored)
+
+            Example of dict_find:
+            | {
+            |     'StudyDate': '20190101-20191231',
+            |     'Modality': 'MR'
+            | }
+
+        :type dict_find: dict
+        :return: Generator of (path, {keyword: value})
+        :rtype: generator [tuple (str, dict)]
+        """
+        self.refresh()
+        conditions = ["instance_uid IS NOT NULL"]
+        params = []
+        for keyword, value in dict_find.items():
+            if keyword not in KEYWORD_COLUMNS:
+                LOG_TRANSACTION.warning(
+                    "The files can not be searched on '%s'", keyword)
+                continue
+            condition = predicate(KEYWORD_COLUMNS[keyword], value,
+                                  keyword in RANGE_KEYWORDS)
+            if condition is not None:
+                conditions.append(condition[0])
+                params += condition[1]
+        query = "SELECT path, {0} FROM dicom_file WHERE {1} ORDER BY path".\
+            format(", ".join(KEYWORD_COLUMNS.values()),
+                   " AND ".join(conditions))
+        unique_index = CATALOGUE_TAGS.index(unique_key)
+        found = set()
+        with closing(self.connect()) as connection:
+            for row in connection.execute(query, params):
+                uid = row[1 + unique_index]
+                if uid in found:
+                    continue
+                found.add(uid)
+                yield row[0], dict(zip(CATALOGUE_TAGS, row[1:]))
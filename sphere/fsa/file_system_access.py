@@ -135,7 +135,8 @@ class FileSystemAccess:
                 try:
                     self.dcm.add_metadata_dicom(
                         self.instance_storage_metadata, self.db_pacs.db_queue)
-                    print('in fsa, ', self.db_pacs.db_queue.qsize())
+                    LOG_DATABASE.debug('Size of the database queue: %s',
+                                       self.db_pacs.db_queue.qsize())
                 except Exception as error:
                     LOG_DATABASE.exception(
                         "Error store db filepath = %s \n %s",
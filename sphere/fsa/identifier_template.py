@@ -0,0 +1,267 @@
+"""
+The identifiers of the C-FIND responses. The template of a query level lists
+the attributes returned (with their tag and VR) and where their value is read:
+in the row of the database or in the DICOM file. The templates are built once
+and the attributes are assigned as :py:class:`pydicom.dataelem.DataElement`.
+"""
+from collections import namedtuple
+
+from pydicom.datadict import dictionary_VR, tag_for_keyword
+from pydicom.dataelem import DataElement
+from pydicom.dataset import Dataset
+from pydicom.tag import Tag
+
+from sphere.logs.logs import LOG_TRANSACTION
+
+# tag, vr: the tag and the VR of the attribute, attribute: the attribute of the
+# model (``patient.patientName`` for an attribute of the joined patient),
+# parents: the tags of the sequences containing the tag in a file (the first
+# item of each sequence is used)
+TemplateElement = namedtuple('TemplateElement',
+                             ['tag', 'vr', 'attribute', 'parents'])
+
+# The attributes of each level: ((keyword, attribute of the model), ...)
+LEVEL_ATTRIBUTES = {
+    'PATIENT': (
+        ('PatientName', 'patientName'),
+        ('PatientID', 'patientID'),
+        ('PatientSex', 'patientSex'),
+        ('PatientBirthDate', 'patientBirthDate')),
+    'STUDY': (
+        ('StudyInstanceUID', 'studyUID'),
+        ('PatientID', 'patientID'),
+        ('StudyDate', 'dateStudy'),
+        ('AccessionNumber', 'accessionNumber'),
+        ('InstitutionName', 'institutionName'),
+        ('StudyDescription', 'studyDescription'),
+        ('ProtocolName', 'protocolName')),
+    'SERIES': (
+        ('Modality', 'modality'),
+        ('StudyInstanceUID', 'studyUID'),
+        ('SeriesInstanceUID', 'seriesUID'),
+        ('SeriesDescription', 'seriesDescription')),
+}
+# The attributes of the patient returned with the studies
+STUDY_PATIENT_ATTRIBUTES = (
+    ('PatientName', 'patient.patientName'),
+    ('PatientBirthDate', 'patient.patientBirthDate'))
+# The unique key of each level, always returned
+UNIQUE_KEYS = {
+    'PATIENT': 'PatientID',
+    'STUDY': 'StudyInstanceUID',
+    'SERIES': 'SeriesInstanceUID',
+}
+# The VRs whose values are numbers
+FLOAT_VRS = ('FL', 'FD', 'OF')
+INT_VRS = ('SL', 'SS', 'UL', 'US', 'OW')
+
+
+def template_element(keyword, attribute, parents=()):
+    """
+    Create the element of a template
+
+    :param keyword: The keyword of the attribute
+    :type keyword: str
+    :param attribute: The attribute of the model
+    :type attribute: str
+    :param parents: The tags of the sequences containing the attribute
+    :type parents: tuple [:py:class:`pydicom.tag.BaseTag`], optional
+    :return: The element
+    :rtype: :py:class:`TemplateElement`
+    :raises KeyError: if the keyword is not in the DICOM dictionary
+    """
+    tag = tag_for_keyword(keyword)
+    if tag is None:
+        raise KeyError("'%s' is not a DICOM keyword" % keyword)
+    vr = dictionary_VR(tag)
+    # The ambiguous VRs ('US or SS', 'OB or OW') are sent with the first one
+    vr = vr.split(' or ')[0]
+    return TemplateElement(Tag(tag), vr, attribute, tuple(parents))
+
+
+def number_value(value, vr):
+    """
+    Convert the value read in the database to the type of the VR
+
+    :param value: The value
+    :type value: str
+    :param vr: The VR
+    :type vr: str
+    :return: The value
+    :rtype: str, int or float
+    :raises ValueError: if the value is not a number
+    """
+    if vr in FLOAT_VRS:
+        return float(value)
+    if vr in INT_VRS:
+        return int(value)
+    return value
+
+
+class IdentifierTemplate:
+    """ The attributes of the identifiers of a query level """
+
+    def __init__(self, elements):
+        """
+        :param elements: The elements, ordered by tag
+        :type elements: tuple [:py:class:`TemplateElement`]
+        """
+        self.elements = tuple(sorted(elements, key=lambda elem: elem.tag))
+        self.tags = frozenset(element.tag for element in self.elements)
+
+    @classmethod
+    def level(cls, query_model, extended_fields=(), study_patient=False):
+        """
+        Create the template of all the attributes of a level
+
+        :param query_model: The query model (``PATIENT``, ``STUDY`` or
+            ``SERIES``)
+        :type query_model: str
+        :param extended_fields: The extended fields of the level
+        :type extended_fields: tuple [:py:class:`sphere.dicmeta.extended_db.ExtendedField`]
+        :param study_patient: Add the attributes of the patient to the studies
+        :type study_patient: bool, optional
+        :return: The template
+        :rtype: :py:class:`IdentifierTemplate`
+        """
+        attributes = LEVEL_ATTRIBUTES[query_model]
+        if query_model == 'STUDY' and study_patient:
+            attributes += STUDY_PATIENT_ATTRIBUTES
+        elements = {}
+        for keyword, attribute in attributes:
+            element = template_element(keyword, attribute)
+            elements[element.tag] = element
+        for field in extended_fields:
+            try:
+                element = template_element(field.keyword, field.field_name,
+                                           field.parents)
+            except KeyError as exc:
+                LOG_TRANSACTION.warning(exc)
+                continue
+            if element.vr == 'SQ':
+                LOG_TRANSACTION.warning("we cannot send this attributes '%s' "
+                                        "because the value is equal to 'SQ'",
+                                        field.keyword)
+                continue
+            elements.setdefault(element.tag, element)
+        return cls(elements.values())
+
+    def select(self, tags, unique_key):
+        """
+        Create the template of the attributes asked by the request
+
+        :param tags: The tags of the request
+        :type tags: iterable [:py:class:`pydicom.tag.BaseTag`]
+        :param unique_key: The keyword of the unique key of the level (always
+            returned)
+        :type unique_key: str
+        :return: The template
+        :rtype: :py:class:`IdentifierTemplate`
+        """
+        tags = set(tags)
+        tags.add(Tag(tag_for_keyword(unique_key)))
+        return IdentifierTemplate(
+            element for element in self.elements if element.tag in tags)
+
+    def joins(self, relationship):
+        """
+        Check if an attribute of the template is read in a relationship
+
+        :param relationship: The relationship (example: ``patient``)
+        :type relationship: str
+        :return: True if the relationship must be loaded
+        :rtype: bool
+        """
+        prefix = relationship + '.'
+        return any(element.attribute.startswith(prefix)
+                   for element in self.elements)
+
+    def covered_by(self, keywords):
+        """
+        Check if all the attributes of the template are in a list of
+        attributes (not in a sequence)
+
+        :param keywords: The keywords of the attributes
+        :type keywords: iterable [str]
+        :return: True if the template only needs these attributes
+        :rtype: bool
+        """
+        tags = {Tag(tag_for_keyword(keyword)) for keyword in keywords}
+        return all(not element.parents and element.tag in tags
+                   for element in self.elements)
+
+    @staticmethod
+    def row_value(row, attribute):
+        """
+        Return the value of an attribute of a row
+
+        :param row: The row
+        :type row: :py:class:`sphere.dicmeta.models.core_model.CoreModel`
+        :param attribute: The attribute (``patient.patientName`` for an
+            attribute of a relationship)
+        :type attribute: str
+        :return: The value (None if the attribute or the relationship is
+            empty)
+        """
+        for name in attribute.split('.'):
+            if row is None:
+                return None
+            row = getattr(row, name, None)
+        return row
+
+    @staticmethod
+    def dataset_value(ds, element):
+        """
+        Return the value of an attribute of a DICOM file
+
+        :param ds: The dataset of the file
+        :type ds: :py:class:`pydicom.dataset.Dataset`
+        :param element: The element of the template
+        :type element: :py:class:`TemplateElement`
+        :return: The value (None if the attribute is not in the file)
+        """
+        try:
+            for parent in element.parents:
+                ds = ds[parent].value[0]
+            return ds[element.tag].value
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    def from_row(self, row):
+        """
+        Create the identifier of a row of the database
+
+        :param row: The row
+        :type row: :py:class:`sphere.dicmeta.models.core_model.CoreModel`
+        :return: The identifier
+        :rtype: :py:class:`pydicom.dataset.Dataset`
+        """
+        identifier = Dataset()
+        for element in self.elements:
+            value = self.row_value(row, element.attribute)
+            try:
+                data_element = DataElement(
+                    element.tag, element.vr,
+                    None if value is None else number_value(value, element.vr))
+            except ValueError:
+                LOG_TRANSACTION.warning(
+                    "The value '%s' of '%s' is not a valid %s", value,
+                    element.attribute, element.vr)
+                data_element = DataElement(element.tag, element.vr, None)
+            identifier.add(data_element)
+        return identifier
+
+    def from_dataset(self, ds):
+        """
+        Create the identifier of a DICOM file
+
+        :param ds: The dataset of the file
+        :type ds: :py:class:`pydicom.dataset.Dataset`
+        :return: The identifier
+        :rtype: :py:class:`pydicom.dataset.Dataset`
+        """
+        identifier = Dataset()
+        for element in self.elements:
+            identifier.add(DataElement(element.tag, element.vr,
+                                       self.dataset_value(ds, element)))
+        return identifier
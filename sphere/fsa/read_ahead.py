@@ -0,0 +1,139 @@
+"""
+Read the next DICOM files ahead while the current ones are sent
+"""
+import os
+import threading
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from sphere import settings
+from sphere.logs.logs import LOG_TRANSACTION
+
+# Size of the reads used to load a file in the page cache without fadvise
+READ_SIZE = 1024 * 1024
+
+
+def will_need(path):
+    """
+    Ask the kernel to load the file in the page cache (non blocking)
+
+    :param path: The path of a file
+    :type path: str
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError as error:
+        LOG_TRANSACTION.debug("Read ahead impossible for %s: %s", path, error)
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def read_file(path):
+    """
+    Read the file to load it in the page cache (used without fadvise)
+
+    :param path: The path of a file
+    :type path: str
+    """
+    try:
+        with open(path, 'rb') as fp:
+            while fp.read(READ_SIZE):
+                pass
+    except OSError as error:
+        LOG_TRANSACTION.debug("Read ahead impossible for %s: %s", path, error)
+
+
+class ReadAhead:
+    """
+    Iterate over DICOM paths sorted on disk, keeping the next ``depth`` files
+    loading while the current one is sent.
+
+    Use :py:func:`os.posix_fadvise` when available, otherwise one thread reads
+    the files ahead.
+    """
+    def __init__(self, paths, depth=None, sort=True):
+        """
+        :param paths: The paths of the DICOM files
+        :type paths: iterable [str]
+        :param depth: Number of files read ahead (0 disables it)
+            [default: settings.READ_AHEAD]
+        :type depth: int, optional
+        :param sort: Sort the paths (False to iterate lazily over a
+            generator, keeping its order)
+        :type sort: bool, optional
+        """
+        self.paths = sorted(paths) if sort else paths
+        self.depth = settings.READ_AHEAD if depth is None else depth
+        self.consumed = 0
+        self.advised = 0
+        self.lock = threading.Lock()
+        if hasattr(os, 'posix_fadvise'):
+            self.reader = None
+        else:
+            self.reader = ThreadPool(processes=1)
+
+    def __iter__(self):
+        if not self.depth:
+            yield from self.paths
+            self.close()
+            return
+        window = deque()
+        for path in self.paths:
+            window.append(path)
+            self.will_need(path)
+            if len(window) > self.depth:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
+        self.close()
+
+    def will_need(self, path):
+        """
+        Start loading one file
+
+        :param path: The path of a file
+        :type path: str
+        """
+        if self.reader is None:
+            will_need(path)
+        else:
+            self.reader.apply_async(read_file, (path,))
+
+    def advance(self):
+        """
+        One file is consumed; read it and up to ``depth`` files after it
+        ahead if it is not done yet
+        """
+        if not self.depth:
+            return
+        with self.lock:
+            self.consumed += 1
+            end = min(self.consumed + self.depth, len(self.paths))
+            # The file being consumed is the first one of the window
+            start = max(self.advised, self.consumed - 1)
+            self.advised = max(self.advised, end)
+        for path in self.paths[start:end]:
+            self.will_need(path)
+
+    def wrap(self, func):
+        """
+        Return func advancing the read ahead before each call, for
+        :py:meth:`multiprocessing.pool.ThreadPool.map` over ``self.paths``
+
+        :param func: The function called with a path
+        :type func: function
+        :return: The wrapped function
+        :rtype: function
+        """
+        def call(path):
+            self.advance()
+            return func(path)
+        return call
+
+    def close(self):
+        """ Stop the reader thread"""
+        if self.reader is not None:
+            self.reader.close()
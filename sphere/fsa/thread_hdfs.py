@@ -7,6 +7,7 @@ import subprocess
 
 from sphere.utilities.file import create_file_txt
 from sphere import settings
+from sphere.logs.logs import LOG_FILE_DICOM
 
 
 class QueueGlobal:
@@ -30,10 +31,11 @@ class ThreadHdfs(threading.Thread):
         self.qr_level = qr_level
 
     def run(self):
-        print("Starting " + self.name)
+        LOG_FILE_DICOM.info("Starting %s", self.name)
         while True:
             sleep(settings.TIME_SLEEP_THREAD_HDFS)
-            print('=========== SIZE QUEUE  HDFS : %s' % (self.queue.qsize()))
+            LOG_FILE_DICOM.debug('Size of the queue HDFS : %s',
+                                 self.queue.qsize())
             if self.queue.qsize():
                 if self.queue.qsize() > settings.NUMBER_STUDY:
                     list_study_uid = [self.queue.get() for _ in
@@ -46,12 +48,13 @@ class ThreadHdfs(threading.Thread):
                                 settings.NAME_FILE_CSV_HDFS,
                                 list_study_uid)
 
-                print("Run script of HDFS")
+                LOG_FILE_DICOM.info("Run script of HDFS")
                 path_csv_uid = os.path.abspath(os.path.join(
                     settings.PATH_FILE_CSV_HDFS, settings.NAME_FILE_CSV_HDFS))
                 path_data = os.path.abspath(settings.FS_PATH_STORAGE)
                 aet_pacs = settings.SCP_AET
-                print("path_script", path_csv_uid, path_data, aet_pacs, self.qr_level)
+                LOG_FILE_DICOM.debug("path_script %s %s %s %s", path_csv_uid,
+                                     path_data, aet_pacs, self.qr_level)
                 if os.path.exists(settings.PATH_SCRIPT):
                     subprocess.call([settings.PATH_SCRIPT,
                                      path_csv_uid,
@@ -59,14 +62,15 @@ class ThreadHdfs(threading.Thread):
                                      aet_pacs,
                                      self.qr_level])
                 else:
-                    print("The path '%s' does not exist" % settings.PATH_SCRIPT)
+                    LOG_FILE_DICOM.error("The path '%s' does not exist",
+                                         settings.PATH_SCRIPT)
 
             if self.stop:
                 break
 
     # pylint: disable=missing-function-docstring
     def stop_thread(self):
-        print("End thread HDFS")
+        LOG_FILE_DICOM.info("End thread HDFS")
         self.stop = True
 
     def __repr__(self):
@@ -1,9 +1,11 @@
 """ Functions of logs"""
 # pylint: disable=invalid-name, too-many-branches
+import atexit
 import os
 import logging
+import queue
 from logging.config import dictConfig
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 import yaml
 from colorlog import ColoredFormatter
@@ -167,6 +169,64 @@ def default_config_logs(**kwargs):
             return logger
 
 
+class LoggerQueueHandler(QueueHandler):
+    """
+    Put the records of a logger in the queue of the log writer with the
+    handlers of the logger, which are called by the writer thread
+    """
+    def __init__(self, log_queue, handlers):
+        """
+        :param log_queue: The queue of the log writer
+        :type log_queue: :py:class:`queue.SimpleQueue`
+        :param handlers: The handlers of the logger
+        :type handlers: list [:py:class:`logging.Handler`]
+        """
+        super().__init__(log_queue)
+        self.handlers = handlers
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.queue_handlers = self.handlers
+        return record
+
+
+class LogWriter(QueueListener):
+    """
+    Thread writing the log records: the threads which log only put the
+    records in a queue and never wait for the console or the log files
+    """
+    def handle(self, record):
+        for handler in record.queue_handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def start_queue_logging():
+    """
+    Move the handlers of the configured loggers (and of the root logger) to
+    a background writer thread
+
+    :return: The writer, stopped at exit (its remaining records are written)
+    :rtype: :py:class:`LogWriter`
+    """
+    log_queue = queue.SimpleQueue()
+    loggers = [logging.getLogger()] + [
+        logger for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)]
+    for logger in loggers:
+        handlers = [handler for handler in logger.handlers
+                    if not isinstance(handler, QueueHandler)]
+        if not handlers:
+            continue
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(LoggerQueueHandler(log_queue, handlers))
+    writer = LogWriter(log_queue)
+    writer.start()
+    atexit.register(writer.stop)
+    return writer
+
+
 class LoggingConfig:  # pylint: disable=too-few-public-methods
     """ Log of logging config"""
     def __init__(self, **kwargs):
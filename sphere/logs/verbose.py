@@ -5,6 +5,18 @@ from sphere import settings
 from sphere.logs.dicom_code import DicomCode
 
 
+class NullVerbose(dict):
+    """
+    Verbose dictionary of the quiet mode: it stays empty so that the
+    verbose of each message costs nothing when nothing is printed
+    """
+    def __setitem__(self, key, value):
+        pass
+
+    def update(self, *args, **kwargs):
+        pass
+
+
 class Verbose(DicomCode):
     """ Init, create and display verbose of PACS"""
 
@@ -65,9 +77,15 @@ class Verbose(DicomCode):
                 | }
 
         :type kwargs: dict
-        :return: The verbose of pacs
+        :return: The verbose of pacs (a :py:class:`NullVerbose` in quiet
+            mode)
         :rtype: dict
         """
+        if verbose_level is not None:
+            self.console_verbose = verbose_level
+        if self.console_verbose <= 0:
+            return NullVerbose()
+
         action = kwargs.get('action')
         service = kwargs.get('service')
         aec = kwargs.get('aec')
@@ -95,12 +113,22 @@ class Verbose(DicomCode):
         if hasattr(context, 'transfer_syntax'):
             verbose_pacs['transfer_syntax'] = context.transfer_syntax
 
-        if verbose_level is not None:
-            self.console_verbose = verbose_level
-
         self.commit_verbose(verbose_pacs)
         return verbose_pacs
 
+    @staticmethod
+    def verbose_enabled(verbose_pacs):
+        """
+        Check if the verbose is kept (not in quiet mode), to skip building
+        costly verbose values
+
+        :param verbose_pacs: The verbose dictionary
+        :type verbose_pacs: dict
+        :return: False in quiet mode
+        :rtype: bool
+        """
+        return not isinstance(verbose_pacs, NullVerbose)
+
     def create_verbose(self, verbose_pacs, commit=False, **kwargs):
         """
         Create the verbose
@@ -128,6 +156,8 @@ class Verbose(DicomCode):
         :return: request_log
 
         """
+        if isinstance(verbose_pacs, NullVerbose):
+            return
         if 'final_status' in kwargs:
             commit = True
             if isinstance(kwargs['final_status'], int):
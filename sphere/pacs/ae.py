@@ -26,10 +26,11 @@ from sphere.pacs.cecho import CEcho
 from sphere.pacs.cstore import CStore
 from sphere.pacs.cfind import CFind
 from sphere.pacs.cmove import CMove
+from sphere.pacs.cmove_existing import CMoveExisting
 from sphere.dicmeta.database_pacs import DatabasePACS
-from sphere.command.command_database import CommandDatabase
 from sphere.pacs.query_ds import QueryDataset
 from sphere.logs.logs import LOG_EVENT_SPHERE, LOG_TRANSACTION
+from sphere.utilities.list_accessible_ae import auth_association
 from sphere import settings
 
 _config.DECODE_STORE_DATASET = False
@@ -152,6 +153,8 @@ class SphereAE(AE):
             authorized by settings
         """
         # TODO Revoir l'appel au contexte avant la mise en place des services
+        # The white list is checked once, at the association request
+        self.handlers.append((evt.EVT_REQUESTED, auth_association))
         if 'c-echo' in settings.SCP_SERVICES:
             self.handlers.append((evt.EVT_C_ECHO, self.scp_cecho_action()))
         if 'c-store' in settings.SCP_SERVICES:
@@ -219,6 +222,10 @@ class SphereAE(AE):
         self.define_context_requested('cstorescu', kwargs['context'])
         kwargs_store['verbose_level'] = kwargs.get('verbose')
         kwargs_store['many_assoc'] = kwargs.get('many_assoc')
+        kwargs_store['checkpoint'] = kwargs.get('checkpoint')
+        kwargs_store['resume'] = kwargs.get('resume')
+        kwargs_store['rate_mb'] = kwargs.get('rate_mb')
+        kwargs_store['rate_images'] = kwargs.get('rate_images')
 
         source_paths_db_fs = kwargs.get('source_paths_db_fs')
         kwargs_store['source_paths_db_fs'] = source_paths_db_fs
@@ -360,6 +367,7 @@ class SphereAE(AE):
                                      file_uid=kwargs['file_uid'],
                                      ae_cstore=kwargs['ae_cstore'],
                                      query_model=query_model,
+                                     resume=kwargs.get('resume'),
                                      verbose_level=kwargs.get('verbose'))
 
 # #C-MOVE EXISTING
@@ -374,23 +382,27 @@ class SphereAE(AE):
         LOG_EVENT_SPHERE.info('Start cmove_existing')
         LOG_TRANSACTION.info('{:-^90}'.format('Start cmove_existing'))
 
-        LOG_TRANSACTION.info('Find in cmove_existing')
-        print('Find in cmove_existing')
+        qr_level = kwargs.get('qr_level') or 'STUDY'
+        connection = {
+            'ip': kwargs['ip'], 'port': kwargs['port'], 'aec': kwargs['aec']}
+        self.define_context_requested('cfindscu')
+        self.define_context_requested('cmovescu')
+        cfind = CFind(self, connection)
+        cmove = CMove(self, connection)
+        cmove.dict_verbose = cmove.init_verbose(
+            verbose_level=kwargs.get('verbose'),
+            **{'aec_scu': cmove.aec, 'action': cmove.action_dicom_code_name,
+               'service': 'SCU', 'log': 'Start cmove_existing'})
+
         kwargs['action'] = "find"
-        self.scu_cfind_action(**kwargs)
-        print('Diff')
-        LOG_TRANSACTION.info('Diff in cmove_existing')
-        output_filepath = kwargs['output_filepath']
-        dict_diff = {'output_filepath': 'diff_' + output_filepath,
-                     'db_action': 'check', 'check_mode': 'diff',
-                     'list_filepath': 'study_uid', 'concept': 'study'}
-        req_cmd = CommandDatabase(**dict_diff)
-        req_cmd.execute()
-        LOG_TRANSACTION.info('Move in cmove_existing')
-        print('Move in cmove_existing')
-        kwargs['action'] = "move"
-        kwargs['file_study_uid'] = dict_diff['output_filepath']
-        self.scu_cmove_action(**kwargs)
+        ds = self.query_ds.create_query_ds(**kwargs)  # Create query dataset
+        # The C-FIND, the check in the database and the C-MOVE run together
+        CMoveExisting(cfind, cmove, qr_level).run(
+            ds, kwargs['ae_cstore'], self.qr_level('find', qr_level),
+            resume=kwargs.get('resume'),
+            output_filepath=kwargs.get('output_filepath'))
+        if cmove.assoc.is_established:
+            cmove.assoc.release()
         LOG_TRANSACTION.info('{:-^90}'.format('End cmove_existing'))
 
 # #OTHER FUNCTION
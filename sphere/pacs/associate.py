@@ -1,5 +1,7 @@
 """ Create associate and log"""
 # pylint: disable=invalid-name
+import queue
+import threading
 
 from sphere import settings
 from sphere.utilities.list_accessible_ae import list_all_access_list
@@ -37,7 +39,7 @@ class Associate:
         else:
             self.assoc = None
 
-    def associate(self, ip, port, aec=None):
+    def associate(self, ip, port, aec=None, ext_neg=None):
         """
         Create associate
 
@@ -47,17 +49,21 @@ class Associate:
         :type port: str
         :param aec: Application Entity target Name
         :type aec: str, optional
+        :param ext_neg: The extended negotiation items of the A-ASSOCIATE-RQ
+        :type ext_neg: list, optional
         :return: The associate
         """
-        assoc = self.ae.associate(ip, port, ae_title=aec)
+        assoc = self.ae.associate(ip, port, ae_title=aec, ext_neg=ext_neg)
         return assoc
 
-    def generate_new_association_from_aet(self, aec=None):
+    def generate_new_association_from_aet(self, aec=None, ext_neg=None):
         """
         Generate a new association from aet
 
         :param aec: Application Entity target Name
         :type aec: str, optional
+        :param ext_neg: The extended negotiation items of the A-ASSOCIATE-RQ
+        :type ext_neg: list, optional
         :return: The associate
         :rtype: :py:class:`pynetdicom.association.Association`
         """
@@ -71,9 +77,81 @@ class Associate:
                 try:
                     return self.associate(
                         ip=access_list[aec]['ip'],
-                        port=access_list[aec]['port'], aec=aec)
+                        port=access_list[aec]['port'], aec=aec,
+                        ext_neg=ext_neg)
                 except Exception as error:
                     txt_except = 'association impossible: {0} '.format(error)
                     LOG_TRANSACTION.error(txt_except)
                     raise Exception(txt_except)
-        return self.associate(ip=self.ip, port=self.port, aec=self.aec)
+        return self.associate(ip=self.ip, port=self.port, aec=self.aec,
+                              ext_neg=ext_neg)
+
+
+class AssociationPool:
+    """
+    Keep a few associations open with one destination and reuse them
+    """
+    def __init__(self, ae, ip, port, aec, size=None):
+        """
+        :param ae: The Application Entity
+        :type ae: :py:class:`pynetdicom.ae.ApplicationEntity`
+        :param ip: The Internet Protocol
+        :type ip: str
+        :param port: The port
+        :type port: int
+        :param aec: Application Entity target Name
+        :type aec: str
+        :param size: Maximum number of associations [default: settings.NB_THREAD]
+        :type size: int, optional
+        """
+        self.ae = ae
+        self.ip = ip
+        self.port = port
+        self.aec = aec
+        self.size = settings.NB_THREAD if size is None else size
+        self.idle = queue.LifoQueue()
+        self.semaphore = threading.BoundedSemaphore(self.size)
+
+    def acquire(self):
+        """
+        Take an idle association or create a new one
+
+        :return: The associate (it may not be established)
+        :rtype: :py:class:`pynetdicom.association.Association`
+        """
+        self.semaphore.acquire()
+        while True:
+            try:
+                assoc = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if assoc.is_established:
+                return assoc
+        LOG_TRANSACTION.info("Create new association with %s ", self.aec)
+        try:
+            return self.ae.associate(self.ip, self.port, ae_title=self.aec)
+        except Exception:
+            self.semaphore.release()
+            raise
+
+    def release(self, assoc):
+        """
+        Give back an association taken with acquire
+
+        :param assoc: The associate
+        :type assoc: :py:class:`pynetdicom.association.Association`
+        """
+        if assoc.is_established:
+            self.idle.put(assoc)
+        self.semaphore.release()
+
+    def close(self):
+        """ Release all the idle associations"""
+        while True:
+            try:
+                assoc = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            if assoc.is_established:
+                assoc.release()
+                LOG_TRANSACTION.debug("Release the association")
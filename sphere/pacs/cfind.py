@@ -43,7 +43,8 @@ class CFind(Associate, Verbose):
 
             Failure
               | ``0xFE00`` -
-              | ``0xC000`` - QueryRetrieveLevel not in ds
+              | ``0xC000`` - QueryRetrieveLevel not in ds or the search
+                failed
               | ``0xA801`` - Association aborted
         :rtype: str
         """
@@ -65,7 +66,6 @@ class CFind(Associate, Verbose):
         # End Log
 
         ds = event.identifier
-        print(ds)
         # log
         self.create_verbose(dataset_dict_verbose, **{
             'log': 'The data to search ', 'dataset': ds})
@@ -98,53 +98,57 @@ class CFind(Associate, Verbose):
                 yield 0xC000, None
                 return
             qr_level = ds.QueryRetrieveLevel.upper()
+            number = 0
             try:
                 LOG_TRANSACTION.debug("Start dicom_dataset_find")
-                matching = self.dicom_dataset_find.ds_found(
+                matching = self.dicom_dataset_find.iter_found(
                     ds, qr_level, self.search_in_files)
+                for identifier in matching:
 
-                # log
-                self.create_verbose(dict_verbose, **{
-                    'log': "Number of %s is %s" % (qr_level, len(matching))})
-                # End log
+                    # log
+                    self.create_verbose(dict_verbose, **{
+                        'log': "Check if C-CANCEL has been received"})
+                    LOG_TRANSACTION.debug(
+                        "Check if C-CANCEL has been received")
+                    # End log
 
-                if matching:  # matching not empty
-                    for identifier in matching:
+                    # Check if C-CANCEL has been received
+                    if event.is_cancelled:
+                        # Stop the query
+                        matching.close()
 
                         # log
                         self.create_verbose(dict_verbose, **{
-                            'log': "Check if C-CANCEL has been received"})
-                        LOG_TRANSACTION.debug(
-                            "Check if C-CANCEL has been received")
+                            'log': " error: C-CANCEL has been received"})
+                        LOG_TRANSACTION.error(
+                            "C-CANCEL has been received")
                         # End log
 
-                        # Check if C-CANCEL has been received
-                        if event.is_cancelled:
-
-                            # log
-                            self.create_verbose(dict_verbose, **{
-                                'log': " error: C-CANCEL has been received"})
-                            LOG_TRANSACTION.error(
-                                "C-CANCEL has been received")
-                            # End log
+                        yield (0xFE00, None)
+                        return
+
+                    # log
+                    self.create_verbose(dataset_dict_verbose, **{
+                        'log': 'C-CANCEL has not been received; '
+                               'Pending dataset ', 'dataset': identifier})
+                    LOG_TRANSACTION.debug(
+                        '{:*^70}'.format("C-CANCEL HAS NOT BEEN RECEVIED; "
+                                         "PENDING DATASET; DATASET EQUAL:"))
+                    for line in identifier:
+                        LOG_TRANSACTION.debug(line)
+                    LOG_TRANSACTION.debug('{:*^70}'.format(' END DATASET '))
+                    # End log
 
-                            yield (0xFE00, None)
-                            return
+                    # Pending
+                    number += 1
+                    yield (0xFF00, identifier)
 
-                        # log
-                        self.create_verbose(dataset_dict_verbose, **{
-                            'log': 'C-CANCEL has not been received; '
-                                   'Pending dataset ', 'dataset': identifier})
-                        LOG_TRANSACTION.debug(
-                            '{:*^70}'.format("C-CANCEL HAS NOT BEEN RECEVIED; "
-                                             "PENDING DATASET; DATASET EQUAL:"))
-                        for line in identifier:
-                            LOG_TRANSACTION.debug(line)
-                        LOG_TRANSACTION.debug('{:*^70}'.format(' END DATASET '))
-                        # End log
+                # log
+                self.create_verbose(dict_verbose, **{
+                    'log': "Number of %s is %s" % (qr_level, number)})
+                # End log
 
-                        # Pending
-                        yield (0xFF00, identifier)
+                if number:
                     LOG_TRANSACTION.info(
                         '{:_^76}'.format('End cfind_response'))
                 else:  # matching is empty
@@ -163,8 +167,14 @@ class CFind(Associate, Verbose):
                 self.create_verbose(dict_verbose, commit=True, **{
                     'success': False,
                     "log": "Error: {0}".format(error)})
-                LOG_TRANSACTION.critical(error)
+                LOG_TRANSACTION.critical(
+                    "The search failed after %s identifiers: %s", number,
+                    error)
                 # End log
+
+                # Failure, the identifiers sent are not the whole result
+                yield 0xC000, None
+                return
         else:
             # Log
             message_log = "Association rejected or aborted"
@@ -223,6 +233,47 @@ class CFind(Associate, Verbose):
                 'Not possible to produce study_uid or patient_id '
                 'or series_uid')
 
+    def iter_find(self, ds, query_model):
+        """
+        Send the C-FIND on the association and yield the identifiers as the
+        responses arrive
+
+        :param ds: The query dataset
+        :type ds: :py:class:`pydicom.dataset.Dataset`
+        :param query_model: the query model
+
+            The possible value:
+                | - ``P``
+                | - ``S``
+                | - ``SE``
+
+        :type query_model: str
+        :return: Generator of the identifiers
+        :rtype: generator [:py:class:`pydicom.dataset.Dataset`]
+        """
+        if not self.assoc.is_established:
+            LOG_TRANSACTION.critical('Association rejected, aborted or never '
+                                     'connected')
+            return
+        if query_model == "P":
+            query_model = PatientRootQueryRetrieveInformationModelFind
+        else:
+            query_model = StudyRootQueryRetrieveInformationModelFind
+        try:
+            for status, identifier in self.assoc.send_c_find(
+                    ds, query_model=query_model):
+                if not status:
+                    LOG_TRANSACTION.error('Connection timed out, was aborted '
+                                          'or received invalid response')
+                elif status.Status in (0xFF00, 0xFF01):
+                    yield identifier
+                elif status.Status != 0x0000:
+                    LOG_TRANSACTION.error('C-FIND query status: 0x{0:04x}'.
+                                          format(status.Status))
+        finally:
+            if self.assoc.is_established:
+                self.assoc.release()
+
     def cfind_request(self, **kwargs):
         """
         Create request cfind
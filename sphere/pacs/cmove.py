@@ -8,19 +8,27 @@ import time
 from time import sleep
 from functools import partial
 from multiprocessing.pool import ThreadPool  # Process
+from collections import deque
 from copy import copy, deepcopy
 import threading
 
 from pydicom import dcmread
+from pydicom.dataset import Dataset
 from pydicom.errors import InvalidDicomError
+from pynetdicom import evt
+from pynetdicom.dimse_messages import C_MOVE_RSP
 from pynetdicom.sop_class import (
     PatientRootQueryRetrieveInformationModelMove,
     StudyRootQueryRetrieveInformationModelMove)
+from pynetdicom.status import (
+    code_to_category, STATUS_SUCCESS, STATUS_WARNING)
 
 from sphere import settings
 from sphere.fsa.dicom_path_cmove import DicomPathCMove
+from sphere.fsa.read_ahead import ReadAhead
 from sphere.utilities.list_accessible_ae import list_all_access_list
-from sphere.pacs.associate import Associate
+from sphere.pacs.associate import Associate, AssociationPool
+from sphere.pacs.transfer_job import TransferJob
 from sphere.utilities.list_accessible_ae import auth_in
 from sphere.logs.verbose import Verbose
 from sphere.utilities.msg import execution_time
@@ -31,6 +39,96 @@ from sphere.logs.logs import LOG_EVENT_SPHERE, LOG_TRANSACTION
 from sphere.fsa.thread_hdfs import ThreadHdfs, g_queue_hdfs
 from sphere.utilities.dicom_utils import get_uid, check_exists_file
 
+# Number of associations tried by a C-MOVE request before it fails
+ASSOCIATION_ATTEMPTS = 3
+
+
+def instance_uid(dicom_file_path):
+    """
+    Return the SOP Instance UID of a file which could not be sent (the files
+    are named after it)
+
+    :param dicom_file_path: The path of a dicom file
+    :type dicom_file_path: str
+    :return: The SOP Instance UID
+    :rtype: str
+    """
+    return os.path.splitext(os.path.basename(dicom_file_path))[0]
+
+
+class SubOperations:
+    """
+    Count the C-STORE sub-operations of a C-MOVE sent through the association
+    pool.
+
+    pynetdicom only counts the datasets it sends itself: :py:meth:`write_counts`
+    writes these counts in the final C-MOVE-RSP before it is encoded.
+    """
+    def __init__(self, message_id):
+        """
+        :param message_id: The Message ID of the C-MOVE-RQ
+        :type message_id: int
+        """
+        self.message_id = message_id
+        self.completed = 0
+        self.failed = 0
+        self.warning = 0
+        self.failed_uids = []
+
+    def add(self, dicom_file_path, status):
+        """
+        Count one sub-operation
+
+        :param dicom_file_path: The path of the dicom file sent
+        :type dicom_file_path: str
+        :param status: The status of the C-STORE-RSP (None if the file was not
+            sent or the peer did not answer)
+        :type status: int
+        """
+        category = None if status is None else code_to_category(status)
+        if category == STATUS_SUCCESS:
+            self.completed += 1
+            return
+        if category == STATUS_WARNING:
+            self.warning += 1
+        else:
+            self.failed += 1
+        self.failed_uids.append(instance_uid(dicom_file_path))
+
+    def final_status(self):
+        """
+        Return the final status of the C-MOVE
+
+        :return: Success, or Warning with the Failed SOP Instance UID List if
+            a sub-operation failed
+        :rtype: tuple (int, :py:class:`pydicom.dataset.Dataset`)
+        """
+        if not self.failed and not self.warning:
+            return 0x0000, None
+        identifier = Dataset()
+        identifier.FailedSOPInstanceUIDList = self.failed_uids
+        return 0xB000, identifier
+
+    def write_counts(self, event):
+        """
+        Handler of evt.EVT_DIMSE_SENT writing the counts in the final
+        C-MOVE-RSP
+
+        :param event: The event
+        :type event: :py:class:`pynetdicom.events.Event`
+        """
+        message = event.message
+        if (not isinstance(message, C_MOVE_RSP)
+                or message.command_set.MessageIDBeingRespondedTo !=
+                self.message_id
+                or message.command_set.Status == 0xFF00):
+            return
+        command_set = message.command_set
+        command_set.NumberOfCompletedSuboperations = self.completed
+        command_set.NumberOfFailedSuboperations = self.failed
+        command_set.NumberOfWarningSuboperations = self.warning
+        message._set_command_group_length()  # pylint: disable=protected-access
+
 
 class CMove(Associate, Verbose):
     """
@@ -73,9 +171,9 @@ class CMove(Associate, Verbose):
             self.thread_hdfs.start()
 
         sleep(settings.TIME_SLEEP_HDFS)
-        print("lance cmove normale")
+        LOG_TRANSACTION.debug("Start the C-MOVE of the files from HDFS")
 
-    def end_cmove_hdfs(self, matching, thread_pool):
+    def end_cmove_hdfs(self, matching, thread_pool, send=None):
         """
          Check path and send instance
 
@@ -83,7 +181,12 @@ class CMove(Associate, Verbose):
         :type matching: list
         :param thread_pool: multiprocessing
         :type thread_pool: :py:class:`multiprocessing.pool.ThreadPool`
+        :param send: The function sending one path [default: execute_send]
+        :type send: function, optional
+        :return: The (path, status) of the files sent (see execute_send)
+        :rtype: list [tuple (str, int)]
         """
+        send = self.execute_send if send is None else send
         paths_not_exists = []
         paths_exists = []
         all_path = matching
@@ -91,9 +194,10 @@ class CMove(Associate, Verbose):
         check_exists_file(all_path, paths_exists, paths_not_exists)
         all_path = copy(paths_not_exists)
         paths_not_exists.clear()
+        results = []
 
         if paths_exists:
-            thread_pool.map(self.execute_send, paths_exists)
+            results += zip(paths_exists, thread_pool.map(send, paths_exists))
             paths_exists.clear()
 
         count_paths_not_exits = []
@@ -103,7 +207,8 @@ class CMove(Associate, Verbose):
             paths_not_exists.clear()
 
             if paths_exists:
-                thread_pool.map(self.execute_send, paths_exists)
+                results += zip(paths_exists,
+                               thread_pool.map(send, paths_exists))
                 paths_exists.clear()
 
             # check if there are paths exists in the database but
@@ -128,6 +233,7 @@ class CMove(Associate, Verbose):
         if 'thread_hdfs' in [thread.name for thread in threading.enumerate()] \
                 and self.thread_hdfs.queue.qsize() == 0:
             self.thread_hdfs.stop_thread()
+        return results
 
     def cmove_response(self, event):
         """
@@ -137,8 +243,18 @@ class CMove(Associate, Verbose):
         :type event: :py:class:`pynetdicom.events.Event`
         :return: DICOM status hex code
 
+            Pending
+              | ``0xFF00`` - A dataset sent by pynetdicom (pending responses)
+
             Success
-              | ``0xFF00`` - Success Cmove
+              | ``0x0000`` - All the sub-operations succeeded
+
+            Warning
+              | ``0xB000`` - Sub-operations failed, their SOP Instance UIDs are
+                in the Failed SOP Instance UID List
+
+            Cancel
+              | ``0xFE00`` - C-CANCEL received (pending responses)
 
             Failure
               | ``0xC000`` - QueryRetrieveLevel not in ds
@@ -205,7 +321,6 @@ class CMove(Associate, Verbose):
             # pylint: disable=protected-access
             self.move_aet = \
                 event.request._move_destination.strip().decode('utf-8')
-            print("move_aet =  {0}".format(self.move_aet))
             LOG_TRANSACTION.debug("move_aet = %s ", self.move_aet)
             if self.move_aet not in list_allowed_pacs.keys():
                 # Unknown destination AE
@@ -231,30 +346,65 @@ class CMove(Associate, Verbose):
 
             matching = self.dicom_path_move.path_found(ds, qr_level)
             if len(matching):
-                print('The number of instances equals to : ' + str(len(matching)))
+                LOG_TRANSACTION.info("The number of instances equals to : %s",
+                                     len(matching))
                 if settings.START_MOVE_HDFS:
                     self.satrt_cmove_hdfs(ds, qr_level)
 
                 yield len(matching)
 
+                if settings.PENDING_RESPONSES_MOVE \
+                        and not settings.START_MOVE_HDFS:  # Pending
+                    # pynetdicom sends the datasets over one association
+                    # with the destination and counts the Remaining,
+                    # Completed, Failed and Warning sub-operations: the
+                    # sends are serial, settings.NB_THREAD threads only read
+                    # the files ahead
+                    datasets = self.read_datasets(matching)
+                    for ds in datasets:
+                        if event.is_cancelled:
+                            LOG_TRANSACTION.info("C-CANCEL received")
+                            datasets.close()
+                            yield 0xFE00, None
+                            return
+                        yield 0xFF00, ds
+                    LOG_TRANSACTION.info('{:_^76}'.format('End cmove_response'))
+                    return
+
                 thread_pool = ThreadPool(processes=settings.NB_THREAD)
+                pool = AssociationPool(self.ae, addr, port, self.move_aet)
+                send = partial(self.execute_send, pool=pool)
                 # Log
                 message_log = 'Send {0} path of instances with {1} Thread'.format(
                     len(matching), settings.NB_THREAD)
                 self.create_verbose(self.dict_verbose, **{'log': message_log})
                 LOG_TRANSACTION.debug(message_log)
                 # End log
+                sub_operations = SubOperations(event.request.MessageID)
                 if settings.START_MOVE_HDFS:
-                    self.end_cmove_hdfs(matching, thread_pool)
-                elif settings.PENDING_RESPONSES_MOVE:  # Pending
-                    for dicom_file_path in matching:
-                        ds = self.execute_send(dicom_file_path)
-                        yield 0xFF00, ds
+                    results = self.end_cmove_hdfs(matching, thread_pool, send)
                 else:  # No Pending
-                    thread_pool.map(self.execute_send, matching)
+                    read_ahead = ReadAhead(matching)
+                    results = zip(read_ahead.paths, thread_pool.map(
+                        read_ahead.wrap(send), read_ahead.paths))
+                    read_ahead.close()
+                for dicom_file_path, status in results:
+                    sub_operations.add(dicom_file_path, status)
 
                 thread_pool.close()
+                pool.close()
+                LOG_TRANSACTION.info(
+                    "Sub-operations: %s completed, %s failed, %s warning",
+                    sub_operations.completed, sub_operations.failed,
+                    sub_operations.warning)
                 LOG_TRANSACTION.info('{:_^76}'.format('End cmove_response'))
+                event.assoc.bind(evt.EVT_DIMSE_SENT,
+                                 sub_operations.write_counts)
+                try:
+                    yield sub_operations.final_status()
+                finally:
+                    event.assoc.unbind(evt.EVT_DIMSE_SENT,
+                                       sub_operations.write_counts)
             else:
                 LOG_TRANSACTION.critical("Matching is empty")
                 yield 0
@@ -270,98 +420,178 @@ class CMove(Associate, Verbose):
 
             return self.DICOM_CODE_ASSOCIATION_ABORTED
 
-    def execute_send(self, dicom_file_path):
+    def read_datasets(self, matching):
+        """
+        Read the DICOM files with settings.NB_THREAD threads while the
+        previous ones are sent. The order of matching is kept (sorted on disk)
+        and at most 2 * settings.NB_THREAD datasets wait in memory.
+
+        :param matching: Dicom file path list
+        :type matching: list
+        :return: Generator of dataset (see read_dataset)
+        :rtype: generator
+        """
+        thread_pool = ThreadPool(processes=settings.NB_THREAD)
+        in_progress = deque()
+        try:
+            for dicom_file_path in ReadAhead(matching):
+                in_progress.append(thread_pool.apply_async(
+                    self.read_dataset, (dicom_file_path,)))
+                if len(in_progress) >= 2 * settings.NB_THREAD:
+                    yield in_progress.popleft().get()
+            while in_progress:
+                yield in_progress.popleft().get()
+        finally:
+            # Stop reading on C-CANCEL or if the association is aborted
+            thread_pool.terminate()
+
+    def read_dataset(self, dicom_file_path):
+        """
+        Read the DICOM file of a sub-operation
+
+        :param dicom_file_path: The path of a dicom file
+        :type dicom_file_path: str
+        :return: The dataset; if the file cannot be read, a dataset with only
+            the SOP Instance UID so that the sub-operation is counted as failed
+        :rtype: :py:class:`pydicom.dataset.Dataset`
+        """
+        try:
+            ds = dcmread(dicom_file_path)
+            # Log
+            self.create_verbose(self.dict_verbose, **{
+                'study_uid': ds.StudyInstanceUID,
+                'series_uid': ds.SeriesInstanceUID,
+                'instance_uid': ds.SOPInstanceUID,
+                'commit': False,
+                'log': "Read the dicom file '%s' and send the dataset DICOM "
+                       "to %s " % (dicom_file_path, self.move_aet)})
+            log_dataset(LOG_TRANSACTION, ds, dicom_file_path)
+            # End log
+            return ds
+        except (InvalidDicomError, OSError) as error:
+            # Log
+            message_log = "'%s' is not a DICOM regular file" % dicom_file_path
+            LOG_TRANSACTION.error(error)
+            LOG_TRANSACTION.error(message_log)
+            self.create_verbose(self.dict_verbose, **{
+                'success': False,
+                "log": message_log})
+            # End log
+        failed = Dataset()
+        failed.SOPInstanceUID = instance_uid(dicom_file_path)
+        return failed
+
+    def execute_send(self, dicom_file_path, pool=None):
         """
         Send the DICOM file to another PACS
 
         :param dicom_file_path: The path of a dicom file
         :type dicom_file_path: str
+        :param pool: The associations with the move destination (if None a
+            new association is created and released)
+        :type pool: :py:class:`sphere.pacs.associate.AssociationPool`, optional
+        :return: The status of the C-STORE-RSP, None if the file was not sent
+            or the peer did not answer
+        :rtype: int
         """
-        assoc = self.generate_new_association_from_aet(self.move_aet)
-        if assoc.is_established:
-            try:
-                try:
-                    ds = dcmread(dicom_file_path)
-                    # Log
-                    message_log = "Read the dicom file '%s' and send the " \
-                                  "dataset DICOM  with 'send_c_store' to %s " \
-                                  % (dicom_file_path, self.move_aet)
-                    self.create_verbose(self.dict_verbose, **{
-                        'study_uid': ds.StudyInstanceUID,
-                        'series_uid': ds.SeriesInstanceUID,
-                        'instance_uid': ds.SOPInstanceUID,
-                        'commit': False,
-                        'log': message_log})
-                    LOG_TRANSACTION.debug(message_log)
-                    log_dataset(LOG_TRANSACTION, ds, dicom_file_path)
-                    # End log
+        if pool is not None:
+            assoc = pool.acquire()
+        else:
+            assoc = self.generate_new_association_from_aet(self.move_aet)
+        try:
+            if assoc.is_established:
+                return self.send_file(assoc, dicom_file_path)
+            else:
+                # Log
+                message_log = "Association rejected or aborted"
+                self.create_verbose(self.dict_verbose, **{
+                    'success': False,
+                    'final_status': self.DICOM_CODE_ASSOCIATION_ABORTED,
+                    "log": message_log})
+                LOG_TRANSACTION.error(message_log)
+                # End log
+                return None
+        finally:
+            if pool is not None:
+                pool.release(assoc)
+            elif assoc.is_established:
+                assoc.release()
+
+    def send_file(self, assoc, dicom_file_path):
+        """
+        Send the DICOM file on an established association
 
-                    status = assoc.send_c_store(ds)
-                    if 'Status' in status:
-                        # If the storage request succeeded this will be 0x0000
-                        print('C-STORE request status: 0x{0:04x}'.format(
-                            status.Status))
-                        if status.Status == 0xc211:
-                            # Log
-                            message_log = 'Unhandled exception raised by the ' \
-                                          'handler bound to evt.EVT_C_STORE'
-                            self.create_verbose(self.dict_verbose, **{
-                                'success': False,
-                                "log": message_log})
-                            LOG_TRANSACTION.error(message_log)
-                            # End log
-                            assoc.release()
-                            print("Error: 0xc211")
-                        if status.Status == 0x0000:
-                            assoc.release()
-                            if settings.START_MOVE_HDFS and settings.REMOVE_FILE:
-                                os.remove(dicom_file_path)
-                            if settings.PENDING_RESPONSES_MOVE and not settings.START_MOVE_HDFS:  # Pending
-                                return ds
-
-                    else:
-                        # Log
-                        message_log = 'Connection timed out or invalid ' \
-                                      'response from peer'
-                        self.create_verbose(self.dict_verbose, **{
-                            'success': False,
-                            "log": message_log})
-                        LOG_TRANSACTION.error(message_log)
-                        # End log
-                    assoc.release()
-                except InvalidDicomError as error:
+        :param assoc: The associate
+        :type assoc: :py:class:`pynetdicom.association.Association`
+        :param dicom_file_path: The path of a dicom file
+        :type dicom_file_path: str
+        :return: The status of the C-STORE-RSP, None if the file was not sent
+            or the peer did not answer
+        :rtype: int
+        """
+        try:
+            ds = dcmread(dicom_file_path)
+            # Log
+            message_log = "Read the dicom file '%s' and send the " \
+                          "dataset DICOM  with 'send_c_store' to %s " \
+                          % (dicom_file_path, self.move_aet)
+            self.create_verbose(self.dict_verbose, **{
+                'study_uid': ds.StudyInstanceUID,
+                'series_uid': ds.SeriesInstanceUID,
+                'instance_uid': ds.SOPInstanceUID,
+                'commit': False,
+                'log': message_log})
+            LOG_TRANSACTION.debug(message_log)
+            log_dataset(LOG_TRANSACTION, ds, dicom_file_path)
+            # End log
+
+            status = assoc.send_c_store(ds)
+            if 'Status' in status:
+                # If the storage request succeeded this will be 0x0000
+                LOG_TRANSACTION.debug("C-STORE request status: 0x%04x",
+                                      status.Status)
+                if status.Status == 0xc211:
                     # Log
-                    message_log = "'%s'1 is not a DICOM regular file" % dicom_file_path
-                    LOG_TRANSACTION.error(error)
-                    LOG_TRANSACTION.error(message_log)
+                    message_log = 'Unhandled exception raised by the ' \
+                                  'handler bound to evt.EVT_C_STORE'
                     self.create_verbose(self.dict_verbose, **{
                         'success': False,
                         "log": message_log})
+                    LOG_TRANSACTION.error(message_log)
                     # End log
-                    assoc.release()
-                except Exception as error:
-                    LOG_TRANSACTION.exception(error)
-                    assoc.release()
-            except FileNotFoundError:
-                print('\n\tSorry, \'', dicom_file_path, '\' not found.\n')
+                if status.Status == 0x0000:
+                    if settings.START_MOVE_HDFS and settings.REMOVE_FILE:
+                        os.remove(dicom_file_path)
+                return status.Status
+            else:
                 # Log
-                message_log = " This file '%s' not found." % dicom_file_path
+                message_log = 'Connection timed out or invalid ' \
+                              'response from peer'
                 self.create_verbose(self.dict_verbose, **{
                     'success': False,
                     "log": message_log})
                 LOG_TRANSACTION.error(message_log)
                 # End log
-                assoc.release()
-        else:
-            print('Association rejected or aborted')
+        except FileNotFoundError:
             # Log
-            message_log = "Association rejected or aborted"
+            message_log = " This file '%s' not found." % dicom_file_path
             self.create_verbose(self.dict_verbose, **{
                 'success': False,
-                'final_status': self.DICOM_CODE_ASSOCIATION_ABORTED,
                 "log": message_log})
             LOG_TRANSACTION.error(message_log)
             # End log
+        except InvalidDicomError as error:
+            # Log
+            message_log = "'%s'1 is not a DICOM regular file" % dicom_file_path
+            LOG_TRANSACTION.error(error)
+            LOG_TRANSACTION.error(message_log)
+            self.create_verbose(self.dict_verbose, **{
+                'success': False,
+                "log": message_log})
+            # End log
+        except Exception as error:
+            LOG_TRANSACTION.exception(error)
+        return None
 
     def execute_move(self, ds, ae_cstore, query_model):
         """
@@ -378,6 +608,8 @@ class CMove(Associate, Verbose):
                 | - ``S``
 
         :type query_model:
+        :return: True if the peer moved all the instances
+        :rtype: bool
         """
         # Log
         self.create_verbose(
@@ -385,57 +617,72 @@ class CMove(Associate, Verbose):
         dataset_dict_verbose = deepcopy(self.dict_verbose)
         # End log
 
-        assoc = self.generate_new_association_from_aet()
-        if assoc.is_established:
-            # Use the C-MOVE service to send the identifier
-            # A query_model value of 'P' means use the 'Patient Root Query
-            #   Retrieve Information Model - Move' presentation context
+        for attempt in range(1, ASSOCIATION_ATTEMPTS + 1):
+            assoc = self.generate_new_association_from_aet()
+            if assoc.is_established:
+                break
             # Log
-            LOG_TRANSACTION.debug('ds =')
-            for line in ds:
-                LOG_TRANSACTION.debug(line)
-
-            self.create_verbose(dataset_dict_verbose, **{
-                'log': 'Association Success and start send a DICOM ds = ',
-                'dataset': ds})
+            msg = 'Association rejected or aborted'
+            self.create_verbose(self.dict_verbose, **{
+                'log': msg, 'success': False})
+            LOG_TRANSACTION.error("%s (attempt %s of %s)", msg, attempt,
+                                  ASSOCIATION_ATTEMPTS)
             # End log
-            ae_cstore = bytes(ae_cstore, 'utf-8')  # Convert string to bytes
-            responses = assoc.send_c_move(ds, ae_cstore,
-                                          query_model=query_model)
-            try:
-                for (status, identifier) in responses:
-                    print(
-                        'C-MOVE query status: 0x{0:04x}'.format(status.Status))
-
-                    # If the status is 'Pending' then the identifier is
-                    # the C-MOVE response
-                    if status.Status in (0xFF00, 0xFF01):
-                        print(identifier)
-            except AttributeError:
-                # Log
-                msg = 'Dataset object has no attribute Status; dataset is empty'
-                self.create_verbose(self.dict_verbose, **{
-                    'log': msg, 'success': False})
-                LOG_TRANSACTION.error(msg)
-                # End log
-                print(
-                    'Error: Dataset object has no attribute Status; '
-                    'dataset is empty')
-            else:
-                # Release the association
-                self.assoc.release()
-                #assoc.release()
         else:
+            return False
+
+        # Use the C-MOVE service to send the identifier
+        # A query_model value of 'P' means use the 'Patient Root Query
+        #   Retrieve Information Model - Move' presentation context
+        # Log
+        LOG_TRANSACTION.debug('ds =')
+        for line in ds:
+            LOG_TRANSACTION.debug(line)
+
+        self.create_verbose(dataset_dict_verbose, **{
+            'log': 'Association Success and start send a DICOM ds = ',
+            'dataset': ds})
+        # End log
+        final_status = None
+        try:
+            responses = assoc.send_c_move(
+                ds, bytes(ae_cstore, 'utf-8'), query_model=query_model)
+            for (status, identifier) in responses:
+                LOG_TRANSACTION.debug("C-MOVE query status: 0x%04x",
+                                      status.Status)
+                final_status = status.Status
+
+                # If the status is 'Pending' then the identifier is
+                # the C-MOVE response
+                if status.Status in (0xFF00, 0xFF01):
+                    LOG_TRANSACTION.debug("C-MOVE response: %s", identifier)
+        except AttributeError:
             # Log
-            msg = 'Association rejected or aborted'
+            msg = 'Dataset object has no attribute Status; dataset is empty'
             self.create_verbose(self.dict_verbose, **{
                 'log': msg, 'success': False})
             LOG_TRANSACTION.error(msg)
             # End log
-
+            return False
+        finally:
+            # Release the association
             assoc.release()
-            print('Association rejected or aborted')
-            self.execute_move(ds, ae_cstore, query_model)
+        return final_status == 0x0000
+
+    @staticmethod
+    def job_uid(ds):
+        """
+        Return the uid of a C-MOVE identifier recorded in the transfer job
+
+        :param ds: The identifier
+        :type ds: :py:class:`pydicom.dataset.Dataset`
+        :return: The uid of the Query/Retrieve level
+        :rtype: str
+        """
+        keyword = {'PATIENT': 'PatientID', 'STUDY': 'StudyInstanceUID',
+                   'SERIES': 'SeriesInstanceUID'}.get(
+                       ds.get('QueryRetrieveLevel'), 'StudyInstanceUID')
+        return str(ds.get(keyword, ''))
 
     def cmove_request(self, **kwargs):
         """
@@ -454,6 +701,8 @@ class CMove(Associate, Verbose):
                         | - ``S``
 
                 | file_uid          : Output file path
+                | resume            : The job to resume, the uids already
+                    moved are skipped
                 | verbose_level            : The verbose_level
 
                     list of possible value of verbose_level:
@@ -502,10 +751,17 @@ class CMove(Associate, Verbose):
         elif query_model == "P":
             query_model = PatientRootQueryRetrieveInformationModelMove
 
+        # Record the status of each uid in the job
+        job = TransferJob('move', kwargs.get('resume'))
+        dict_ds = {self.job_uid(ds): ds for ds in list_ds}
+        list_ds = [dict_ds[uid] for uid in job.start(list(dict_ds))]
+
+        def send(ds):
+            job.mark(self.job_uid(ds), self.execute_move(
+                ds, ae_cstore=ae_cstore, query_model=query_model))
+
         start_time = time.time()
         po = ThreadPool(processes=settings.NB_THREAD)
-        send = partial(
-            self.execute_move, ae_cstore=ae_cstore, query_model=query_model)
 
         # Log
         message_log = 'Send {0} {1}_UID with {2} Thread'.format(
@@ -516,6 +772,7 @@ class CMove(Associate, Verbose):
         # End log
 
         po.map(send, list_ds)
+        job.finish()
         # Release the association
         self.assoc.release()
         print(execution_time(start_time))
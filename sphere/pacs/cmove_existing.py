@@ -0,0 +1,224 @@
+"""
+Move from a PACS the patients, studies or series missing in the local
+database. The C-FIND responses are checked in the database by batch as they
+arrive and the missing uids are moved at once, so that the C-FIND, the check
+and the C-MOVE run at the same time.
+"""
+import os
+import queue
+import threading
+import time
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+from pydicom.dataset import Dataset
+from pynetdicom.sop_class import (
+    PatientRootQueryRetrieveInformationModelMove,
+    StudyRootQueryRetrieveInformationModelMove)
+
+from sphere import settings
+from sphere.dicmeta.database_pacs import DatabasePACS
+from sphere.dicmeta.requests.patient_request import PatientRequest
+from sphere.dicmeta.requests.study_request import StudyRequest
+from sphere.dicmeta.requests.series_request import SeriesRequest
+from sphere.pacs.transfer_job import TransferJob
+from sphere.utilities.msg import execution_time
+from sphere.logs.logs import LOG_TRANSACTION
+
+# Maximum number of uids checked in the database with one query
+EXISTING_BATCH = 100
+# Marks the end of the C-FIND responses
+FIND_END = None
+
+# The keyword of the uid and the request of the local database for each level
+LEVELS = {
+    'PATIENT': ('PatientID', PatientRequest),
+    'STUDY': ('StudyInstanceUID', StudyRequest),
+    'SERIES': ('SeriesInstanceUID', SeriesRequest),
+}
+
+
+class CMoveExisting:
+    """
+    Synchronise the local database with a PACS: C-FIND on the PACS, check of
+    the uids found in the database and C-MOVE of the missing ones, as a
+    pipeline.
+    """
+    def __init__(self, cfind, cmove, qr_level='STUDY'):
+        """
+        :param cfind: The C-FIND service associated with the PACS
+        :type cfind: :py:class:`sphere.pacs.cfind.CFind`
+        :param cmove: The C-MOVE service associated with the PACS
+        :type cmove: :py:class:`sphere.pacs.cmove.CMove`
+        :param qr_level: The query retrieve level
+
+            The possible value: ``PATIENT``, ``STUDY`` or ``SERIES``
+
+        :type qr_level: str
+        """
+        self.cfind = cfind
+        self.cmove = cmove
+        self.qr_level = qr_level
+        self.keyword, request = LEVELS[qr_level]
+        self.request = request(DatabasePACS())
+        if qr_level == 'PATIENT':
+            self.move_model = PatientRootQueryRetrieveInformationModelMove
+        else:
+            self.move_model = StudyRootQueryRetrieveInformationModelMove
+        # The uids found by the C-FIND, not yet checked
+        self.found = queue.Queue(maxsize=10 * EXISTING_BATCH)
+        self.nb_found = 0
+        self.nb_missing = 0
+
+    def find(self, ds, query_model, output_filepath=None):
+        """
+        Put the uids of the C-FIND responses in the queue (run in a thread)
+
+        :param ds: The query dataset
+        :type ds: :py:class:`pydicom.dataset.Dataset`
+        :param query_model: The query model of the C-FIND (``P``, ``S`` or
+            ``SE``)
+        :type query_model: str
+        :param output_filepath: The file of the uids found
+        :type output_filepath: str, optional
+        """
+        seen = set()
+        output = open(output_filepath, 'w') if output_filepath else None
+        try:
+            for identifier in self.cfind.iter_find(ds, query_model):
+                uid = str(identifier.get(self.keyword, ''))
+                if uid and uid not in seen:
+                    seen.add(uid)
+                    if output:
+                        output.write(uid + '\n')
+                    self.found.put(uid)
+        except Exception as exc:
+            LOG_TRANSACTION.exception(exc)
+        finally:
+            self.nb_found = len(seen)
+            if output:
+                output.close()
+            self.found.put(FIND_END)
+
+    def next_batch(self):
+        """
+        Wait for one uid and take the ones already found, up to
+        EXISTING_BATCH
+
+        :return: The uids and False once the C-FIND is finished
+        :rtype: tuple (list [str], bool)
+        """
+        batch = [self.found.get()]
+        while batch[-1] is not FIND_END and len(batch) < EXISTING_BATCH:
+            try:
+                batch.append(self.found.get_nowait())
+            except queue.Empty:
+                break
+        if batch[-1] is FIND_END:
+            return batch[:-1], False
+        return batch, True
+
+    def missing(self, job, diff_filepath=None):
+        """
+        Yield the uids found which are not in the database, one query for
+        each batch
+
+        :param job: The transfer job (the uids already moved are skipped)
+        :type job: :py:class:`sphere.pacs.transfer_job.TransferJob`
+        :param diff_filepath: The file of the missing uids
+        :type diff_filepath: str, optional
+        :return: Generator of the uids to move
+        :rtype: generator [str]
+        """
+        output = open(diff_filepath, 'w') if diff_filepath else None
+        try:
+            running = True
+            while running:
+                batch, running = self.next_batch()
+                if not batch:
+                    continue
+                existing = self.request.get_existing_keys(batch)
+                missing = [uid for uid in batch if uid not in existing]
+                self.nb_missing += len(missing)
+                if output and missing:
+                    output.write('\n'.join(missing) + '\n')
+                    output.flush()
+                if missing:
+                    yield from job.start(missing)
+        finally:
+            if output:
+                output.close()
+
+    def move(self, uid, job, ae_cstore):
+        """
+        Move one uid and record the result in the job
+
+        :param uid: The uid
+        :type uid: str
+        :param job: The transfer job
+        :type job: :py:class:`sphere.pacs.transfer_job.TransferJob`
+        :param ae_cstore: Application Entity to send CSTORE (AE)
+        :type ae_cstore: str
+        """
+        ds = Dataset()
+        ds.QueryRetrieveLevel = self.qr_level
+        setattr(ds, self.keyword, uid)
+        try:
+            job.mark(uid, self.cmove.execute_move(
+                ds, ae_cstore=ae_cstore, query_model=self.move_model))
+        except Exception as exc:
+            LOG_TRANSACTION.exception(exc)
+            job.mark(uid, False, str(exc))
+
+    def run(self, ds, ae_cstore, query_model, resume=None,
+            output_filepath=None):
+        """
+        Find the uids on the PACS and move the ones missing in the database
+
+        :param ds: The query dataset of the C-FIND
+        :type ds: :py:class:`pydicom.dataset.Dataset`
+        :param ae_cstore: Application Entity to send CSTORE (AE)
+        :type ae_cstore: str
+        :param query_model: The query model of the C-FIND (``P``, ``S`` or
+            ``SE``)
+        :type query_model: str
+        :param resume: The job to resume
+        :type resume: str, optional
+        :param output_filepath: The file of the uids found; the missing ones
+            are written in the file prefixed with ``diff_``
+        :type output_filepath: str, optional
+        :return: The number of uids moved
+        :rtype: int
+        """
+        start_time = time.time()
+        diff_filepath = None
+        if output_filepath:
+            diff_filepath = os.path.join(
+                os.path.dirname(output_filepath),
+                'diff_' + os.path.basename(output_filepath))
+        job = TransferJob('move', resume)
+
+        finder = threading.Thread(
+            target=self.find, args=(ds, query_model, output_filepath),
+            name='cmove_existing_find', daemon=True)
+        finder.start()
+        thread_pool = ThreadPool(processes=settings.NB_THREAD)
+        nb_moved = 0
+        for _ in thread_pool.imap_unordered(
+                partial(self.move, job=job, ae_cstore=ae_cstore),
+                self.missing(job, diff_filepath)):
+            if not nb_moved:
+                LOG_TRANSACTION.info("First uid moved after %.1f s",
+                                     time.time() - start_time)
+            nb_moved += 1
+        thread_pool.close()
+        finder.join()
+        job.finish()
+
+        message = '{0} {1} found, {2} missing in the database, {3} moved ' \
+                  'in {4}'.format(self.nb_found, self.qr_level,
+                                  self.nb_missing, nb_moved,
+                                  execution_time(start_time))
+        LOG_TRANSACTION.info(message)
+        print(message)
+        return nb_moved
@@ -1,21 +1,26 @@
 """ Store DICOM in PACS"""
 import sys
+import threading
 import time
-from time import sleep
 from copy import deepcopy
+from itertools import chain
 from multiprocessing.pool import ThreadPool  # Process
 from functools import partial
 
 from pydicom import dcmread
+from pydicom.dataset import Dataset
 from pynetdicom import _config
 
 from sphere.fsa.file_system_access import FileSystemAccess
 from sphere import settings
 from sphere.pacs.associate import Associate
+from sphere.pacs.send_queue import Checkpoint, RateLimiter, SendQueue
+from sphere.pacs.transfer_job import TransferJob, UidProgress
+from sphere.pacs.store_window import StoreWindow, async_ops_negotiation
 from sphere.logs.verbose import Verbose
 
 from sphere.utilities.list_accessible_ae import auth_in
-from sphere.utilities.dicom_utils import all_dicom_instance_path
+from sphere.utilities.dicom_utils import iter_dicom_instance_path
 from sphere.utilities.file import file_instance_date, read_file_return_list
 from sphere.utilities.msg import execution_time
 from sphere.utilities.log_tools import log_dataset
@@ -24,6 +29,10 @@ from sphere.logs.logs import LOG_EVENT_SPHERE, LOG_TRANSACTION
 
 _config.DECODE_STORE_DATASETS = False
 
+# Banners of the log of each C-STORE received (formatted once)
+START_RESPONSE = '{:_^76}'.format('Start cstore_response')
+END_RESPONSE = '{:_^76}'.format('End cstore_response')
+
 
 class CStore(Associate, Verbose):
     """
@@ -37,6 +46,11 @@ class CStore(Associate, Verbose):
 
         self.dicom_path_store = DicomPathCStore()
         self.action_dicom_code_name = 'CSTORE'
+        # Number of files not stored by the peer
+        self.nb_failed = 0
+        # The status of each uid of the store in progress
+        self.progress = None
+        self.lock_failed = threading.Lock()
 
     def cstore_response(self, event):
         """
@@ -54,7 +68,7 @@ class CStore(Associate, Verbose):
               | ``0xC211`` - Method error
         :rtype: str
         """
-        LOG_TRANSACTION.info('{:_^76}'.format('Start cstore_response'))
+        LOG_TRANSACTION.info(START_RESPONSE)
         self.ae.count_assoc = len(self.ae.active_associations)
         context = event.context
 
@@ -75,12 +89,13 @@ class CStore(Associate, Verbose):
 
         # Log
         log_dataset(LOG_TRANSACTION, ds)
-        self.create_verbose(dict_verbose, **{
-            'study_uid': ds.StudyInstanceUID,
-            'series_uid': ds.SeriesInstanceUID,
-            'instance_uid': ds.SOPInstanceUID,
-            'commit': False,
-            'log': 'Get dicom with event.dataset'})
+        if self.verbose_enabled(dict_verbose):
+            self.create_verbose(dict_verbose, **{
+                'study_uid': ds.StudyInstanceUID,
+                'series_uid': ds.SeriesInstanceUID,
+                'instance_uid': ds.SOPInstanceUID,
+                'commit': False,
+                'log': 'Get dicom with event.dataset'})
         # End log
         if settings.CREATE_FILE_UID:
             LOG_TRANSACTION.info("Create a file '%s' in a directory '%s' "
@@ -165,7 +180,7 @@ class CStore(Associate, Verbose):
                 'log': 'DICOM File Stored in FS',
                 'final_status': self.DICOM_CODE_SUCCESS})
             # End log
-            LOG_TRANSACTION.info('{:_^76}'.format('End cstore_response'))
+            LOG_TRANSACTION.info(END_RESPONSE)
             return self.DICOM_CODE_SUCCESS
         else:
             # log
@@ -197,6 +212,10 @@ class CStore(Associate, Verbose):
             | fileUID       : The path of the uid (required if source_paths_db_fs = db)
             | dicom_path    : The path of the dicom files (required if source_paths_db_fs = fs)
             | many_assoc    : Many or one assoc (True | False) [default: True] (optional)
+            | checkpoint    : The checkpoint file to resume an interrupted store (optional)
+            | resume        : The job to resume, the uids already sent are skipped (optional)
+            | rate_mb       : Maximum MB sent per second (optional)
+            | rate_images   : Maximum files sent per second (optional)
             | verbose_level       : The verbose level default None (optional)
 
                 list of possible value of verbose:
@@ -245,6 +264,7 @@ class CStore(Associate, Verbose):
             LOG_TRANSACTION.debug(message_log)
             # End Log
             start_time = time.time()
+            checkpoint = Checkpoint(kwargs.get('checkpoint'))
             if source_paths_db_fs == "db":
                 LOG_TRANSACTION.info("Search the file path in the database "
                                      "and not in the file system")
@@ -264,44 +284,51 @@ class CStore(Associate, Verbose):
                 else:
                     LOG_TRANSACTION.info("Store only one Uid.")
                     list_uid = [uid]
-                sleep_store = settings.SLEEP_IN_STORE
-                # With sleep
-                if sleep_store and list_uid and list_uid[0] != '*':
-                    LOG_TRANSACTION.info("Store with sleep between each set "
-                                         "of instances linked to uid")
-                    # Send one by one with a sleep
-                    for uid in list_uid:
-                        list_instance_path = self.dicom_path_store.all_paths(
-                            model_name, [uid])
-                        LOG_TRANSACTION.info("I will send %s instances with "
-                                             "Store", len(list_instance_path))
-                        self.start_send(list_instance_path, many_assoc, uid)
-                        if list_instance_path and uid != list_uid[-1]:
-                            LOG_TRANSACTION.warning("sleep %s minutes of "
-                                                    "store ", sleep_store/60)
-                            sleep(sleep_store)
-                        elif not list_instance_path:
-                            LOG_TRANSACTION.error(
-                                "The %s_uid '%s'  not exists in "
-                                "database", model_name, uid)
-                # Without sleep
+                rate_limiter = RateLimiter(kwargs.get('rate_mb'),
+                                           kwargs.get('rate_images'))
+                if list_uid and list_uid[0] != '*':
+                    # One stream of the paths of all the uids, the status of
+                    # each uid is recorded in the job as soon as its paths
+                    # are acknowledged
+                    job = TransferJob('store', kwargs.get('resume'))
+                    pending = job.start(list_uid)
+                    self.progress = UidProgress(checkpoint.position, job)
+                    checkpoint.progress = self.progress
+                    try:
+                        nb_instance = self.start_send(
+                            self.progress.paths(self.dicom_path_store.iter_paths(
+                                model_name, pending, with_uid=True)),
+                            many_assoc, checkpoint=checkpoint,
+                            rate_limiter=rate_limiter)
+                        job.mark_all(self.progress.results(pending))
+                    finally:
+                        self.progress = None
+                    # The job keeps the uids done, resume it with --resume
+                    checkpoint.clear()
+                    job.finish()
+                    self.display_log(nb_instance, source_paths_db_fs,
+                                     file_path=file_path, model_name=model_name)
                 else:
-                    LOG_TRANSACTION.info("Store without sleep")
-                    list_instance_path = self.dicom_path_store.all_paths(
-                        model_name, list_uid)
-                    self.start_send(list_instance_path, many_assoc)
+                    LOG_TRANSACTION.info("Store all the instances")
+                    nb_instance = self.start_send(
+                        self.dicom_path_store.iter_paths(model_name, list_uid),
+                        many_assoc, checkpoint=checkpoint,
+                        rate_limiter=rate_limiter)
 
-                    self.display_log(list_instance_path, source_paths_db_fs,
+                    self.display_log(nb_instance, source_paths_db_fs,
                                      file_path=file_path, model_name=model_name)
 
             else:  # file system
                 LOG_TRANSACTION.info("Search the file path in the file system "
                                      "and not in the database")
                 dicom_path = kwargs.get('dicom_path')
-                list_instance_path = all_dicom_instance_path(dicom_path)
-                self.display_log(list_instance_path, source_paths_db_fs,
+                nb_instance = self.start_send(
+                    iter_dicom_instance_path(dicom_path), many_assoc,
+                    checkpoint=checkpoint,
+                    rate_limiter=RateLimiter(kwargs.get('rate_mb'),
+                                             kwargs.get('rate_images')))
+                self.display_log(nb_instance, source_paths_db_fs,
                                  dicom_path=dicom_path)
-                self.start_send(list_instance_path, many_assoc)
 
             total_store_time = execution_time(start_time)
             msg = f"Total store time: {total_store_time}"
@@ -312,13 +339,13 @@ class CStore(Associate, Verbose):
         LOG_TRANSACTION.info('{:_^76}'.format('End cstore_request'))
 
     @staticmethod
-    def display_log(list_instance_path, source_paths_db_fs,
+    def display_log(nb_instance, source_paths_db_fs,
                     file_path=None, model_name=None, dicom_path=None):
         """
         Display log
 
-        :param list_instance_path: list instance path
-        :type list_instance_path: list
+        :param nb_instance: The number of instance paths
+        :type nb_instance: int
         :param source_paths_db_fs: The source of path
         :type source_paths_db_fs: str
 
@@ -340,7 +367,7 @@ class CStore(Associate, Verbose):
         :param dicom_path: The path of the dicom folder
         :type dicom_path: str
         """
-        if not list_instance_path:
+        if not nb_instance:
             if source_paths_db_fs == "db":
                 LOG_TRANSACTION.error("All %s_uid in file '%s' not exists "
                                       "in database", model_name, file_path)
@@ -348,56 +375,78 @@ class CStore(Associate, Verbose):
                 LOG_TRANSACTION.error("No valid DICOM or folder %s is empty ",
                                       dicom_path)
         else:
-            LOG_TRANSACTION.info(
-                "I will send %s instances",
-                len(list_instance_path))
+            LOG_TRANSACTION.info("%s instances sent", nb_instance)
 
-    def start_send(self, list_dicom_instance_path, many_assoc, uid=None):
+    def start_send(self, dicom_instance_paths, many_assoc, uid=None,
+                   checkpoint=None, rate_limiter=None):
         """
         Start the send of file DICOM
 
-        :param list_dicom_instance_path: List all DICOM instance path
-        :type list_dicom_instance_path: list
+        The paths are read lazily and given to the send threads through a
+        bounded queue, so the first file is sent at once and the memory does
+        not depend on the number of paths.
+
+        :param dicom_instance_paths: All DICOM instance path (list or
+            generator, in a stable order if a checkpoint is used)
+        :type dicom_instance_paths: iterable [str]
         :param many_assoc: If many associate (True) else only one (False)
         :type many_assoc: bool
-        :param uid: The uid of (patient, study, series or instance) if used sleep in store
+        :param uid: The uid of (patient, study, series or instance) if the uids are sent one by one
         :type uid: str
+        :param checkpoint: The checkpoint of the paths already sent
+        :type checkpoint: :py:class:`sphere.pacs.send_queue.Checkpoint`, optional
+        :param rate_limiter: The limit of files and bytes sent per second
+        :type rate_limiter: :py:class:`sphere.pacs.send_queue.RateLimiter`, optional
+        :return: The number of paths
+        :rtype: int
         """
         start_time = time.time()
+        checkpoint = Checkpoint() if checkpoint is None else checkpoint
 
+        # Log
+        copy_dict_verbose = deepcopy(self.dict_verbose)
+        message_log = 'Send files Dicom with {0} Thread'.format(
+            settings.NB_THREAD)
         if uid:  # send one by one
-            # Log
-            copy_dict_verbose = deepcopy(self.dict_verbose)
-            message_log = f'Send {len(list_dicom_instance_path)} files Dicom' \
-                          f' with {settings.NB_THREAD} Thread of this {uid}'
-            self.create_verbose(self.dict_verbose, **{'log': message_log})
-            LOG_TRANSACTION.debug(message_log)
-            # End log
-        else:  # send all
-            # Log
-            copy_dict_verbose = deepcopy(self.dict_verbose)
-            message_log = 'Send {0} files Dicom with {1} Thread'.format(
-                len(list_dicom_instance_path), settings.NB_THREAD)
-            self.create_verbose(self.dict_verbose, **{'log': message_log})
-            LOG_TRANSACTION.debug(message_log)
-            # End log
+            message_log += f' of this {uid}'
+        self.create_verbose(self.dict_verbose, **{'log': message_log})
+        LOG_TRANSACTION.debug(message_log)
+        # End log
 
-        thread_pool = ThreadPool(processes=settings.NB_THREAD)
-        if not many_assoc:
-            assoc = self.generate_new_association_from_aet()
+        send_queue = SendQueue(dicom_instance_paths, start=checkpoint.position,
+                               rate_limiter=rate_limiter)
+        if settings.ASYNC_OPS_WINDOW != 1:
+            # One association per thread with several C-STORE-RQ outstanding
+            nb_thread = settings.NB_THREAD if many_assoc else 1
+            send = partial(self.execute_send_window, send_queue, checkpoint)
         else:
-            assoc = None
-        send = partial(self.execute_send, assoc=assoc, many_assoc=many_assoc)
-        thread_pool.map(send, list_dicom_instance_path)
+            # The association shared by the threads would interleave their
+            # C-STORE-RQ: only one thread sends on it
+            nb_thread = settings.NB_THREAD if many_assoc else 1
+            if not many_assoc:
+                assoc = self.generate_new_association_from_aet()
+            else:
+                assoc = None
+
+            def send(_thread_number):
+                for position, dcmpath in send_queue:
+                    if self.execute_send(dcmpath, assoc, many_assoc):
+                        checkpoint.acknowledge(position)
+
+        thread_pool = ThreadPool(processes=nb_thread)
+        thread_pool.map(send, range(nb_thread))
         thread_pool.close()
-        if not many_assoc:
+        send_queue.close()
+        if settings.ASYNC_OPS_WINDOW == 1 and not many_assoc:
             assoc.release()
+        checkpoint.finish(send_queue.total, send_queue.complete)
+        nb_path = send_queue.total - send_queue.start
+
         exec_time = execution_time(start_time)
         if uid:
             # Log
             self.create_verbose(copy_dict_verbose, **{
-                'log': f'We have finished sending '
-                       f'{len(list_dicom_instance_path)} '
+                'log': f'We have finished sending {nb_path} '
                        f'dicom files of this uid {uid} \n# {exec_time}'})
             print(exec_time)
             LOG_TRANSACTION.info(exec_time)
@@ -406,13 +455,13 @@ class CStore(Associate, Verbose):
             # Log
             self.create_verbose(copy_dict_verbose, **{
                 'log': 'We have finished sending {0} dicom files \n# {1}'.
-                                format(len(list_dicom_instance_path),
-                                       exec_time)})
+                                format(nb_path, exec_time)})
             # End Log
+        return nb_path
 
     def execute_send(self, dcmpath, assoc, many_assoc):
         """
-        Execute send the DICOM (send_c_store)
+        Execute send the DICOM (C-STORE-RQ streamed from the file)
 
         :param dcmpath: The path of a DICOM instance file
         :type dcmpath: str
@@ -420,7 +469,11 @@ class CStore(Associate, Verbose):
         :type assoc: :py:class:`pynetdicom.association.Association`
         :param many_assoc: If many associate (True) else only one (False)
         :type many_assoc: bool
+        :return: False if the peer did not answer (the file must be sent
+            again)
+        :rtype: bool
         """
+        acknowledged = []
         try:
             dict_verbose = self.dict_verbose
 
@@ -442,8 +495,9 @@ class CStore(Associate, Verbose):
                            'file %s ' % dcmpath})
                 # End log
 
+                # The pixel data are streamed from the file by StoreWindow
                 # pylint: disable=invalid-name
-                ds = dcmread(dcmpath, stop_before_pixels=False)
+                ds = dcmread(dcmpath, stop_before_pixels=True)
 
                 # Log
                 log_dataset(LOG_TRANSACTION, ds, dcmpath)
@@ -459,40 +513,10 @@ class CStore(Associate, Verbose):
                     'log': 'Execute TCP Request (send dataset)'})
                 # End log
 
-                status = assoc.send_c_store(ds)
-
-                # Check the status of the storage request
-                if 'Status' in status:
-                    # If the storage request succeeded this will be 0x0000
-                    if '0x{0:04x}'.format(status.Status) != '0x0000':
-                        print('C-STORE request status: 0x{0:04x}'.format(
-                            status.Status))
-                    if status.Status == 0xc211:
-                        # Log
-                        self.create_verbose(dict_verbose, **{
-                            'success': False,
-                            'final_status': self.DICOM_CODE_CSTORE_METHOD_ERROR}
-                                            )
-                        LOG_TRANSACTION.error(
-                            "SC-STORE SCP implementation error")
-                        # End log
-
-                    else:
-                        # Log
-                        self.create_verbose(dict_verbose, **{
-                            'final_status': self.DICOM_CODE_PENDING,
-                            'success': False,
-                            'log': 'TCP Request finalized'})
-                        LOG_TRANSACTION.info(
-                            "TCP Request finalized dicom_code: "
-                            "0x{0:04x}".format(self.DICOM_CODE_PENDING))
-                        # End log
-                else:
-                    # Log
-                    self.create_verbose(
-                        dict_verbose, **{'log': 'Status not in status'})
-                    # End log
-                    print('Connection timed out or invalid response from peer')
+                StoreWindow(assoc, window=1).send_all(
+                    [(dcmpath, dcmpath)],
+                    lambda path, status: acknowledged.append(
+                        self.check_status(status, dict_verbose, path)))
 
                 if many_assoc:
                     # Release the association
@@ -507,8 +531,141 @@ class CStore(Associate, Verbose):
                 LOG_TRANSACTION.error("Release the association and this file "
                                       "%s not send", dcmpath)
                 # End log
+                return False
         except ValueError:
             LOG_TRANSACTION.error("This file %s not send.", dcmpath)
         except Exception as exc:
             LOG_TRANSACTION.exception("This file %s not send. \n %s",
                                       dcmpath, exc)
+        return all(acknowledged)
+
+    def check_status(self, status, dict_verbose, dcmpath=None):
+        """
+        Check the status of the storage request
+
+        :param status: The status returned by the peer (empty if the peer
+            timed out, aborted or sent an invalid response)
+        :type status: :py:class:`pydicom.dataset.Dataset`
+        :param dict_verbose: The verbose dictionary
+        :type dict_verbose: dict
+        :param dcmpath: The path of a DICOM instance file
+        :type dcmpath: str, optional
+        :return: False if the peer did not answer
+        :rtype: bool
+        """
+        if status is None:
+            # The file was not read, it is logged by StoreWindow
+            self.count_failed(dcmpath)
+            self.create_verbose(dict_verbose, **{
+                'success': False, 'log': 'File not read %s' % dcmpath})
+            return True
+        if 'Status' in status:
+            # If the storage request succeeded this will be 0x0000
+            if status.Status != 0x0000:
+                LOG_TRANSACTION.warning("C-STORE request status: 0x%04x (%s)",
+                                        status.Status, dcmpath or '')
+            # Warnings (0xBxxx) are stored by the peer
+            if status.Status != 0x0000 and status.Status & 0xF000 != 0xB000:
+                self.count_failed(dcmpath)
+            if status.Status == 0xc211:
+                # Log
+                self.create_verbose(dict_verbose, **{
+                    'success': False,
+                    'final_status': self.DICOM_CODE_CSTORE_METHOD_ERROR})
+                LOG_TRANSACTION.error("SC-STORE SCP implementation error %s",
+                                      dcmpath or '')
+                # End log
+
+            else:
+                # Log
+                self.create_verbose(dict_verbose, **{
+                    'final_status': self.DICOM_CODE_PENDING,
+                    'success': False,
+                    'log': 'TCP Request finalized'})
+                LOG_TRANSACTION.info(
+                    "TCP Request finalized dicom_code: "
+                    "0x{0:04x}".format(self.DICOM_CODE_PENDING))
+                # End log
+        else:
+            # Log
+            self.create_verbose(
+                dict_verbose, **{'log': 'Status not in status'})
+            # End log
+            LOG_TRANSACTION.error("This file %s not send: connection timed "
+                                  "out or invalid response from peer", dcmpath)
+            return False
+        return True
+
+    def count_failed(self, dcmpath=None):
+        """
+        Count a file not stored by the peer (thread safe)
+
+        :param dcmpath: The path of the DICOM instance file
+        :type dcmpath: str, optional
+        """
+        with self.lock_failed:
+            self.nb_failed += 1
+        if self.progress is not None:
+            self.progress.fail(dcmpath)
+
+    def execute_send_window(self, send_queue, checkpoint, _thread_number=0):
+        """
+        Send the DICOM files on one association keeping several C-STORE-RQ
+        outstanding (Asynchronous Operations Window). Falls back to
+        one C-STORE-RQ at a time if the peer refuses the window.
+
+        :param send_queue: The queue of (position, path) to send
+        :type send_queue: :py:class:`sphere.pacs.send_queue.SendQueue`
+        :param checkpoint: The checkpoint of the paths already sent
+        :type checkpoint: :py:class:`sphere.pacs.send_queue.Checkpoint`
+        :param _thread_number: The number of the thread (not used)
+        :type _thread_number: int, optional
+        """
+        dict_verbose = self.dict_verbose
+
+        def callback(key, status):
+            position, dcmpath = key
+            if self.check_status(status, dict_verbose, dcmpath):
+                checkpoint.acknowledge(position)
+
+        try:
+            assoc = self.generate_new_association_from_aet(
+                ext_neg=async_ops_negotiation())
+            if not assoc.is_established:
+                LOG_TRANSACTION.warning("Association with asynchronous "
+                                        "operations window refused, retry "
+                                        "without it")
+                assoc = self.generate_new_association_from_aet()
+
+            if not assoc.is_established:
+                # Log
+                self.create_verbose(dict_verbose, **{
+                    'success': False,
+                    'final_status': self.DICOM_CODE_ASSOC_REJECTED_ABORTED,
+                    'log': 'Failed to etablish access'})
+                LOG_TRANSACTION.error("Association rejected, the files of "
+                                      "this thread are not send")
+                # End log
+                return
+
+            items = ((item, item[1]) for item in send_queue)
+            unacknowledged = StoreWindow(assoc).send_all(items, callback)
+            while unacknowledged is not None:
+                # A file failed in the middle of its C-STORE-RQ: the files
+                # without response are sent again on a new association
+                assoc = self.generate_new_association_from_aet(
+                    ext_neg=async_ops_negotiation())
+                if not assoc.is_established:
+                    LOG_TRANSACTION.error("Association rejected, the files of "
+                                          "this thread are not send")
+                    for key, _dcmpath in unacknowledged:
+                        callback(key, Dataset())
+                    return
+                unacknowledged = StoreWindow(assoc).send_all(
+                    chain(unacknowledged, items), callback)
+            if assoc.is_established:
+                assoc.release()
+            else:
+                LOG_TRANSACTION.error("Association aborted during the send")
+        except Exception as exc:
+            LOG_TRANSACTION.exception(exc)
@@ -0,0 +1,263 @@
+"""
+Feed the paths of the DICOM files to the send threads through a bounded queue
+and keep a checkpoint of the paths already processed
+"""
+import json
+import os
+import queue
+import threading
+import time
+from itertools import islice
+
+from sphere import settings
+from sphere.fsa.read_ahead import ReadAhead
+from sphere.logs.logs import LOG_TRANSACTION
+
+# Number of acknowledged paths between two saves of the checkpoint
+CHECKPOINT_EVERY = 100
+# Marks the end of the paths in the queue
+QUEUE_END = None
+
+
+class Checkpoint:
+    """
+    Position of the first path not yet acknowledged in an ordered stream of
+    paths. It is saved in a JSON file so that an interrupted store starts
+    again from this position.
+    """
+    def __init__(self, path=None, save_every=CHECKPOINT_EVERY, progress=None):
+        """
+        :param path: The checkpoint file (None: the checkpoint is not saved)
+        :type path: str, optional
+        :param save_every: Number of acknowledged paths between two saves
+        :type save_every: int, optional
+        :param progress: Also told of each acknowledged position (the
+            status of each uid of a job)
+        :type progress: :py:class:`sphere.pacs.transfer_job.UidProgress`,
+            optional
+        """
+        self.path = path
+        self.save_every = save_every
+        self.progress = progress
+        self.lock = threading.Lock()
+        # Positions acknowledged after the first one not yet acknowledged
+        self.acknowledged = set()
+        self.count = 0
+        self.position = self.load()
+
+    def load(self):
+        """
+        Read the position saved in the checkpoint file
+
+        :return: The position (0 if there is no checkpoint file)
+        :rtype: int
+        """
+        if not self.path or not os.path.isfile(self.path):
+            return 0
+        try:
+            with open(self.path) as file:
+                position = int(json.load(file)['position'])
+            LOG_TRANSACTION.info("Resume from the checkpoint '%s': %s paths "
+                                 "already sent", self.path, position)
+            return position
+        except (ValueError, KeyError, TypeError) as error:
+            LOG_TRANSACTION.error("Invalid checkpoint file '%s': %s",
+                                  self.path, error)
+            return 0
+
+    def acknowledge(self, position):
+        """
+        The path at this position is processed (thread safe)
+
+        :param position: The position of the path
+        :type position: int
+        """
+        with self.lock:
+            self.acknowledged.add(position)
+            while self.position in self.acknowledged:
+                self.acknowledged.remove(self.position)
+                self.position += 1
+            self.count += 1
+            if self.count % self.save_every == 0:
+                self.save()
+        if self.progress is not None:
+            self.progress.acknowledge(position)
+
+    def save(self):
+        """ Write the position in the checkpoint file"""
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'position': self.position}, file)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """ Remove the checkpoint file"""
+        with self.lock:
+            if self.path and os.path.isfile(self.path):
+                os.remove(self.path)
+
+    def finish(self, total, complete=True):
+        """
+        Remove the checkpoint file if all the paths are acknowledged, save it
+        otherwise
+
+        :param total: The number of paths
+        :type total: int
+        :param complete: False if the paths were not all read
+        :type complete: bool, optional
+        """
+        with self.lock:
+            if complete and self.position >= total:
+                if self.path and os.path.isfile(self.path):
+                    os.remove(self.path)
+            else:
+                LOG_TRANSACTION.warning("%s paths not acknowledged, the "
+                                        "checkpoint is at %s",
+                                        total - self.position, self.position)
+                self.save()
+
+
+class RateLimiter:
+    """
+    Space the sends so that neither the number of files nor the number of
+    bytes per second exceed the limits (thread safe)
+    """
+    def __init__(self, mb_per_second=None, images_per_second=None):
+        """
+        :param mb_per_second: Maximum MB sent per second, 0 for no limit
+            [default: settings.RATE_LIMIT_MB]
+        :type mb_per_second: float, optional
+        :param images_per_second: Maximum files sent per second, 0 for no
+            limit [default: settings.RATE_LIMIT_IMAGES]
+        :type images_per_second: float, optional
+        """
+        mb_per_second = settings.RATE_LIMIT_MB \
+            if mb_per_second is None else mb_per_second
+        images_per_second = settings.RATE_LIMIT_IMAGES \
+            if images_per_second is None else images_per_second
+        self.bytes_per_second = mb_per_second * 1024 * 1024
+        self.images_per_second = images_per_second
+        self.lock = threading.Lock()
+        # Time from which the next file can be sent
+        self.next_time = time.monotonic()
+        if self:
+            LOG_TRANSACTION.info("Rate limit: %s MB/s, %s images/s (0 = no "
+                                 "limit)", mb_per_second, images_per_second)
+
+    def __bool__(self):
+        return bool(self.bytes_per_second or self.images_per_second)
+
+    def wait(self, path):
+        """
+        Wait until the file can be sent
+
+        :param path: The path of the file
+        :type path: str
+        """
+        if not self:
+            return
+        duration = 0
+        if self.images_per_second:
+            duration = 1 / self.images_per_second
+        if self.bytes_per_second:
+            try:
+                duration = max(duration,
+                               os.path.getsize(path) / self.bytes_per_second)
+            except OSError:
+                pass
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + duration
+        if start > now:
+            time.sleep(start - now)
+
+
+class SendQueue:
+    """
+    Bounded queue of (position, path) filled by a thread reading the paths
+    lazily, so that the first file is sent before all the paths are known
+    and the memory does not depend on the number of paths.
+    """
+    def __init__(self, paths, start=0, maxsize=None, rate_limiter=None):
+        """
+        :param paths: The paths of the DICOM files (in a stable order)
+        :type paths: iterable [str]
+        :param start: Number of paths to skip (already sent)
+        :type start: int, optional
+        :param maxsize: Size of the queue [default: 2 * settings.NB_THREAD]
+        :type maxsize: int, optional
+        :param rate_limiter: Limit of the files taken from the queue per
+            second
+        :type rate_limiter: :py:class:`RateLimiter`, optional
+        """
+        self.rate_limiter = rate_limiter
+        self.queue = queue.Queue(
+            maxsize=2 * settings.NB_THREAD if maxsize is None else maxsize)
+        self.stop = threading.Event()
+        self.start = start
+        self.total = start
+        # True once all the paths are in the queue
+        self.complete = False
+        self.producer = threading.Thread(
+            target=self.produce, args=(paths,), name='send_queue',
+            daemon=True)
+        self.producer.start()
+
+    def produce(self, paths):
+        """
+        Put the paths in the queue (run in the producer thread)
+
+        :param paths: The paths of the DICOM files
+        :type paths: iterable [str]
+        """
+        try:
+            # Not sorted: the position of a path in the stream is its resume
+            # checkpoint and UidProgress needs the paths of a uid together.
+            # The stream is ordered by uid then id, close to the order the
+            # files were written on the disk.
+            paths = ReadAhead(islice(paths, self.start, None), sort=False)
+            for position, path in enumerate(paths, start=self.start):
+                if not self.put((position, path)):
+                    return
+                self.total = position + 1
+            self.complete = True
+        except Exception as exc:
+            LOG_TRANSACTION.exception(exc)
+        finally:
+            self.put(QUEUE_END)
+
+    def put(self, item):
+        """
+        Put an item, waiting for free space unless the queue is closed
+
+        :param item: The item
+        :type item: tuple (int, str) or None
+        :return: False if the queue is closed
+        :rtype: bool
+        """
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is QUEUE_END:
+                # Let the other consumers see the end
+                self.queue.put(QUEUE_END)
+                return
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait(item[1])
+            yield item
+
+    def close(self):
+        """ Stop the producer and wait for it"""
+        self.stop.set()
+        self.producer.join()
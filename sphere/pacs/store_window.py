@@ -0,0 +1,314 @@
+"""
+Send C-STORE requests through an Asynchronous Operations Window
+"""
+# pylint: disable=protected-access
+import os
+import time
+from io import BytesIO
+
+from pydicom import dcmread
+from pydicom.dataset import Dataset
+from pydicom.filereader import read_preamble, _read_file_meta_info
+from pynetdicom import evt
+from pynetdicom.dimse_messages import C_STORE_RQ
+from pynetdicom.dimse_primitives import C_STORE
+from pynetdicom.dsutils import encode
+from pynetdicom.pdu_primitives import (
+    AsynchronousOperationsWindowNegotiation, P_DATA)
+
+from sphere import settings
+from sphere.logs.logs import LOG_TRANSACTION
+
+# Size of the file reads if the peer did not limit the PDU length
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def async_ops_negotiation(window=None):
+    """
+    Create the Asynchronous Operations Window negotiation item
+
+    :param window: The maximum number of operations invoked
+        [default: settings.ASYNC_OPS_WINDOW]
+    :type window: int, optional
+    :return: The list of extended negotiation items (empty if window is 1)
+    :rtype: list [:py:class:`pynetdicom.pdu_primitives.AsynchronousOperationsWindowNegotiation`]
+    """
+    window = settings.ASYNC_OPS_WINDOW if window is None else window
+    if window == 1:
+        return []
+    item = AsynchronousOperationsWindowNegotiation()
+    item.maximum_number_operations_invoked = window
+    item.maximum_number_operations_performed = 1
+    return [item]
+
+
+def read_file_meta(dcmpath):
+    """
+    Read the File Meta Information of a DICOM file
+
+    :param dcmpath: The path of a DICOM instance file
+    :type dcmpath: str
+    :return: The file meta and the offset of the dataset in the file
+    :rtype: tuple (:py:class:`pydicom.dataset.FileMetaDataset`, int)
+    :raises pydicom.errors.InvalidDicomError: if the file has no preamble
+    """
+    with open(dcmpath, 'rb') as fp:
+        read_preamble(fp, False)
+        file_meta = _read_file_meta_info(fp)
+        return file_meta, fp.tell()
+
+
+def negotiated_window(assoc, window=None):
+    """
+    Return the number of outstanding C-STORE-RQ accepted by the peer
+
+    :param assoc: The association
+    :type assoc: :py:class:`pynetdicom.association.Association`
+    :param window: The maximum number of operations invoked proposed
+        [default: settings.ASYNC_OPS_WINDOW]
+    :type window: int, optional
+    :return: The window size (1 if the peer refused the negotiation)
+    :rtype: int
+    """
+    window = settings.ASYNC_OPS_WINDOW if window is None else window
+    async_ops = assoc.acceptor.asynchronous_operations
+    if window == 1 or not async_ops:
+        return 1
+    # The peer answers with the number of operations it can perform; 0 means
+    # unlimited
+    performed = async_ops[1]
+    if window == 0:
+        return performed if performed else 1
+    return min(window, performed) if performed else window
+
+
+class StoreWindow:
+    """
+    Keep several C-STORE-RQ outstanding on one association.
+
+    If the peer refused the Asynchronous Operations Window the requests are
+    sent one response after the other.
+    """
+    def __init__(self, assoc, window=None):
+        """
+        :param assoc: An established association
+        :type assoc: :py:class:`pynetdicom.association.Association`
+        :param window: The maximum number of operations invoked proposed
+        :type window: int, optional
+        """
+        self.assoc = assoc
+        self.window = negotiated_window(assoc, window)
+        # {Message ID: (key, DICOM instance path)}
+        self.outstanding = {}
+        self._msg_id = 0
+        # A PDU of the current C-STORE-RQ was given to the DUL
+        self.pdu_sent = False
+        LOG_TRANSACTION.debug("Asynchronous operations window = %s",
+                              self.window)
+
+    def next_msg_id(self):
+        """
+        Return the next Message ID (between 1 and 65535)
+
+        :return: The Message ID
+        :rtype: int
+        """
+        self._msg_id = self._msg_id % 65535 + 1
+        return self._msg_id
+
+    def send_all(self, items, callback):
+        """
+        Send the DICOM files and call callback with each response.
+
+        A file which fails before anything is sent (file meta, presentation
+        context) is given to callback and the next one is sent. If it fails
+        after its first PDU the peer waits for the end of the dataset: the
+        association is aborted, the file is given to callback as not read and
+        the items not acknowledged are returned to be sent again.
+
+        :param items: Iterable of (key, DICOM instance path) to send
+        :type items: iterable [tuple (object, str)]
+        :param callback: Called with (key, status) for each file; status is
+            an empty Dataset if the peer aborted or timed out, None if the
+            file could not be read
+        :type callback: function
+        :return: None, or the (key, DICOM instance path) sent without response
+            if the association was aborted (they are not given to callback)
+        :rtype: list [tuple (object, str)]
+        """
+        self.pause_reactor()
+        try:
+            for key, dcmpath in items:
+                while len(self.outstanding) >= self.window:
+                    if not self.receive(callback):
+                        # The item taken is not sent either
+                        callback(key, Dataset())
+                        return None
+                self.pdu_sent = False
+                try:
+                    self.send_file(key, dcmpath)
+                except Exception as exc:
+                    LOG_TRANSACTION.exception("This file %s not send. \n %s",
+                                              dcmpath, exc)
+                    callback(key, None)
+                    if self.pdu_sent:
+                        return self.abort()
+            while self.outstanding:
+                if not self.receive(callback):
+                    return None
+        finally:
+            self.assoc._reactor_checkpoint.set()
+        return None
+
+    def abort(self):
+        """
+        Abort the association after a C-STORE-RQ partly sent
+
+        :return: The (key, DICOM instance path) sent without response
+        :rtype: list [tuple (object, str)]
+        """
+        LOG_TRANSACTION.error("C-STORE-RQ partly sent, abort the association "
+                              "(%s C-STORE-RQ without response)",
+                              len(self.outstanding))
+        unacknowledged = list(self.outstanding.values())
+        self.outstanding.clear()
+        self.assoc.abort()
+        return unacknowledged
+
+    def pause_reactor(self):
+        """ Pause the association reactor to read the responses ourselves"""
+        self.assoc._reactor_checkpoint.clear()
+        while not self.assoc._is_paused:
+            time.sleep(0.0001)
+
+    def send(self, key, dataset, dcmpath=None):
+        """
+        Send one C-STORE-RQ without waiting for the response
+
+        :param key: The key returned with the status
+        :type key: object
+        :param dataset: The dataset
+        :type dataset: :py:class:`pydicom.dataset.Dataset`
+        :param dcmpath: The path of the DICOM instance file
+        :type dcmpath: str, optional
+        """
+        # pylint: disable=no-member
+        context = self.assoc._get_valid_context(
+            dataset.SOPClassUID, dataset.file_meta.TransferSyntaxUID, 'scu')
+        transfer_syntax = context.transfer_syntax[0]
+        bytestream = encode(dataset, transfer_syntax.is_implicit_VR,
+                            transfer_syntax.is_little_endian,
+                            transfer_syntax.is_deflated)
+        if bytestream is None:
+            raise ValueError('Failed to encode the supplied Dataset')
+
+        req = C_STORE()
+        req.MessageID = self.next_msg_id()
+        req.AffectedSOPClassUID = dataset.SOPClassUID
+        req.AffectedSOPInstanceUID = dataset.SOPInstanceUID
+        req.Priority = 2
+        req.DataSet = BytesIO(bytestream)
+
+        self.pdu_sent = True
+        self.assoc.dimse.send_msg(req, context.context_id)
+        self.outstanding[req.MessageID] = (key, dcmpath)
+
+    def send_file(self, key, dcmpath):
+        """
+        Send one C-STORE-RQ without waiting for the response.
+
+        If the accepted transfer syntax is the one of the file, the bytes
+        after the File Meta Information are streamed in P-DATA without
+        decoding the dataset. Otherwise the file is read and re-encoded.
+
+        :param key: The key returned with the status
+        :type key: object
+        :param dcmpath: The path of a DICOM instance file
+        :type dcmpath: str
+        """
+        file_meta, offset = read_file_meta(dcmpath)
+        context = self.assoc._get_valid_context(
+            file_meta.MediaStorageSOPClassUID, file_meta.TransferSyntaxUID,
+            'scu')
+        if (context.transfer_syntax[0] != file_meta.TransferSyntaxUID
+                or os.path.getsize(dcmpath) <= offset):
+            self.send(key, dcmread(dcmpath, stop_before_pixels=False),
+                      dcmpath)
+            return
+
+        req = C_STORE()
+        req.MessageID = self.next_msg_id()
+        req.AffectedSOPClassUID = file_meta.MediaStorageSOPClassUID
+        req.AffectedSOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+        req.Priority = 2
+
+        # Command set only, the dataset is sent afterwards
+        msg = C_STORE_RQ()
+        msg.primitive_to_message(req)
+        msg.command_set.CommandDataSetType = 0x0001
+        msg.context_id = context.context_id
+        evt.trigger(self.assoc, evt.EVT_DIMSE_SENT, {'message': msg})
+
+        dimse = self.assoc.dimse
+        for pdata in msg.encode_msg(context.context_id,
+                                    dimse.maximum_pdu_size):
+            self.send_pdu(pdata)
+
+        fragment_length = (dimse.maximum_pdu_size - 6
+                           if dimse.maximum_pdu_size else STREAM_CHUNK_SIZE)
+        with open(dcmpath, 'rb') as fp:
+            fp.seek(offset)
+            chunk = fp.read(fragment_length)
+            while chunk:
+                next_chunk = fp.read(fragment_length)
+                # Dataset fragment: bits xxxxxx00, last one xxxxxx10
+                pdata = P_DATA()
+                pdata.presentation_data_value_list.append(
+                    [context.context_id,
+                     (b'\x00' if next_chunk else b'\x02') + chunk])
+                self.send_pdu(pdata)
+                chunk = next_chunk
+        self.outstanding[req.MessageID] = (key, dcmpath)
+
+    def send_pdu(self, pdata):
+        """
+        Give a P-DATA to the DUL, waiting for it to send the previous ones so
+        that only a few PDU are kept in memory
+
+        :param pdata: The P-DATA primitive
+        :type pdata: :py:class:`pynetdicom.pdu_primitives.P_DATA`
+        """
+        dul = self.assoc.dul
+        while (dul.to_provider_queue.qsize() > 1
+               and self.assoc.is_established):
+            time.sleep(0.0001)
+        self.pdu_sent = True
+        dul.send_pdu(pdata)
+
+    def receive(self, callback):
+        """
+        Wait for one C-STORE-RSP
+
+        :param callback: Called with (key, status)
+        :type callback: function
+        :return: False if the association was aborted or timed out
+        :rtype: bool
+        """
+        _context_id, rsp = self.assoc.dimse.get_msg(block=True)
+        if rsp is None:
+            self.assoc._handle_no_response()
+            LOG_TRANSACTION.error("No response from peer, %s C-STORE-RQ "
+                                  "without response",
+                                  len(self.outstanding))
+            for key, _dcmpath in self.outstanding.values():
+                callback(key, Dataset())
+            self.outstanding.clear()
+            return False
+
+        item = self.outstanding.pop(rsp.MessageIDBeingRespondedTo, None)
+        if item is None:
+            LOG_TRANSACTION.warning("Unexpected response Message ID %s",
+                                    rsp.MessageIDBeingRespondedTo)
+            return True
+        callback(item[0], self.assoc._check_received_status(rsp))
+        return True
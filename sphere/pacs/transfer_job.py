@@ -0,0 +1,346 @@
+"""
+Keep the progress of the bulk transfers (store and move) in a SQLite file so
+that an interrupted transfer is resumed without sending again the uids already
+transferred
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import closing
+
+from sphere import settings
+from sphere.logs.logs import LOG_TRANSACTION
+
+# Status of an uid in a job
+STATUS_PENDING = 'pending'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class TransferJob:
+    """
+    The uids of a transfer with their status and the number of failed
+    attempts. A new job is created for each transfer; ``--resume <job>``
+    transfers only the uids of the job which are not done.
+    """
+    lock = threading.Lock()
+
+    def __init__(self, action, job_id=None, job_path=None, max_retries=None):
+        """
+        :param action: The transfer (``store`` or ``move``)
+        :type action: str
+        :param job_id: The job to resume (None: create a new job)
+        :type job_id: str, optional
+        :param job_path: The SQLite file of the jobs
+            [default: settings.TRANSFER_JOB_PATH]
+        :type job_path: str, optional
+        :param max_retries: Number of failed attempts after which an uid is
+            no longer sent [default: settings.TRANSFER_JOB_MAX_RETRIES]
+        :type max_retries: int, optional
+        """
+        self.action = action
+        self.job_path = settings.TRANSFER_JOB_PATH \
+            if job_path is None else job_path
+        self.max_retries = settings.TRANSFER_JOB_MAX_RETRIES \
+            if max_retries is None else max_retries
+        with self.lock, closing(self.connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS transfer_job ("
+                "id TEXT PRIMARY KEY, action TEXT, status TEXT, "
+                "created REAL, updated REAL)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS transfer_item ("
+                "job_id TEXT, uid TEXT, status TEXT, retries INTEGER, "
+                "message TEXT, updated REAL, PRIMARY KEY (job_id, uid))")
+            if job_id is None:
+                job_id = '{0}_{1}_{2}'.format(
+                    action, time.strftime('%Y%m%d_%H%M%S'), os.getpid())
+                connection.execute(
+                    "INSERT INTO transfer_job VALUES (?, ?, ?, ?, ?)",
+                    (job_id, action, STATUS_PENDING, time.time(), time.time()))
+                LOG_TRANSACTION.info("Create the job '%s'", job_id)
+            elif connection.execute("SELECT id FROM transfer_job WHERE id = ?",
+                                    (job_id,)).fetchone() is None:
+                raise ValueError("The job '%s' does not exist in '%s'" % (
+                    job_id, self.job_path))
+            else:
+                LOG_TRANSACTION.info("Resume the job '%s'", job_id)
+        self.job_id = job_id
+        LOG_TRANSACTION.info("Job '%s' (resume it with --resume %s)", job_id,
+                             job_id)
+
+    def connect(self):
+        """
+        Connect to the jobs file
+
+        :return: The connection
+        :rtype: :py:class:`sqlite3.Connection`
+        """
+        return sqlite3.connect(self.job_path)
+
+    def start(self, list_uid):
+        """
+        Add the uids to the job and return the ones to transfer
+
+        :param list_uid: The uids of the transfer
+        :type list_uid: list [str]
+        :return: The uids not done and not failed too many times, in the order
+            of list_uid
+        :rtype: list [str]
+        """
+        list_uid = list(dict.fromkeys(list_uid))
+        with self.lock, closing(self.connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO transfer_item VALUES "
+                "(?, ?, ?, 0, NULL, ?)",
+                [(self.job_id, uid, STATUS_PENDING, time.time())
+                 for uid in list_uid])
+            states = dict(
+                (uid, (status, retries)) for uid, status, retries in
+                connection.execute(
+                    "SELECT uid, status, retries FROM transfer_item "
+                    "WHERE job_id = ?", (self.job_id,)))
+        pending = []
+        for uid in list_uid:
+            status, retries = states[uid]
+            if status == STATUS_DONE:
+                continue
+            if retries >= self.max_retries:
+                LOG_TRANSACTION.error("The uid '%s' failed %s times, it is "
+                                      "not sent again", uid, retries)
+                continue
+            pending.append(uid)
+        LOG_TRANSACTION.info("Job '%s': %s uids to transfer out of %s",
+                             self.job_id, len(pending), len(list_uid))
+        return pending
+
+    def mark(self, uid, success, message=None):
+        """
+        Record the result of the transfer of an uid (thread safe)
+
+        :param uid: The uid
+        :type uid: str
+        :param success: True if all the instances are transferred
+        :type success: bool
+        :param message: A message kept with the status
+        :type message: str, optional
+        """
+        with self.lock, closing(self.connect()) as connection, connection:
+            connection.execute(
+                "UPDATE transfer_item SET status = ?, "
+                "retries = retries + ?, message = ?, updated = ? "
+                "WHERE job_id = ? AND uid = ?",
+                (STATUS_DONE if success else STATUS_FAILED,
+                 0 if success else 1, message, time.time(), self.job_id, uid))
+
+    def mark_all(self, results):
+        """
+        Record the results of the transfer of several uids in one
+        transaction (thread safe)
+
+        :param results: The results (uid, success, message)
+        :type results: iterable [tuple (str, bool, str)]
+        """
+        with self.lock, closing(self.connect()) as connection, connection:
+            connection.executemany(
+                "UPDATE transfer_item SET status = ?, "
+                "retries = retries + ?, message = ?, updated = ? "
+                "WHERE job_id = ? AND uid = ?",
+                [(STATUS_DONE if success else STATUS_FAILED,
+                  0 if success else 1, message, time.time(), self.job_id, uid)
+                 for uid, success, message in results])
+
+    def summary(self):
+        """
+        Return the number of uids of the job by status
+
+        :return: {status: number of uids}
+        :rtype: dict
+        """
+        with closing(self.connect()) as connection:
+            return dict(connection.execute(
+                "SELECT status, COUNT(*) FROM transfer_item WHERE job_id = ? "
+                "GROUP BY status", (self.job_id,)))
+
+    def finish(self):
+        """ Record the status of the job and log its summary"""
+        summary = self.summary()
+        status = STATUS_DONE if set(summary) <= {STATUS_DONE} else \
+            STATUS_FAILED
+        with self.lock, closing(self.connect()) as connection, connection:
+            connection.execute(
+                "UPDATE transfer_job SET status = ?, updated = ? WHERE id = ?",
+                (status, time.time(), self.job_id))
+        message = "Job '{0}' {1}: {2}".format(
+            self.job_id, status, ', '.join(
+                '{0} {1}'.format(number, key)
+                for key, number in sorted(summary.items())))
+        if status == STATUS_DONE:
+            LOG_TRANSACTION.info(message)
+        else:
+            LOG_TRANSACTION.warning(message)
+
+
+class UidProgress:
+    """
+    The instances of each uid in one stream of paths: the number of paths,
+    of paths acknowledged and of paths refused by the peer (thread safe).
+    Only the paths not yet acknowledged are kept in memory.
+
+    The paths of an uid follow each other in the stream: once the next uid
+    starts, the number of paths of an uid is known and its result is recorded
+    in the job as soon as its last path is acknowledged.
+    """
+    def __init__(self, start=0, job=None):
+        """
+        :param start: Number of paths acknowledged before (checkpoint)
+        :type start: int, optional
+        :param job: The job recording the result of each uid
+        :type job: :py:class:`TransferJob`, optional
+        """
+        self.start = start
+        self.job = job
+        self.lock = threading.Lock()
+        self.total = Counter()
+        self.acknowledged = Counter()
+        self.failed = Counter()
+        # The paths not yet acknowledged {position: (uid, path)}
+        self.in_flight = {}
+        # {path: uid} of the paths not yet acknowledged
+        self.path_uids = {}
+        # The uids whose paths are all in the stream
+        self.closed = set()
+        # The uids whose result is recorded in the job
+        self.recorded = set()
+
+    def paths(self, items):
+        """
+        Yield the paths of the (uid, path) and record the uid of each position
+
+        :param items: The (uid, path), in a stable order, the paths of an uid
+            following each other
+        :type items: iterable [tuple (str, str)]
+        :return: Generator of the paths
+        :rtype: generator [str]
+        """
+        current = None
+        for position, (uid, path) in enumerate(items):
+            if uid != current:
+                if current is not None:
+                    self.close(current)
+                current = uid
+            with self.lock:
+                self.total[uid] += 1
+                if position < self.start:
+                    # Acknowledged before the checkpoint
+                    self.acknowledged[uid] += 1
+                else:
+                    self.in_flight[position] = (uid, path)
+                    self.path_uids[path] = uid
+            yield path
+        if current is not None:
+            self.close(current)
+
+    def close(self, uid):
+        """
+        All the paths of the uid are in the stream
+
+        :param uid: The uid
+        :type uid: str
+        """
+        with self.lock:
+            self.closed.add(uid)
+            result = self.finished(uid)
+        self.record(result)
+
+    def fail(self, path):
+        """
+        The peer refused the file of this path
+
+        :param path: The path
+        :type path: str
+        """
+        with self.lock:
+            uid = self.path_uids.get(path)
+            if uid is not None:
+                self.failed[uid] += 1
+
+    def acknowledge(self, position):
+        """
+        The path at this position is answered by the peer
+
+        :param position: The position of the path
+        :type position: int
+        """
+        result = None
+        with self.lock:
+            uid, path = self.in_flight.pop(position, (None, None))
+            if uid is not None:
+                self.path_uids.pop(path, None)
+                self.acknowledged[uid] += 1
+                result = self.finished(uid)
+        self.record(result)
+
+    def finished(self, uid):
+        """
+        Return the result of an uid whose paths are all acknowledged and
+        which is not yet recorded (the lock must be held)
+
+        :param uid: The uid
+        :type uid: str
+        :return: The result (uid, success, message) or None
+        :rtype: tuple (str, bool, str)
+        """
+        if self.job is None or uid in self.recorded or \
+                uid not in self.closed or \
+                self.acknowledged[uid] < self.total[uid]:
+            return None
+        self.recorded.add(uid)
+        return self.result(uid)
+
+    def result(self, uid):
+        """
+        Return the result of an uid (the lock must be held)
+
+        :param uid: The uid
+        :type uid: str
+        :return: The result (uid, success, message)
+        :rtype: tuple (str, bool, str)
+        """
+        total = self.total[uid]
+        failed = total - self.acknowledged[uid] + self.failed[uid]
+        return uid, not failed, f'{total} instances, {failed} failed'
+
+    def record(self, result):
+        """
+        Record the result of an uid in the job
+
+        :param result: The result (uid, success, message) or None
+        :type result: tuple (str, bool, str)
+        """
+        if result is not None and self.job is not None:
+            self.job.mark(*result)
+
+    def results(self, list_uid):
+        """
+        Return the result of each uid not yet recorded in the job
+
+        :param list_uid: The uids of the stream
+        :type list_uid: list [str]
+        :return: The results (uid, success, message)
+        :rtype: list [tuple (str, bool, str)]
+        """
+        results = []
+        with self.lock:
+            for uid in list_uid:
+                if uid in self.recorded:
+                    continue
+                if not self.total[uid]:
+                    LOG_TRANSACTION.error("The uid '%s' does not exist in the "
+                                          "database", uid)
+                    results.append((uid, False, 'Not in the database'))
+                    continue
+                results.append(self.result(uid))
+        return results
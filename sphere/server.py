@@ -10,10 +10,12 @@ from sphere.pacs.ae import SphereAE
 from sphere.dicmeta.thread import ThreadDatabase, g_queue_to_load
 from sphere.utilities.msg import term_bold, term_green, term_red, TERMINAL_MESSAGE
 from sphere.utilities.utils_database import check_db_pacs
+from sphere.utilities.list_accessible_ae import ACCESS_LIST
 from sphere.utilities.file import read_file_txt
 from sphere import settings
 from sphere.api_rest import utils
-from sphere.logs.logs import LOG_API_ANNOTATION, LOG_TRANSACTION
+from sphere.logs.logs import (
+    LOG_API_ANNOTATION, LOG_TRANSACTION, start_queue_logging)
 
 
 class Server:
@@ -24,6 +26,8 @@ class Server:
 
     def run(self):
         """ Run server """
+        if settings.LOG_QUEUE:
+            start_queue_logging()
         self.thread_db_save = ThreadDatabase(1, 'thread_db_save', 1)
         self.ae.initialize_callback_action()
         if settings.START_API:
@@ -36,6 +40,8 @@ class Server:
                 sleep(0.1)
 
             self.display_server_status()
+            # kill -HUP reloads the white list
+            ACCESS_LIST.reload_on_sighup()
             self.ae.start()
         except Exception as exc:
             LOG_TRANSACTION.exception(exc)
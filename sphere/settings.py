@@ -88,6 +88,8 @@ PDU_SIZE = CHECK_PARAM.check_number('ae_params.pdu_size', 0)
 ACSE_TIMEOUT = CHECK_PARAM.check_number('ae_params.acse_timeout', 120)
 DIMSE_TIMEOUT = CHECK_PARAM.check_number('ae_params.dimse_timeout', 120)
 NETWORK_TIMEOUT = CHECK_PARAM.check_number('ae_params.network_timeout', 120)
+# Asynchronous Operations Window proposed by the SCU (1 = synchronous)
+ASYNC_OPS_WINDOW = CHECK_PARAM.check_number('ae_params.max_operations_invoked', 1)
 
 ###############################################################################
 # -_-_-_-_-_-_-_-_-_-_-_-_-_-_-_-_-_- DIMSE -_-_-_-_-_-_-_-_-_-_-_-_-_-_-_-_- #
@@ -96,12 +98,28 @@ LOG_SETTINGS.info('{:_^70}'.format('Parameters of DIMSE'))
 
 SCP_SERVICES = CHECK_PARAM.check_str('scp_services', ['c-echo'])
 NB_THREAD = int(os.getenv('THREAD_NUMBER', CHECK_PARAM.check_number('thread.number', 4)))
+# Number of DICOM files read ahead while sending (0 = no read ahead)
+READ_AHEAD = CHECK_PARAM.check_number('thread.read_ahead', 8)
 # Search DICOM in file if database is empty (True| False)
 SEARCH_FILE = CHECK_PARAM.check_bool('search_in_file', False)
+# Catalogue of the DICOM files used when the search is done in the files
+FILE_CATALOGUE_PATH = CHECK_PARAM.check_path_file('file_catalogue', './app/file_catalogue.sqlite')
+# Seconds during which the search in the files does not refresh the catalogue
+FILE_CATALOGUE_REFRESH = CHECK_PARAM.check_number('file_catalogue_refresh', 60)
 SEND_EXTENDED_DB = CHECK_PARAM.check_bool('send_extended_db_of_find', False)
+# Return only the keys of the C-FIND request (True) or all the attributes of
+# the level (False)
+CFIND_RETURN_REQUESTED_KEYS = CHECK_PARAM.check_bool('return_requested_keys_of_find', True)
+# Pending responses of the C-MOVE SCP; the files are then sent one after the
+# other over one association (the threads only read them ahead)
 PENDING_RESPONSES_MOVE = CHECK_PARAM.check_bool('pending_responses_move', False)
 
-SLEEP_IN_STORE = os.getenv('SLEEP_IN_STORE', CHECK_PARAM.check_number('sleep_in_store', 0) * 60)
+# Limits of the sends of the store (0 = no limit)
+RATE_LIMIT_MB = CHECK_PARAM.check_number('rate_limit.mb_per_second', 0)
+RATE_LIMIT_IMAGES = CHECK_PARAM.check_number('rate_limit.images_per_second', 0)
+# Progress of the store and move, used to resume them
+TRANSFER_JOB_PATH = CHECK_PARAM.check_path_file('transfer_job.path', './app/transfer_job.sqlite')
+TRANSFER_JOB_MAX_RETRIES = CHECK_PARAM.check_number('transfer_job.max_retries', 3)
 # -_-_-The context -_-_- #
 DICT_CONTEXTS = {"default": StoragePresentationContexts}
 LOCAL_CONTEXT = CHECK_PARAM.check_str('context', 'default')
@@ -157,6 +175,9 @@ if not os.path.isdir(FS_PATH_WHITE_LIST):
     LOG_SETTINGS.error("You need to define a path for white list of this "
                        "server PACS. This path '%s' does not exits (The "
                        "parameter is 'path_white_list' )", FS_PATH_WHITE_LIST)
+# Cache of the IPs of the host names of the white list (in seconds)
+DNS_TTL = CHECK_PARAM.check_number('dns.ttl', 300)
+DNS_NEGATIVE_TTL = CHECK_PARAM.check_number('dns.negative_ttl', 30)
 
 # -_-_-_-_-_-_-_-_-_-_-_ HDFS -__-_-_-_-_-_-_-_-_-_ #
 START_MOVE_HDFS = CHECK_PARAM.check_bool('hdfs.start_move_hdfs', False)
@@ -222,6 +243,13 @@ DB_ENGINE_POOL_RECYCLE = CHECK_PARAM.check_number('db.engine_pool_recycle', 70)
 DB_ENGINE_POOL_TIMEOUT = CHECK_PARAM.check_number('db.engine_pool_timeout', 10)
 DB_SAVE_DELAY = CHECK_PARAM.check_number('db.save_delay', 5)
 DB_VERBOSE_ERROR = CHECK_PARAM.check_bool('db.verbose_error', False)
+DB_PARTITION = CHECK_PARAM.check_str_in_list('db.partition.method', 'NONE', ['NONE', 'RANGE', 'HASH'])
+DB_PARTITION_MODULUS = CHECK_PARAM.check_number('db.partition.modulus', 8)
+DB_PARTITION_MONTHS_AHEAD = CHECK_PARAM.check_number('db.partition.months_ahead', 2)
+if DB_PARTITION != 'NONE' and DB_ENGINE != 'postgresql':
+    LOG_SETTINGS.warning("The partitioning of the tables needs the "
+                         "postgresql engine, the tables are not partitioned.")
+    DB_PARTITION = 'NONE'
 
 PATH_COPY_EXTENDED = CHECK_PARAM.check_path_file('name_file_copy_extended_db', './app/.copy_extended.json')
 
@@ -362,6 +390,8 @@ LOG_STREAM_LEVEL = os.getenv('LOG_STREAM_LEVEL',
                              CHECK_PARAM.check_level_log('log.log_stream_level', 'WARNING', LIST_LOG_LEVEL))
 LOG_FILE_LEVEL = os.getenv('LOG_FILE_LEVEL', CHECK_PARAM.check_level_log('log.log_file_level', 'DEBUG', LIST_LOG_LEVEL))
 COLOR_MESSAGE = CHECK_PARAM.check_bool('log.color_message', True)
+# The server writes the logs in a background thread
+LOG_QUEUE = CHECK_PARAM.check_bool('log.queue', True)
 
 if COLOR_MESSAGE:
     DEFAULT_FORMATTER = '%(log_color)s%(asctime)s :: %(name)-20s :: ' \
@@ -149,6 +149,30 @@ def all_dicom_instance_path(dicom_path, return_format=None):
         return []
 
 
+def iter_dicom_instance_path(dicom_path):
+    """
+    Return the paths of the files of a folder lazily, in a stable order (the
+    files are not read, the ones that are not DICOM are rejected at the send)
+
+    :param dicom_path: Path of a DICOM file, of a folder or list of paths
+    :type dicom_path: str or list [str]
+    :return: Generator of the paths
+    :rtype: generator
+    """
+    if isinstance(dicom_path, list):
+        yield from dicom_path
+    elif os.path.isdir(dicom_path):
+        for path, subdirs, files in os.walk(dicom_path):
+            subdirs[:] = sorted(d for d in subdirs if not d[0] == '.')
+            for fpath in sorted(files):
+                if not fpath[0] == '.':
+                    yield os.path.join(path, fpath)
+    elif os.path.exists(dicom_path):
+        yield dicom_path
+    else:
+        LOG_TRANSACTION.critical("The file '%s' does not exist", dicom_path)
+
+
 def get_uid(dataset):
     """
         Get study_uid or series_uid of dataset
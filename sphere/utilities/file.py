@@ -2,18 +2,129 @@
 The functions utils
 """
 
+import atexit
 import os
 import csv
 import datetime
+import threading
+import time
 
 from sphere.logs.logs import LOG_CODE_PYTHON
 
+# Number of lines kept in memory before they are written
+FLUSH_EVERY = 100
+# Maximum time the lines are kept in memory (in seconds)
+FLUSH_INTERVAL = 5
+
+
+class AppendBuffer:
+    """
+    Lines appended to a file by batch: the file is opened once for each
+    batch instead of once for each line (thread safe)
+    """
+    lock = threading.Lock()
+    # {path: AppendBuffer}
+    buffers = {}
+    # The thread writing the lines of the idle buffers
+    flusher = None
+
+    def __init__(self, path, flush_every=FLUSH_EVERY,
+                 flush_interval=FLUSH_INTERVAL):
+        """
+        :param path: The path of the file
+        :type path: str
+        :param flush_every: Number of lines kept before they are written
+        :type flush_every: int, optional
+        :param flush_interval: Maximum time the lines are kept (in seconds)
+        :type flush_interval: float, optional
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.lines = []
+        self.flushed = time.monotonic()
+
+    @classmethod
+    def get(cls, path):
+        """
+        Return the buffer of a file
+
+        :param path: The path of the file
+        :type path: str
+        :return: The buffer
+        :rtype: :py:class:`AppendBuffer`
+        """
+        buffer = cls.buffers.get(path)
+        if buffer is None:
+            with cls.lock:
+                buffer = cls.buffers.setdefault(path, cls(path))
+                if cls.flusher is None:
+                    cls.flusher = threading.Thread(
+                        target=cls.flush_loop, name='AppendBuffer',
+                        daemon=True)
+                    cls.flusher.start()
+        return buffer
+
+    def write(self, line):
+        """
+        Append a line, the lines are written when the batch is full or too
+        old
+
+        :param line: The line (without end of line)
+        :type line: str
+        """
+        with self.lock:
+            self.lines.append(line)
+            if len(self.lines) < self.flush_every and \
+                    time.monotonic() - self.flushed < self.flush_interval:
+                return
+            self.write_lines()
+
+    def flush(self):
+        """ Write the lines kept in memory"""
+        with self.lock:
+            self.write_lines()
+
+    def write_lines(self):
+        """ Write the lines kept in memory (the lock must be held)"""
+        self.flushed = time.monotonic()
+        if not self.lines:
+            return
+        lines, self.lines = self.lines, []
+        try:
+            with open(self.path, 'a') as file:
+                file.write('\n'.join(lines) + '\n')
+        except OSError as error:
+            LOG_CODE_PYTHON.error("%s lines not written in %s: %s",
+                                  len(lines), self.path, error)
+
+    @classmethod
+    def flush_all(cls):
+        """ Write the lines of all the buffers"""
+        for buffer in list(cls.buffers.values()):
+            buffer.flush()
+
+    @classmethod
+    def flush_loop(cls):
+        """
+        Write the lines of all the buffers every FLUSH_INTERVAL seconds, so
+        that the lines of an idle buffer are not kept in memory
+        """
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            cls.flush_all()
+
+
+atexit.register(AppendBuffer.flush_all)
+
 
 def file_instance_date(study_uid, series_uid, instances_uid, file_name,
                        path_folder):
     """
     Create a file that contains a date study_uid, series_uid and instances_uid
 
+    The lines are appended by batch, see :py:class:`AppendBuffer`.
+
     :param study_uid: The Study UID
     :type study_uid: str
     :param series_uid: The Series UID
@@ -25,13 +136,9 @@ def file_instance_date(study_uid, series_uid, instances_uid, file_name,
     :param path_folder: The path of folder
     :type path_folder: str
     """
-    date = str(datetime.datetime.now()).split(" ")[0]
-    file_to_open = os.path.join(path_folder, file_name)
-    file = open(file_to_open, 'a')
-    date_instance = \
-        date + " | " + study_uid + " | " + series_uid + " | " + instances_uid
-    file.write(date_instance + "\n")
-    file.close()
+    AppendBuffer.get(os.path.join(path_folder, file_name)).write(
+        " | ".join((datetime.date.today().isoformat(), study_uid, series_uid,
+                    instances_uid)))
 
 
 def create_file_txt(path, file_name, data):
@@ -1,99 +1,387 @@
 """ Function of list accessible ae """
 # pylint: disable=invalid-name
 import os
-import traceback
-import yaml
 import re
+import signal
 import socket
+import threading
+import time
+
+import yaml
 
 from sphere import settings
 from sphere.logs.logs import LOG_ACCESS
 
+# Minimum time between two checks of the white list files (in seconds)
+CHECK_INTERVAL = 2
+# Maximum wait for the first resolution of a host name (in seconds)
+RESOLVE_TIMEOUT = 2
+IP_PATTERN = re.compile(r"^(?:[0-9]{1,3}\.){3}[0-9]{1,3}$")
+# The actions authorized by the white list
+ACTIONS = ('CECHO', 'CSTORE', 'CFIND', 'CMOVE')
+# A-ASSOCIATE-RJ: rejected permanent, service user, calling AE title not
+# recognised
+REJECT_CALLING_AET = (0x01, 0x01, 0x03)
 
-def list_all_access_list():
+
+class HostResolver:
     """
-    Search the list of associates
+    Cache of the IPs of host names.
 
-    :return: Return the list of associates
-    :rtype: list
+    The IPs are kept ``ttl`` seconds, a failed resolution ``negative_ttl``
+    seconds. An expired entry is still used while it is resolved again in a
+    background thread, so that a check only waits for the DNS the first time
+    a host is seen (at most ``timeout`` seconds).
     """
-    for root, _dirs, files in os.walk(settings.FS_PATH_WHITE_LIST):
-        data = {}
-        for file in files:
-            LOG_ACCESS.info('file to open: %s', str(os.path.join(root, file)))
-            with open(os.path.join(root, file), 'r') as stream:
-                try:
-                    data_loaded = yaml.load(stream)
-                    LOG_ACCESS.debug('yaml loaded: %s', str(data_loaded))
-                    data.update(data_loaded)
-                except Exception:
-                    traceback.print_exc()
-                    LOG_ACCESS.error('error with yaml reading')
-        return data
+    def __init__(self, ttl=None, negative_ttl=None, timeout=RESOLVE_TIMEOUT):
+        """
+        :param ttl: Time the IPs are kept (in seconds)
+            [default: settings.DNS_TTL]
+        :type ttl: float, optional
+        :param negative_ttl: Time a failed resolution is kept (in seconds)
+            [default: settings.DNS_NEGATIVE_TTL]
+        :type negative_ttl: float, optional
+        :param timeout: Maximum wait for the first resolution of a host (in
+            seconds)
+        :type timeout: float, optional
+        """
+        self.ttl = settings.DNS_TTL if ttl is None else ttl
+        self.negative_ttl = settings.DNS_NEGATIVE_TTL \
+            if negative_ttl is None else negative_ttl
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        # {host: (IPs, expiration time)}
+        self.cache = {}
+        # {host: event set when the resolution in progress ends}
+        self.pending = {}
+
+    def resolve(self, host):
+        """
+        Query the DNS and update the cache
+
+        :param host: The host name
+        :type host: str
+        :return: The IPs of the host (empty if it can not be resolved)
+        :rtype: frozenset [str]
+        """
+        try:
+            addresses = frozenset(
+                info[4][0] for info in socket.getaddrinfo(
+                    host, None, proto=socket.IPPROTO_TCP))
+            LOG_ACCESS.info("Resolved IP from hostname %s is : %s", host,
+                            ', '.join(sorted(addresses)))
+        except OSError as error:
+            LOG_ACCESS.error("The host %s can not be resolved: %s", host,
+                             error)
+            addresses = frozenset()
+        ttl = self.ttl if addresses else self.negative_ttl
+        with self.lock:
+            self.cache[host] = (addresses, time.monotonic() + ttl)
+            event = self.pending.pop(host, None)
+        if event is not None:
+            event.set()
+        return addresses
+
+    def refresh(self, host):
+        """
+        Resolve the host in a background thread (unless it is in progress)
+
+        :param host: The host name
+        :type host: str
+        :return: The event set when the resolution ends
+        :rtype: :py:class:`threading.Event`
+        """
+        with self.lock:
+            event = self.pending.get(host)
+            if event is None:
+                event = self.pending[host] = threading.Event()
+                threading.Thread(target=self.resolve, args=(host,),
+                                 name='resolve_host', daemon=True).start()
+        return event
+
+    def addresses(self, host):
+        """
+        Return the IPs of a host from the cache
 
+        :param host: The host name
+        :type host: str
+        :return: The IPs of the host (empty if it can not be resolved)
+        :rtype: frozenset [str]
+        """
+        cached = self.cache.get(host)
+        if cached is None:
+            self.refresh(host).wait(self.timeout)
+            cached = self.cache.get(host)
+            if cached is None:
+                LOG_ACCESS.error("The host %s is not resolved after %s s",
+                                 host, self.timeout)
+                return frozenset()
+        elif cached[1] < time.monotonic():
+            self.refresh(host)
+        return cached[0]
 
-# # check auth for SCP (incoming SCU/ connexion)
-def check_external_infos(ip, file_infos):
+
+RESOLVER = HostResolver()
+
+
+class AccessList:
     """
-    Check if ip in file_infos
+    Index {AET: authorized entries} of the files of the white list folder.
 
-    :param ip: The IP
-    :type ip: str
-    :param file_infos: The information
-    :type file_infos: dict
-    :return: Return True if ip in file_infos else return False
-    :rtype: bool
+    The files are read once; they are read again when one of them is added,
+    removed or modified (checked at most every ``check_interval`` seconds) or
+    when the process receives SIGHUP.
     """
-    LOG_ACCESS.info("Requestor IP is : " + ip)
-    authorized_ip = get_authorized_ip(file_infos)
+    def __init__(self, folder=None, check_interval=CHECK_INTERVAL):
+        """
+        :param folder: The white list folder
+            [default: settings.FS_PATH_WHITE_LIST]
+        :type folder: str, optional
+        :param check_interval: Minimum time between two checks of the files
+            (in seconds)
+        :type check_interval: float, optional
+        """
+        self.folder = folder
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        # {aet: [(ip or host, True if ip, actions or None)]}
+        self.index = {}
+        # The content of the files merged {aet: {'ip': ..., 'port': ...}}
+        self.data = {}
+        self.signature = None
+        self.checked = None
+        self.reload_requested = True
 
-    if ip == authorized_ip:
-        LOG_ACCESS.info('ip requestor and port of communication are valid')
-        return True
+    def files_signature(self):
+        """
+        Return the files of the white list with their mtime and size (the
+        subfolders are not read)
 
-    LOG_ACCESS.error('ip requestor is wrong')
-    return False
+        :return: ((path, mtime, size), ...) sorted by path
+        :rtype: tuple
+        """
+        signature = []
+        folder = settings.FS_PATH_WHITE_LIST if self.folder is None \
+            else self.folder
+        try:
+            entries = sorted(os.scandir(folder), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            LOG_ACCESS.error('The white list folder %s does not exist', folder)
+            entries = []
+        for entry in entries:
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            signature.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def refresh(self):
+        """ Read the files again if they changed or if SIGHUP was received"""
+        now = time.monotonic()
+        if not self.reload_requested and self.checked is not None \
+                and now - self.checked < self.check_interval:
+            return
+        with self.lock:
+            if not self.reload_requested and self.checked is not None \
+                    and now - self.checked < self.check_interval:
+                return
+            self.checked = now
+            signature = self.files_signature()
+            if signature != self.signature or self.reload_requested:
+                self.reload_requested = False
+                self.load(signature)
+
+    def load(self, signature):
+        """
+        Read the files and build the index
+
+        :param signature: The files (see :py:meth:`files_signature`)
+        :type signature: tuple
+        """
+        index = {}
+        data = {}
+        for path, _mtime, _size in signature:
+            LOG_ACCESS.info('file to open: %s', path)
+            try:
+                with open(path, 'r') as stream:
+                    data_loaded = yaml.safe_load(stream) or {}
+                LOG_ACCESS.debug('yaml loaded: %s', str(data_loaded))
+            except (OSError, yaml.YAMLError):
+                LOG_ACCESS.exception('error with yaml reading %s', path)
+                continue
+            if not isinstance(data_loaded, dict):
+                LOG_ACCESS.error('The white list file %s is not a dictionary',
+                                 path)
+                continue
+            data.update(data_loaded)
+            for aet, file_infos in data_loaded.items():
+                try:
+                    host = str(file_infos['ip']).strip()
+                except (TypeError, KeyError):
+                    LOG_ACCESS.error("No ip for the aet '%s' in %s", aet, path)
+                    continue
+                actions = file_infos.get('actions')
+                is_ip = bool(IP_PATTERN.match(host))
+                if not is_ip:
+                    # Resolve ahead of the first check
+                    RESOLVER.refresh(host)
+                index.setdefault(str(aet).strip(), []).append((
+                    host, is_ip,
+                    {action.upper() for action in actions}
+                    if actions else None))
+        self.index = index
+        self.data = data
+        self.signature = signature
+        LOG_ACCESS.info('White list loaded: %s aet in %s files', len(index),
+                        len(signature))
+
+    def request_reload(self, _signum=None, _frame=None):
+        """ Read the files again at the next check (SIGHUP handler)"""
+        LOG_ACCESS.info('Reload of the white list requested')
+        self.reload_requested = True
+
+    def reload_on_sighup(self):
+        """ Reload the white list when the process receives SIGHUP"""
+        if hasattr(signal, 'SIGHUP') and \
+                threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGHUP, self.request_reload)
 
+    def entries(self):
+        """
+        Return the content of the white list files merged
 
-def get_authorized_ip(file_infos):
+        :return: {aet: {'ip': ..., 'port': ...}}
+        :rtype: dict
+        """
+        self.refresh()
+        return self.data
+
+    def is_authorized(self, aet, ip, action=None):
+        """
+        Check if the aet is in the white list with this ip
+
+        :param aet: Application Entity title
+        :type aet: str
+        :param ip: The IP
+        :type ip: str
+        :param action: The action (``CECHO``, ``CSTORE``, ...)
+        :type action: str, optional
+        :return: True if authorized
+        :rtype: bool
+        """
+        self.refresh()
+        entries = self.index.get(aet)
+        if not entries:
+            LOG_ACCESS.error('aet requestor %s not in list of authorized aet',
+                             aet)
+            return False
+        for host, is_ip, actions in entries:
+            if actions is not None and action not in actions:
+                continue
+            if host == ip or not is_ip and ip in RESOLVER.addresses(host):
+                LOG_ACCESS.debug('aet %s and ip requestor %s are valid', aet,
+                                 ip)
+                return True
+        LOG_ACCESS.error('ip requestor %s is wrong for the aet %s (action %s)',
+                         ip, aet, action)
+        return False
+
+    def authorized_actions(self, aet, ip):
+        """
+        Return the actions authorized for the aet with this ip
+
+        :param aet: Application Entity title
+        :type aet: str
+        :param ip: The IP
+        :type ip: str
+        :return: The authorized actions (empty if the aet or the ip is not in
+            the white list)
+        :rtype: frozenset [str]
+        """
+        self.refresh()
+        entries = self.index.get(aet)
+        if not entries:
+            LOG_ACCESS.error('aet requestor %s not in list of authorized aet',
+                             aet)
+            return frozenset()
+        authorized = set()
+        for host, is_ip, actions in entries:
+            if host == ip or not is_ip and ip in RESOLVER.addresses(host):
+                authorized.update(ACTIONS if actions is None else actions)
+        if not authorized:
+            LOG_ACCESS.error('ip requestor %s is wrong for the aet %s', ip,
+                             aet)
+        return frozenset(authorized)
+
+
+ACCESS_LIST = AccessList()
+
+
+def list_all_access_list():
     """
-    Check the entris in the whitelist file. Resolve IP if a host is specified instead of an IP address.
+    Search the list of associates
 
-    :param file_infos: The information
+    :return: Return the list of associates
+    :rtype: dict
     """
-    authorized_host = file_infos['ip'].strip()
+    return ACCESS_LIST.entries()
 
-    LOG_ACCESS.info("authorized host : " + authorized_host)
-    if re.match(r"^(?:[0-9]{1,3}\.){3}[0-9]{1,3}$", authorized_host):
-        LOG_ACCESS.info("authorized host is an IP.")
-        return authorized_host
 
-    else:
-        LOG_ACCESS.info("authorized host is not an IP.")
-        authorized_ip = socket.gethostbyname(authorized_host)
-        LOG_ACCESS.info("Resolved IP from hostname is : " + authorized_ip)
-        return authorized_ip
+def requestor_identity(assoc):
+    """
+    Return the AE title and the IP of the requestor of an association
 
+    :param assoc: The association
+    :type assoc: :py:class:`pynetdicom.association.Association`
+    :return: The AE title and the IP
+    :rtype: tuple (str, str)
+    """
+    ae_title = assoc.requestor.ae_title
+    if not ae_title and assoc.requestor.primitive is not None:
+        # Not yet set during the negotiation
+        ae_title = assoc.requestor.primitive.calling_ae_title
+    return (ae_title.strip().decode("utf-8", "strict"),
+            assoc.requestor.address.strip())
 
-def check_auth_file(aet, ip, data_loaded):
+
+def association_actions(assoc):
     """
-    Check if aet in data_loaded
-
-    :param aet: Application Entity title
-    :type aet: str
-    :param ip: The IP
-    :type ip: str
-    :param data_loaded: The data of file yml
-    :type data_loaded: dict
-    :return: Return True if aet in data_loaded else return False
-    :rtype: bool
+    Return the actions authorized on an association.
+
+    The white list is checked once per association, the result is kept on
+    the association for its DIMSE messages.
+
+    :param assoc: The association
+    :type assoc: :py:class:`pynetdicom.association.Association`
+    :return: The authorized actions
+    :rtype: frozenset [str]
     """
-    if aet in data_loaded.keys():
-        LOG_ACCESS.info('aet requestor %s in list of authorized aet', aet)
-        return check_external_infos(ip, data_loaded[aet])
+    actions = getattr(assoc, 'sphere_actions', None)
+    if actions is None:
+        aet, ip = requestor_identity(assoc)
+        actions = assoc.sphere_actions = \
+            ACCESS_LIST.authorized_actions(aet, ip)
+        LOG_ACCESS.info('aet %s from %s authorized for: %s', aet, ip,
+                        ', '.join(sorted(actions)) or 'nothing')
+    return actions
 
-    LOG_ACCESS.error('aet requestor %s not in list of authorized aet', aet)
-    return False
+
+def auth_association(event):
+    """
+    Check the requestor when an association is requested (EVT_REQUESTED
+        handler) and reject it if it is not in the white list
+
+    :param event: The event
+    :type event: :py:class:`pynetdicom.events.Event`
+    """
+    if not association_actions(event.assoc):
+        LOG_ACCESS.error('Association rejected: calling aet not authorized')
+        event.assoc.acse.send_reject(*REJECT_CALLING_AET)
+        # Wait for the A-ASSOCIATE-RJ to be sent before the socket is closed
+        event.assoc.kill()
 
 
 def auth_in(event=None, action=None):
@@ -101,6 +389,9 @@ def auth_in(event=None, action=None):
     Check a authentication ( check if the aet and the ip in one of the
         file in the folder white list)
 
+    The white list is only read for the first message of an association,
+    see :py:func:`association_actions`.
+
     :param event: The event
     :type event: :py:class:`pynetdicom.events.Event`, optional
     :param action: The action
@@ -117,29 +408,7 @@ def auth_in(event=None, action=None):
     if event is None or action is None:
         LOG_ACCESS.error('no event or action defined access not authorized')
         return False
-    else:
-        aet = event.assoc.requestor.ae_title.strip().decode("utf-8", "strict")
-        ip = event.assoc.requestor.address.strip()
-        port = settings.SCP_PORT
-        for root, _dirs, files in os.walk(settings.FS_PATH_WHITE_LIST):
-            nb_file = len(files)
-            LOG_ACCESS.debug('nb file: %s', str(nb_file))
-            file_nu = 1
-            for file in files:
-                LOG_ACCESS.info(
-                    'file to open: %s', str(os.path.join(root, file)))
-                with open(os.path.join(root, file), 'r') as stream:
-                    try:
-                        data_loaded = yaml.safe_load(stream)
-                        LOG_ACCESS.debug('yaml loaded: %s', str(data_loaded))
-                        LOG_ACCESS.debug('aet: ' + aet + ' ip: ' + ip +
-                                         ' port: ' + str(port) +
-                                         ' action: ' + action)
-                        auth = check_auth_file(aet, ip, data_loaded)
-                        if auth or file_nu == nb_file and not auth:
-                            return auth
-
-                    except Exception:
-                        traceback.print_exc()
-                        LOG_ACCESS.error('error with yaml reading')
-                file_nu = file_nu+1
+    if action in association_actions(event.assoc):
+        return True
+    LOG_ACCESS.error('action %s not authorized for the requestor', action)
+    return False
@@ -1,5 +1,6 @@
 """ log"""
 import copy
+import logging
 from pprint import pformat
 
 
@@ -34,7 +35,8 @@ def log_dataset(log, ds, dcmpath=None):
     :param dcmpath: The path of file dicom
     :type dcmpath: str, optional
     """
-
+    if not log.isEnabledFor(logging.DEBUG):
+        return
     list_msg = list()
     list_msg.append('{:*^70}'.format(' OUTGOING DATASET '))
     if dcmpath:
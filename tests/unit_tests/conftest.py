@@ -0,0 +1,23 @@
+""" The fixtures of the unit tests"""
+import pytest
+from sqlalchemy import create_engine, event
+
+from sphere.dicmeta import database
+from sphere.dicmeta.database_pacs import DatabasePACS
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """ Database PACS on sqlite files (the schema is an attached database)"""
+    monkeypatch.setattr(database, 'create_file_json', lambda data: None)
+    db = DatabasePACS()
+    db.sgbd = 'sqlite'
+    db.engine = create_engine('sqlite:///%s' % (tmp_path / 'main.db'))
+    schema = db.PatientModel.__table__.schema
+
+    @event.listens_for(db.engine, 'connect')
+    def attach(connection, _record):
+        if schema:
+            connection.execute("ATTACH '%s' AS %s" % (
+                tmp_path / 'schema.db', schema))
+    return db
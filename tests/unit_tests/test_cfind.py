@@ -0,0 +1,99 @@
+""" Test the templates of the identifiers and the C-FIND responses when the
+search fails"""
+from types import SimpleNamespace
+
+import pytest
+from pydicom.dataset import Dataset
+
+from sphere import settings
+from sphere.dicmeta.requests.request import Request
+from sphere.fsa import dicom_dataset_cfind
+from sphere.fsa.dicom_dataset_cfind import DicomDatasetCFind
+from sphere.pacs import cfind
+from sphere.pacs.cfind import CFind
+
+
+def failing_stream(_query, yield_per=None):
+    """ The rows of a query failing after the first one"""
+    yield SimpleNamespace(studyUID='1.1', patientID='P1')
+    raise ConnectionError('connection to the database lost')
+
+
+@pytest.fixture
+def failing_search(monkeypatch):
+    """ A database search failing after the first study"""
+    monkeypatch.setattr(dicom_dataset_cfind, 'check_db_pacs', lambda: True)
+    monkeypatch.setattr(DicomDatasetCFind, 'query_found',
+                        lambda self, *args: object())
+    monkeypatch.setattr(Request, 'stream', staticmethod(failing_stream))
+
+
+def request_dataset():
+    ds = Dataset()  # pylint: disable=invalid-name
+    ds.QueryRetrieveLevel = 'STUDY'
+    ds.StudyInstanceUID = ''
+    return ds
+
+
+class TestCFindFailure:
+
+    def test_iter_found(self, failing_search):
+        """ the error is raised after the identifiers sent"""
+        matching = DicomDatasetCFind().iter_found(
+            request_dataset(), 'STUDY', search_in_files=True)
+        assert next(matching).StudyInstanceUID == '1.1'
+        with pytest.raises(ConnectionError):
+            next(matching)
+
+    def test_cfind_response(self, failing_search, monkeypatch):
+        """ a failure status ends the pending responses"""
+        monkeypatch.setattr(cfind, 'auth_in', lambda event, action: True)
+        ae = SimpleNamespace(ae_title=b'SPHERE')
+        scp = CFind(ae)
+        scp.console_verbose = 0
+        scp.dicom_dataset_find = DicomDatasetCFind()
+        event = SimpleNamespace(
+            assoc=SimpleNamespace(requestor=SimpleNamespace(
+                ae_title=b'SCU             ')),
+            identifier=request_dataset(), is_cancelled=False)
+        statuses = [status for status, _identifier in
+                    scp.cfind_response(event)]
+        assert statuses == [0xFF00, 0xC000]
+
+
+class TestTemplate:
+
+    @pytest.fixture(autouse=True)
+    def requested_keys(self, monkeypatch):
+        monkeypatch.setattr(settings, 'CFIND_RETURN_REQUESTED_KEYS', True)
+        dicom_dataset_cfind.selected_template.cache_clear()
+
+    def test_requested_keys(self):
+        """ the template has the keys requested and the unique key"""
+        ds = request_dataset()  # pylint: disable=invalid-name
+        ds.StudyDate = ''
+        template = DicomDatasetCFind().template('STUDY', ds)
+        assert [element.attribute for element in template.elements] == [
+            'dateStudy', 'studyUID']
+
+    def test_keys_out_of_level(self):
+        """ the keys which are not in the level share the same template"""
+        finder = DicomDatasetCFind()
+        ds = request_dataset()  # pylint: disable=invalid-name
+        template = finder.template('STUDY', ds)
+        ds.Rows = 12
+        ds.add_new(0x00091001, 'LO', 'private')
+        assert finder.template('STUDY', ds) is template
+        assert dicom_dataset_cfind.selected_template.cache_info().currsize \
+            == 1
+
+    def test_bounded(self):
+        """ the number of templates of the requested keys is bounded"""
+        info = dicom_dataset_cfind.selected_template.cache_info()
+        assert info.maxsize == dicom_dataset_cfind.SELECTED_TEMPLATES
+
+    def test_level(self):
+        """ the template of the level is built once"""
+        finder = DicomDatasetCFind()
+        assert finder.template('SERIES') is finder.template('SERIES')
+        assert list(finder.templates) == ['SERIES']
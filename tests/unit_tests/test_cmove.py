@@ -0,0 +1,364 @@
+""" Test the C-MOVE requests and the move of the uids missing locally"""
+import sqlite3
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from types import SimpleNamespace
+
+import pytest
+from pydicom.dataset import Dataset
+from pynetdicom import evt
+from pynetdicom.dimse_messages import C_MOVE_RSP
+from pynetdicom.dimse_primitives import C_MOVE
+
+from sphere import settings
+from sphere.logs.verbose import NullVerbose
+from sphere.pacs import cmove, cmove_existing
+from sphere.pacs.cmove import ASSOCIATION_ATTEMPTS, CMove, SubOperations
+from sphere.pacs.cmove_existing import CMoveExisting
+
+
+class FakeAssociation:
+    """ An association answering the C-MOVE with the statuses"""
+    def __init__(self, established=True, statuses=(0xFF00, 0x0000)):
+        self.is_established = established
+        self.statuses = statuses
+        self.released = False
+        self.move_destination = None
+
+    def send_c_move(self, ds, move_aet, query_model):
+        self.move_destination = move_aet
+        for status in self.statuses:
+            yield SimpleNamespace(Status=status), None
+
+    def release(self):
+        self.released = True
+
+
+@pytest.fixture
+def scu():
+    """ A C-MOVE SCU in quiet mode"""
+    scu = CMove(SimpleNamespace(ae_title=b'SPHERE'))
+    scu.console_verbose = 0
+    scu.dict_verbose = NullVerbose()
+    return scu
+
+
+def study(uid):
+    ds = Dataset()  # pylint: disable=invalid-name
+    ds.QueryRetrieveLevel = 'STUDY'
+    ds.StudyInstanceUID = uid
+    return ds
+
+
+class TestExecuteMove:
+
+    def test_release(self, scu, monkeypatch):
+        """ the association of the move is released"""
+        assoc = FakeAssociation()
+        monkeypatch.setattr(scu, 'generate_new_association_from_aet',
+                            lambda: assoc)
+        assert scu.execute_move(study('1.1'), 'PACS3', 'S')
+        assert assoc.released
+        assert assoc.move_destination == b'PACS3'
+
+    def test_retry(self, scu, monkeypatch):
+        """ a rejected association is tried again"""
+        assocs = [FakeAssociation(False), FakeAssociation()]
+        monkeypatch.setattr(scu, 'generate_new_association_from_aet',
+                            lambda: assocs.pop(0))
+        assert scu.execute_move(study('1.1'), 'PACS3', 'S')
+        assert not assocs
+
+    def test_rejected(self, scu, monkeypatch):
+        """ the move fails after ASSOCIATION_ATTEMPTS rejections"""
+        attempts = []
+
+        def rejected():
+            attempts.append(1)
+            return FakeAssociation(False)
+        monkeypatch.setattr(scu, 'generate_new_association_from_aet',
+                            rejected)
+        assert not scu.execute_move(study('1.1'), 'PACS3', 'S')
+        assert len(attempts) == ASSOCIATION_ATTEMPTS
+
+    def test_failure_status(self, scu, monkeypatch):
+        assoc = FakeAssociation(statuses=(0xFF00, 0xA702))
+        monkeypatch.setattr(scu, 'generate_new_association_from_aet',
+                            lambda: assoc)
+        assert not scu.execute_move(study('1.1'), 'PACS3', 'S')
+        assert assoc.released
+
+
+class FakePool:
+    """ The associations with the move destination"""
+    def __init__(self, ae, ip, port, aec):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRequestor:
+    """ The association of the C-MOVE-RQ, records the handlers bound"""
+    def __init__(self):
+        self.requestor = SimpleNamespace(ae_title=b'PACS2 ')
+        self.handlers = {}
+
+    def bind(self, event, handler):
+        self.handlers[event] = handler
+
+    def unbind(self, event, handler):
+        assert self.handlers.pop(event) == handler
+
+
+def move_event(uid):
+    """ The C-MOVE-RQ of a study to PACS3"""
+    return SimpleNamespace(
+        assoc=FakeRequestor(), identifier=study(uid), is_cancelled=False,
+        request=SimpleNamespace(_move_destination=b'PACS3 ', MessageID=7))
+
+
+def move_rsp(status, remaining, failed, completed):
+    """ The C-MOVE-RSP built by pynetdicom"""
+    rsp = C_MOVE()
+    rsp.MessageIDBeingRespondedTo = 7
+    rsp.AffectedSOPClassUID = '1.2.840.10008.5.1.4.1.2.2.2'
+    rsp.Status = status
+    rsp.NumberOfRemainingSuboperations = remaining
+    rsp.NumberOfFailedSuboperations = failed
+    rsp.NumberOfWarningSuboperations = 0
+    rsp.NumberOfCompletedSuboperations = completed
+    message = C_MOVE_RSP()
+    message.primitive_to_message(rsp)
+    return message
+
+
+@pytest.fixture
+def scp(scu, monkeypatch):
+    """ A C-MOVE SCP sending the files of the study 1.1 through a pool"""
+    monkeypatch.setattr(cmove, 'auth_in', lambda event, action: True)
+    monkeypatch.setattr(cmove, 'list_all_access_list', lambda: {
+        'PACS3': {'ip': '127.0.0.1', 'port': 11113}})
+    monkeypatch.setattr(cmove, 'AssociationPool', FakePool)
+    monkeypatch.setattr(settings, 'PENDING_RESPONSES_MOVE', False)
+    monkeypatch.setattr(settings, 'START_MOVE_HDFS', False)
+    monkeypatch.setattr(settings, 'READ_AHEAD', 0)
+    monkeypatch.setattr(scu.dicom_path_move, 'path_found', lambda ds, level: [
+        '/dicom/1.1.3.dcm', '/dicom/1.1.1.dcm', '/dicom/1.1.2.dcm'])
+    return scu
+
+
+class TestSubOperations:
+
+    def test_final_status(self):
+        sub_operations = SubOperations(7)
+        sub_operations.add('/dicom/1.1.1.dcm', 0x0000)
+        assert sub_operations.final_status() == (0x0000, None)
+        sub_operations.add('/dicom/1.1.2.dcm', 0xB000)
+        sub_operations.add('/dicom/1.1.3.dcm', 0xA700)
+        sub_operations.add('/dicom/1.1.4.dcm', None)
+        status, identifier = sub_operations.final_status()
+        assert status == 0xB000
+        assert identifier.FailedSOPInstanceUIDList == [
+            '1.1.2', '1.1.3', '1.1.4']
+        assert (sub_operations.completed, sub_operations.warning,
+                sub_operations.failed) == (1, 1, 2)
+
+    def test_write_counts(self):
+        """ the counts of the final response are the ones of the pool"""
+        sub_operations = SubOperations(7)
+        sub_operations.add('/dicom/1.1.1.dcm', 0x0000)
+        sub_operations.add('/dicom/1.1.2.dcm', None)
+        message = move_rsp(0xB000, None, 2, 0)
+        sub_operations.write_counts(SimpleNamespace(message=message))
+        command_set = message.command_set
+        assert command_set.NumberOfCompletedSuboperations == 1
+        assert command_set.NumberOfFailedSuboperations == 1
+        assert 'NumberOfRemainingSuboperations' not in command_set
+        assert list(message.encode_msg(1, 0))
+
+    def test_pending_not_written(self):
+        """ the pending responses of another C-MOVE are not modified"""
+        sub_operations = SubOperations(7)
+        sub_operations.add('/dicom/1.1.1.dcm', 0x0000)
+        message = move_rsp(0xFF00, 1, 0, 0)
+        sub_operations.write_counts(SimpleNamespace(message=message))
+        assert message.command_set.NumberOfCompletedSuboperations == 0
+
+
+class TestCMoveResponse:
+
+    def test_counts(self, scp, monkeypatch):
+        """ the statuses of the files sent through the pool make the final
+        response"""
+        sent = []
+
+        def execute_send(dicom_file_path, pool):
+            sent.append(dicom_file_path)
+            return 0xA700 if dicom_file_path.endswith('2.dcm') else 0x0000
+        monkeypatch.setattr(scp, 'execute_send', execute_send)
+        event = move_event('1.1')
+        responses = scp.cmove_response(event)
+        assert next(responses) == ('127.0.0.1', 11113)
+        assert next(responses) == 3
+        status, identifier = next(responses)
+        assert sorted(sent) == sent
+        assert status == 0xB000
+        assert identifier.FailedSOPInstanceUIDList == ['1.1.2']
+        message = move_rsp(0xB000, None, 3, 0)
+        event.assoc.handlers[evt.EVT_DIMSE_SENT](
+            SimpleNamespace(message=message))
+        assert message.command_set.NumberOfCompletedSuboperations == 2
+        assert message.command_set.NumberOfFailedSuboperations == 1
+        responses.close()
+        assert not event.assoc.handlers
+
+    def test_success(self, scp, monkeypatch):
+        monkeypatch.setattr(scp, 'execute_send',
+                            lambda dicom_file_path, pool: 0x0000)
+        responses = list(scp.cmove_response(move_event('1.1')))
+        assert responses[1:] == [3, (0x0000, None)]
+
+
+class RecordingPool(ThreadPool):
+    """ A thread pool recording if it was terminated"""
+    terminated = []
+
+    def terminate(self):
+        self.terminated.append(self)
+        super().terminate()
+
+
+@pytest.fixture
+def pending_scp(scp, monkeypatch):
+    """ The C-MOVE SCP with pending responses, reading fake datasets"""
+    monkeypatch.setattr(settings, 'PENDING_RESPONSES_MOVE', True)
+    monkeypatch.setattr(settings, 'NB_THREAD', 2)
+    monkeypatch.setattr(cmove, 'ThreadPool', RecordingPool)
+    RecordingPool.terminated = []
+
+    def read_dataset(dicom_file_path):
+        # The first files are the slowest to read
+        time.sleep(0.01 * (3 - int(dicom_file_path[-5])))
+        ds = Dataset()  # pylint: disable=invalid-name
+        ds.SOPInstanceUID = cmove.instance_uid(dicom_file_path)
+        return ds
+    monkeypatch.setattr(scp, 'read_dataset', read_dataset)
+    return scp
+
+
+class TestPendingResponses:
+
+    def test_read_datasets_order(self, pending_scp):
+        """ the datasets are read in parallel and given in the order of the
+        paths sorted on disk"""
+        paths = ['/dicom/1.1.%s.dcm' % number for number in (3, 1, 2, 0)]
+        assert [ds.SOPInstanceUID for ds in
+                pending_scp.read_datasets(paths)] == \
+            ['1.1.0', '1.1.1', '1.1.2', '1.1.3']
+        assert len(RecordingPool.terminated) == 1
+
+    def test_pending(self, pending_scp):
+        """ pynetdicom sends each dataset yielded as pending"""
+        responses = list(pending_scp.cmove_response(move_event('1.1')))
+        assert responses[1] == 3
+        assert [(status, ds.SOPInstanceUID)
+                for status, ds in responses[2:]] == \
+            [(0xFF00, '1.1.1'), (0xFF00, '1.1.2'), (0xFF00, '1.1.3')]
+
+    def test_cancel(self, pending_scp):
+        """ a C-CANCEL stops the reads and ends the C-MOVE"""
+        event = move_event('1.1')
+        responses = pending_scp.cmove_response(event)
+        assert next(responses) == ('127.0.0.1', 11113)
+        assert next(responses) == 3
+        assert next(responses)[0] == 0xFF00
+        event.is_cancelled = True
+        assert next(responses) == (0xFE00, None)
+        assert len(RecordingPool.terminated) == 1
+        with pytest.raises(StopIteration):
+            next(responses)
+
+
+class FakeFind:
+    """ The C-FIND responses of the PACS"""
+    def __init__(self, uids):
+        self.uids = uids
+
+    def iter_find(self, ds, query_model):
+        for uid in self.uids:
+            yield study(uid)
+
+
+class FakeMove:
+    """ Record the uids moved, fail the uids of ``failing``"""
+    def __init__(self, failing=()):
+        self.lock = threading.Lock()
+        self.moved = []
+        self.failing = failing
+
+    def execute_move(self, ds, ae_cstore, query_model):
+        if ds.StudyInstanceUID in self.failing:
+            raise ConnectionError('association lost')
+        with self.lock:
+            self.moved.append(ds.StudyInstanceUID)
+        return True
+
+
+class FakeRequest:
+    """ The local database: the even uids exist"""
+    def __init__(self):
+        self.batches = []
+
+    def get_existing_keys(self, list_key):
+        self.batches.append(list(list_key))
+        return {uid for uid in list_key if int(uid.split('.')[1]) % 2 == 0}
+
+
+def existing_job_id(tmp_path):
+    """ The id of the only job of the jobs file"""
+    with sqlite3.connect(str(tmp_path / 'jobs.sqlite')) as connection:
+        (job_id,), = connection.execute("SELECT id FROM transfer_job")
+    return job_id
+
+
+class TestCMoveExisting:
+
+    def test_pipeline(self, tmp_path, monkeypatch):
+        """ the uids found and missing in the database are moved once"""
+        monkeypatch.setattr(settings, 'TRANSFER_JOB_PATH',
+                            str(tmp_path / 'jobs.sqlite'))
+        monkeypatch.setattr(cmove_existing, 'EXISTING_BATCH', 7)
+        uids = ['1.%s' % number for number in range(50)]
+        cmove = FakeMove(failing=('1.3',))
+        existing = CMoveExisting(FakeFind(uids + uids[:10]), cmove)
+        existing.request = FakeRequest()
+        output = tmp_path / 'study_uid'
+        nb_moved = existing.run(Dataset(), 'PACS3', 'S',
+                                output_filepath=str(output))
+        missing = [uid for uid in uids if int(uid.split('.')[1]) % 2]
+        assert nb_moved == len(missing)
+        assert sorted(cmove.moved) == sorted(set(missing) - {'1.3'})
+        assert existing.nb_found == len(uids)
+        assert existing.nb_missing == len(missing)
+        assert all(len(batch) <= 7 for batch in existing.request.batches)
+        assert output.read_text().split() == uids
+        assert (tmp_path / 'diff_study_uid').read_text().split() == missing
+
+    def test_resume(self, tmp_path, monkeypatch):
+        """ the uids moved by the job are not moved again"""
+        monkeypatch.setattr(settings, 'TRANSFER_JOB_PATH',
+                            str(tmp_path / 'jobs.sqlite'))
+        uids = ['1.1', '1.3', '1.5']
+        first = FakeMove(failing=('1.3',))
+        existing = CMoveExisting(FakeFind(uids), first)
+        existing.request = FakeRequest()
+        existing.run(Dataset(), 'PACS3', 'S')
+        job_id = existing_job_id(tmp_path)
+        second = FakeMove()
+        existing = CMoveExisting(FakeFind(uids), second)
+        existing.request = FakeRequest()
+        existing.run(Dataset(), 'PACS3', 'S', resume=job_id)
+        assert second.moved == ['1.3']
+
@@ -0,0 +1,32 @@
+""" Test the creation of the tables and of the indexes"""
+
+
+class TestCreateTables:
+
+    def test_create_tables_twice(self, sqlite_db):
+        """ the indexes are only created once"""
+        sqlite_db.create_tables()
+        sqlite_db.create_tables()
+        names = sqlite_db.index_names(sqlite_db.StudyModel.__table__)
+        assert 'ix_study_date_study' in names
+
+    def test_drop_index(self, sqlite_db):
+        """ an index no longer declared is dropped"""
+        sqlite_db.create_tables()
+        table = sqlite_db.PatientModel.__table__
+        sqlite_db.engine.execute(
+            'CREATE INDEX %s ON patient (lower(patient_name))' % '.'.join(
+                filter(None, [table.schema, 'ix_patient_lower_name'])))
+        assert 'ix_patient_lower_name' in sqlite_db.index_names(table)
+        sqlite_db.create_indexes()
+        assert 'ix_patient_lower_name' not in sqlite_db.index_names(table)
+
+    def test_create_missing_index(self, sqlite_db):
+        """ an index missing in an existing table is created"""
+        sqlite_db.create_tables()
+        table = sqlite_db.StudyModel.__table__
+        sqlite_db.engine.execute('DROP INDEX %s' % '.'.join(
+            filter(None, [table.schema, 'ix_study_date_study'])))
+        assert 'ix_study_date_study' not in sqlite_db.index_names(table)
+        sqlite_db.create_indexes()
+        assert 'ix_study_date_study' in sqlite_db.index_names(table)
@@ -0,0 +1,213 @@
+""" Test the search of the module file_catalogue"""
+import os
+import sqlite3
+from contextlib import closing
+
+import pytest
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian
+
+from sphere import settings
+from sphere.fsa import dicom_path_cmove
+from sphere.fsa.dicom_path_cmove import DicomPathCMove
+from sphere.fsa.file_catalogue import FileCatalogue, predicate
+
+# (file name, patient id, patient name, study uid, series uid, modality,
+# study date)
+FILES = (
+    ('a1.dcm', 'P1', 'DOE^JOHN', '1.1', '1.1.1', 'MR', '20200101'),
+    ('a2.dcm', 'P1', 'DOE^JOHN', '1.1', '1.1.1', 'MR', '20200101'),
+    ('a3.dcm', 'P1', 'DOE^JOHN', '1.1', '1.1.2', 'CT', '20200101'),
+    ('b1.dcm', 'P2', 'SMITH^ANN', '2.1', '2.1.1', 'CT', '20210101'),
+    ('c1.dcm', 'P3', 'DOE[1]', '3.1', '3.1.1', 'US', '20220101'),
+)
+
+
+def write_dicom(path, patient_id, name, study_uid, series_uid, modality,
+                date):
+    """ Write a DICOM file without pixels"""
+    ds = Dataset()  # pylint: disable=invalid-name
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.4'
+    ds.file_meta.MediaStorageSOPInstanceUID = series_uid + '.' + \
+        os.path.basename(path)[1]
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.SOPClassUID = ds.file_meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.PatientID = patient_id
+    ds.PatientName = name
+    ds.StudyInstanceUID = study_uid
+    ds.SeriesInstanceUID = series_uid
+    ds.Modality = modality
+    ds.StudyDate = date
+    ds.save_as(str(path), write_like_original=False)
+
+
+@pytest.fixture
+def catalogue(tmp_path):
+    """ A catalogue of the files of FILES (and of a file not DICOM)"""
+    folder = tmp_path / 'dicom'
+    folder.mkdir()
+    for name, *attributes in FILES:
+        write_dicom(folder / name, *attributes)
+    (folder / 'readme.txt').write_text('not a DICOM file')
+    return FileCatalogue(str(folder), str(tmp_path / 'catalogue.db'))
+
+
+def uids(found):
+    """ The unique keys found"""
+    return sorted(attributes['StudyInstanceUID']
+                  for _path, attributes in found)
+
+
+def count_files(catalogue):
+    """ The number of files in the catalogue"""
+    with closing(sqlite3.connect(catalogue.catalogue_path)) as connection:
+        count, = connection.execute(
+            "SELECT count(*) FROM dicom_file").fetchone()
+    return count
+
+
+class TestPredicate:
+
+    def test_universal(self):
+        assert predicate('modality', '*') is None
+
+    def test_single_value(self):
+        assert predicate('modality', 'MR') == ('modality = ?', ['MR'])
+
+    def test_list(self):
+        assert predicate('modality', 'MR\\CT') == \
+            ('modality IN (?, ?)', ['MR', 'CT'])
+
+    def test_wildcards(self):
+        """ the DICOM wildcards are the ones of GLOB, [ is escaped"""
+        assert predicate('patient_name', 'DOE?J*') == \
+            ('patient_name GLOB ?', ['DOE?J*'])
+        assert predicate('patient_name', 'DOE[*') == \
+            ('patient_name GLOB ?', ['DOE[[]*'])
+
+    def test_ranges(self):
+        assert predicate('study_date', '20200101-20201231', True) == \
+            ('study_date BETWEEN ? AND ?', ['20200101', '20201231'])
+        assert predicate('study_date', '20200101-', True) == \
+            ('study_date >= ?', ['20200101'])
+        assert predicate('study_date', '-20201231', True) == \
+            ('study_date <= ?', ['20201231'])
+        # Not a range column
+        assert predicate('patient_id', 'A-B') == ('patient_id = ?', ['A-B'])
+
+
+class TestFileCatalogue:
+
+    def test_refresh(self, catalogue):
+        """ only the files added or modified are read again"""
+        assert catalogue.refresh() == len(FILES) + 1
+        assert catalogue.refresh(force=True) == 0
+        os.remove(os.path.join(catalogue.dicom_folder, 'c1.dcm'))
+        assert catalogue.refresh(force=True) == 0
+        assert count_files(catalogue) == len(FILES)
+
+    def test_refresh_interval(self, catalogue, monkeypatch):
+        """ the folders are not listed again before the refresh interval"""
+        monkeypatch.setattr(settings, 'FILE_CATALOGUE_REFRESH', 3600)
+        assert len(catalogue.paths()) == len(FILES)
+        os.remove(os.path.join(catalogue.dicom_folder, 'c1.dcm'))
+        assert len(catalogue.paths()) == len(FILES)
+        monkeypatch.setattr(settings, 'FILE_CATALOGUE_REFRESH', 0)
+        assert len(catalogue.paths()) == len(FILES) - 1
+
+    def test_unmodified_folders(self, catalogue, monkeypatch):
+        """ the files of the folders whose mtime did not change are not
+        listed, the subfolders are still visited"""
+        monkeypatch.setattr(settings, 'FILE_CATALOGUE_REFRESH', 0)
+        subfolder = os.path.join(catalogue.dicom_folder, 'sub')
+        os.mkdir(subfolder)
+        assert catalogue.refresh() == len(FILES) + 1
+        write_dicom(os.path.join(subfolder, 'd1.dcm'), 'P4', 'ROE^JANE',
+                    '4.1', '4.1.1', 'MR', '20230101')
+        folders = {catalogue.dicom_folder: os.stat(
+            catalogue.dicom_folder).st_mtime_ns}
+        current, modified = catalogue.walk(folders)
+        assert sorted(current) == [catalogue.dicom_folder, subfolder]
+        assert [(folder, [os.path.basename(path) for path, *_ in files])
+                for folder, files in modified.items()] == \
+            [(subfolder, ['d1.dcm'])]
+        assert catalogue.refresh() == 1
+        assert catalogue.paths(series_uid='4.1.1') == \
+            [os.path.join(subfolder, 'd1.dcm')]
+
+    def test_removed_folder(self, catalogue, monkeypatch):
+        """ the files of a folder removed are removed"""
+        monkeypatch.setattr(settings, 'FILE_CATALOGUE_REFRESH', 0)
+        subfolder = os.path.join(catalogue.dicom_folder, 'sub')
+        os.mkdir(subfolder)
+        write_dicom(os.path.join(subfolder, 'd1.dcm'), 'P4', 'ROE^JANE',
+                    '4.1', '4.1.1', 'MR', '20230101')
+        assert catalogue.refresh() == len(FILES) + 2
+        os.remove(os.path.join(subfolder, 'd1.dcm'))
+        os.rmdir(subfolder)
+        assert catalogue.refresh() == 0
+        assert count_files(catalogue) == len(FILES) + 1
+
+    def test_paths(self, catalogue):
+        """ the DICOM files of a series"""
+        assert sorted(os.path.basename(path) for path in
+                      catalogue.paths(series_uid='1.1.1')) == \
+            ['a1.dcm', 'a2.dcm']
+        assert len(catalogue.paths()) == len(FILES)
+
+    def test_find_one_file_by_unique_key(self, catalogue):
+        """ one file of each study, the file not DICOM is ignored"""
+        found = list(catalogue.find('StudyInstanceUID', {}))
+        assert uids(found) == ['1.1', '2.1', '3.1']
+        assert found[0][1]['PatientName'] == 'DOE^JOHN'
+
+    def test_find_series(self, catalogue):
+        found = catalogue.find('SeriesInstanceUID', {'PatientID': 'P1'})
+        assert sorted(attributes['SeriesInstanceUID']
+                      for _path, attributes in found) == ['1.1.1', '1.1.2']
+
+    def test_find_filters(self, catalogue):
+        assert uids(catalogue.find('StudyInstanceUID',
+                                   {'Modality': 'CT'})) == ['1.1', '2.1']
+        assert uids(catalogue.find('StudyInstanceUID',
+                                   {'StudyDate': '20210101-'})) == \
+            ['2.1', '3.1']
+        assert uids(catalogue.find('StudyInstanceUID',
+                                   {'PatientName': 'DOE*'})) == ['1.1', '3.1']
+        assert uids(catalogue.find('StudyInstanceUID',
+                                   {'PatientName': 'DOE[1]'})) == ['3.1']
+        assert uids(catalogue.find('StudyInstanceUID',
+                                   {'PatientName': 'DOE[*'})) == ['3.1']
+
+    def test_find_unknown_keyword(self, catalogue):
+        """ the keywords not in the catalogue are ignored"""
+        assert uids(catalogue.find('StudyInstanceUID',
+                                   {'OperatorsName': 'X'})) == \
+            ['1.1', '2.1', '3.1']
+
+
+class TestDicomPathCMove:
+
+    def test_search_in_file(self, catalogue, monkeypatch):
+        """ the C-MOVE searches the paths in the catalogue, which is not
+        listed again at each C-MOVE"""
+        monkeypatch.setattr(dicom_path_cmove, 'check_db_pacs', lambda: False)
+        monkeypatch.setattr(settings, 'SEARCH_FILE', True)
+        monkeypatch.setattr(settings, 'FILE_CATALOGUE_REFRESH', 3600)
+        path_cmove = DicomPathCMove()
+        path_cmove.file_catalogue = catalogue
+        ds = Dataset()  # pylint: disable=invalid-name
+        ds.PatientID = 'P1'
+        ds.StudyInstanceUID = '1.1'
+        assert len(path_cmove.path_found(ds, 'STUDY')) == 3
+
+        def walk(_folders=None):
+            raise AssertionError('The folders are listed again')
+        monkeypatch.setattr(catalogue, 'walk', walk)
+        ds.SeriesInstanceUID = '1.1.2'
+        assert [os.path.basename(path) for path in
+                path_cmove.path_found(ds, 'SERIES')] == ['a3.dcm']
@@ -0,0 +1,78 @@
+""" Test the file paths requests of the table file_storage_metadata_dicom"""
+import pytest
+
+from sphere.dicmeta.requests.file_storage_metadata_request import \
+    FileStorageMetadataDicomRequest
+
+# (id, instance uid, series uid, study uid), inserted out of order
+INSTANCES = (
+    (1, '1.2.1.1', '1.2.1', '1.2'),
+    (2, '1.1.1.1', '1.1.1', '1.1'),
+    (3, '1.2.1.2', '1.2.1', '1.2'),
+    (4, '1.1.2.1', '1.1.2', '1.1'),
+)
+
+
+@pytest.fixture
+def request_paths(sqlite_db, monkeypatch):
+    """ The request of the instances of INSTANCES, recording its sessions"""
+    sqlite_db.create_tables()
+    table = sqlite_db.FileStorageMetadataDicomModel.__table__
+    sqlite_db.engine.execute(table.insert(), [{
+        'file_storage_metadata_dicom_id': id_, 'instance_uid': uid,
+        'series_uid': series_uid, 'study_uid': study_uid,
+        'patient_uid': 'P1', 'file_path': '/dicom/%s.dcm' % uid,
+        'storage_method': 'FS', 'filesize': 1024, 'storage_status': 0}
+        for id_, uid, series_uid, study_uid in INSTANCES])
+    sessions = []
+    create_session = sqlite_db.create_session
+
+    def recording_session():
+        session = create_session()
+        session.closed = False
+        close = session.close
+
+        def closing():
+            session.closed = True
+            close()
+        session.close = closing
+        sessions.append(session)
+        return session
+    monkeypatch.setattr(sqlite_db, 'create_session', recording_session)
+    request = FileStorageMetadataDicomRequest(sqlite_db)
+    request.sessions = sessions
+    return request
+
+
+class TestFilePaths:
+
+    def test_get_file_path(self, request_paths):
+        """ the paths of a study, the session is closed"""
+        assert sorted(request_paths.get_file_path(study_uid='1.2')) == \
+            ['/dicom/1.2.1.1.dcm', '/dicom/1.2.1.2.dcm']
+        assert [session.closed for session in request_paths.sessions] == \
+            [True]
+
+    def test_by_uid_list(self, request_paths):
+        """ the paths of an uid follow each other, ordered by uid and id"""
+        paths = request_paths.get_file_path_by_uid_list(
+            'studyUID', ['1.2', '1.1', '1.2'], chunk_size=1, with_uid=True)
+        assert list(paths) == [
+            ('1.2', '/dicom/1.2.1.1.dcm'), ('1.2', '/dicom/1.2.1.2.dcm'),
+            ('1.1', '/dicom/1.1.1.1.dcm'), ('1.1', '/dicom/1.1.2.1.dcm')]
+        assert request_paths.sessions[0].closed
+
+    def test_all(self, request_paths):
+        paths = request_paths.get_file_path_by_uid_list('studyUID', ['*'])
+        assert list(paths) == ['/dicom/%s.dcm' % uid
+                               for _id, uid, *_uids in INSTANCES]
+        assert request_paths.sessions[0].closed
+
+    def test_closed_generator(self, request_paths):
+        """ the session is closed when the generator is closed"""
+        paths = request_paths.get_file_path_by_uid_list(
+            'seriesUID', ['1.2.1', '1.1.1'])
+        assert next(paths) == '/dicom/1.1.1.1.dcm'
+        assert not request_paths.sessions[0].closed
+        paths.close()
+        assert request_paths.sessions[0].closed
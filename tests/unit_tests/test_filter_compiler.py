@@ -0,0 +1,107 @@
+""" Test the DICOM matching of the module filter_compiler"""
+from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from sphere.dicmeta.requests.filter_compiler import (
+    compile_filter, like_pattern, match)
+
+Base = declarative_base()
+
+
+class Study(Base):
+    """ A table with a text and a date column"""
+    __tablename__ = 'study'
+    id = Column(Integer, primary_key=True)
+    studyDescription = Column(String)
+    dateStudy = Column(String)
+
+
+ROWS = (
+    ('Brain', '20200101'),
+    ('Brain MRI', '20200615'),
+    ('100% dose', '20201231'),
+    ('1000 dose', '20210101'),
+    ('a_b', '20190101'),
+    ('axb', '20190102'),
+)
+
+
+class TestFilterCompiler:
+
+    @classmethod
+    def setup_class(cls):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        cls.session = sessionmaker(bind=engine)()
+        cls.session.add_all(
+            Study(studyDescription=description, dateStudy=date)
+            for description, date in ROWS)
+        cls.session.commit()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.session.close()
+
+    def descriptions(self, dict_filter):
+        """ The descriptions of the rows matching a filter"""
+        query = self.session.query(Study.studyDescription).filter(
+            *compile_filter(Study, dict_filter))
+        return sorted(row[0] for row in query)
+
+    def test_like_pattern(self):
+        """ the wildcards are converted and % _ \\ escaped"""
+        assert like_pattern('Brain*') == 'Brain%'
+        assert like_pattern('a?c') == 'a_c'
+        assert like_pattern('100%*') == '100\\%%'
+        assert like_pattern('a_*') == 'a\\_%'
+        assert like_pattern('C:\\*') == 'C:\\\\%'
+
+    def test_universal(self):
+        """ * matches everything: no condition"""
+        assert match(Study.studyDescription, '*') is None
+        assert len(self.descriptions({'studyDescription': '*'})) == len(ROWS)
+
+    def test_single_value(self):
+        assert self.descriptions({'studyDescription': 'Brain'}) == ['Brain']
+
+    def test_wildcard(self):
+        assert self.descriptions({'studyDescription': 'Brain*'}) == \
+            ['Brain', 'Brain MRI']
+
+    def test_question_mark(self):
+        """ ? matches exactly one character"""
+        assert self.descriptions({'studyDescription': 'a?b'}) == \
+            ['a_b', 'axb']
+        assert self.descriptions({'studyDescription': 'Brai?'}) == ['Brain']
+
+    def test_escaped_percent(self):
+        """ a % of the value is not a wildcard"""
+        assert self.descriptions({'studyDescription': '100%*'}) == \
+            ['100% dose']
+
+    def test_escaped_underscore(self):
+        """ a _ of the value is not a wildcard"""
+        assert self.descriptions({'studyDescription': 'a_*'}) == ['a_b']
+
+    def test_list(self):
+        """ the values separated by \\ are a list"""
+        assert self.descriptions({'studyDescription': 'Brain\\axb'}) == \
+            ['Brain', 'axb']
+        assert self.descriptions({'studyDescription': ['a_b', 'axb']}) == \
+            ['a_b', 'axb']
+
+    def test_date_range(self):
+        assert self.descriptions({'dateStudy': '20200101-20201231'}) == \
+            ['100% dose', 'Brain', 'Brain MRI']
+
+    def test_open_date_ranges(self):
+        """ the start or the end of the range can be omitted"""
+        assert self.descriptions({'dateStudy': '20201231-'}) == \
+            ['100% dose', '1000 dose']
+        assert self.descriptions({'dateStudy': '-20190102'}) == \
+            ['a_b', 'axb']
+
+    def test_no_range_matching(self):
+        """ a - is only a range for the date columns"""
+        assert self.descriptions({'studyDescription': 'a-b'}) == []
@@ -0,0 +1,122 @@
+""" Test the identifiers of the module identifier_template"""
+from collections import namedtuple
+from types import SimpleNamespace
+
+import pytest
+from pydicom.dataset import Dataset
+from pydicom.sequence import Sequence
+from pydicom.tag import Tag
+
+from sphere.fsa.identifier_template import (
+    IdentifierTemplate, number_value, template_element)
+
+# The attributes of sphere.dicmeta.extended_db.ExtendedField used
+Field = namedtuple('Field', ['keyword', 'field_name', 'parents'])
+
+
+class TestIdentifierTemplate:
+
+    def test_template_element(self):
+        element = template_element('StudyDate', 'dateStudy')
+        assert element.tag == Tag(0x0008, 0x0020)
+        assert element.vr == 'DA'
+        # Ambiguous VR: the first one
+        assert template_element('PixelData', 'pixel').vr == 'OB'
+
+    def test_unknown_keyword(self):
+        with pytest.raises(KeyError):
+            template_element('NotAKeyword', 'attribute')
+
+    def test_number_value(self):
+        assert number_value('1.5', 'FD') == 1.5
+        assert number_value('3', 'US') == 3
+        assert number_value('3', 'IS') == '3'
+        with pytest.raises(ValueError):
+            number_value('abc', 'SL')
+
+    def test_level(self):
+        """ the attributes of the level, sorted by tag"""
+        template = IdentifierTemplate.level('SERIES')
+        tags = [element.tag for element in template.elements]
+        assert tags == sorted(tags)
+        assert [element.attribute for element in template.elements] == [
+            'modality', 'seriesDescription', 'studyUID', 'seriesUID']
+
+    def test_study_patient(self):
+        """ the name and the birth date of the patient with the studies"""
+        template = IdentifierTemplate.level('STUDY', study_patient=True)
+        assert template.joins('patient')
+        assert not IdentifierTemplate.level('STUDY').joins('patient')
+
+    def test_extended_fields(self):
+        """ the unknown keywords and the sequences are skipped"""
+        template = IdentifierTemplate.level('SERIES', (
+            Field('BodyPartExamined', 'bodyPartExamined', ()),
+            Field('NotAKeyword', 'unknown', ()),
+            Field('ReferencedImageSequence', 'images', ()),
+            Field('Modality', 'otherModality', ())))
+        attributes = [element.attribute for element in template.elements]
+        assert 'bodyPartExamined' in attributes
+        assert 'unknown' not in attributes
+        assert 'images' not in attributes
+        # The attribute of the level is kept
+        assert 'modality' in attributes and 'otherModality' not in attributes
+
+    def test_select(self):
+        """ the keys of the request and the unique key"""
+        template = IdentifierTemplate.level('STUDY').select(
+            [Tag(0x0008, 0x0020)], 'StudyInstanceUID')
+        assert [element.attribute for element in template.elements] == [
+            'dateStudy', 'studyUID']
+
+    def test_covered_by(self):
+        template = IdentifierTemplate.level('PATIENT')
+        assert template.covered_by(('PatientName', 'PatientID', 'PatientSex',
+                                    'PatientBirthDate', 'StudyDate'))
+        assert not template.covered_by(('PatientName', 'PatientID'))
+
+    def test_from_row(self):
+        """ the values of the row and of its relationships"""
+        template = IdentifierTemplate.level('STUDY', study_patient=True)
+        row = SimpleNamespace(
+            studyUID='1.2', patientID='P1', dateStudy='20200101',
+            accessionNumber=None, institutionName=None,
+            studyDescription='Brain', protocolName=None,
+            patient=SimpleNamespace(patientName='DOE^JOHN',
+                                    patientBirthDate=None))
+        identifier = template.from_row(row)
+        assert identifier.StudyInstanceUID == '1.2'
+        assert identifier.PatientName == 'DOE^JOHN'
+        assert identifier.StudyDescription == 'Brain'
+        assert 'AccessionNumber' in identifier
+        assert identifier.AccessionNumber in (None, '')
+
+    def test_from_row_without_relationship(self):
+        template = IdentifierTemplate.level('STUDY', study_patient=True)
+        identifier = template.from_row(SimpleNamespace(
+            studyUID='1.2', patient=None))
+        assert identifier.PatientName in (None, '')
+        assert identifier.StudyDate in (None, '')
+
+    def test_from_row_invalid_number(self):
+        """ a value which is not a number of the VR is sent empty"""
+        template = IdentifierTemplate((template_element('Rows', 'rows'),))
+        assert template.from_row(SimpleNamespace(rows='12')).Rows == 12
+        assert template.from_row(SimpleNamespace(rows='abc')).Rows is None
+
+    def test_from_dataset(self):
+        """ the values of the file, in the first item of the sequences"""
+        template = IdentifierTemplate((
+            template_element('StudyInstanceUID', 'studyUID'),
+            template_element('CodeValue', 'code',
+                             (Tag(0x0008, 0x1032),)),
+            template_element('StudyDate', 'dateStudy')))
+        code = Dataset()
+        code.CodeValue = 'CT123'
+        ds = Dataset()  # pylint: disable=invalid-name
+        ds.StudyInstanceUID = '1.2'
+        ds.ProcedureCodeSequence = Sequence([code])
+        identifier = template.from_dataset(ds)
+        assert identifier.StudyInstanceUID == '1.2'
+        assert identifier.CodeValue == 'CT123'
+        assert identifier.StudyDate in (None, '')
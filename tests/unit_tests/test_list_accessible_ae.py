@@ -0,0 +1,298 @@
+""" Test the white list of the module list_accessible_ae"""
+import os
+import signal
+import socket
+import threading
+from types import SimpleNamespace
+
+import pytest
+from pydicom.dataset import Dataset
+from pynetdicom import AE, evt
+from pynetdicom.sop_class import VerificationSOPClass
+
+from sphere.pacs.cfind import CFind
+from sphere.pacs.cmove import CMove
+from sphere.utilities import list_accessible_ae
+from sphere.utilities.list_accessible_ae import (
+    ACTIONS, AccessList, HostResolver, association_actions, auth_association,
+    auth_in)
+
+
+def write_white_list(path, ip, actions=None, aet='PACS2'):
+    """ Write a white list file with one aet"""
+    lines = ['{0}:'.format(aet), '    ip: {0}'.format(ip),
+             '    port: 11112']
+    if actions is not None:
+        lines.append('    actions: [{0}]'.format(', '.join(actions)))
+    path.write_text('\n'.join(lines) + '\n')
+
+
+@pytest.fixture
+def folder(tmp_path):
+    """ A white list folder authorizing PACS2 from 10.0.0.2"""
+    folder = tmp_path / 'white_list'
+    folder.mkdir()
+    write_white_list(folder / 'pacs2.yml', '10.0.0.2')
+    return folder
+
+
+class TestAccessList:
+
+    def test_is_authorized(self, folder):
+        access_list = AccessList(str(folder))
+        assert access_list.is_authorized('PACS2', '10.0.0.2', 'CSTORE')
+        assert not access_list.is_authorized('PACS2', '10.0.0.3', 'CSTORE')
+        assert not access_list.is_authorized('PACS3', '10.0.0.2', 'CSTORE')
+        assert access_list.entries()['PACS2']['port'] == 11112
+
+    def test_reload_on_change(self, folder):
+        """ a file modified is read again at the next check"""
+        access_list = AccessList(str(folder), check_interval=0)
+        assert access_list.is_authorized('PACS2', '10.0.0.2')
+        write_white_list(folder / 'pacs2.yml', '10.0.0.22')
+        assert not access_list.is_authorized('PACS2', '10.0.0.2')
+        assert access_list.is_authorized('PACS2', '10.0.0.22')
+        write_white_list(folder / 'pacs3.yml', '10.0.0.3', aet='PACS3')
+        assert access_list.is_authorized('PACS3', '10.0.0.3')
+        os.remove(str(folder / 'pacs3.yml'))
+        assert not access_list.is_authorized('PACS3', '10.0.0.3')
+
+    def test_check_interval(self, folder):
+        """ the files are not checked again before the interval"""
+        access_list = AccessList(str(folder), check_interval=3600)
+        assert access_list.is_authorized('PACS2', '10.0.0.2')
+        write_white_list(folder / 'pacs2.yml', '10.0.0.22')
+        assert access_list.is_authorized('PACS2', '10.0.0.2')
+        access_list.request_reload()
+        assert access_list.is_authorized('PACS2', '10.0.0.22')
+
+    def test_reload_on_sighup(self, folder):
+        """ SIGHUP reloads the files before the interval"""
+        access_list = AccessList(str(folder), check_interval=3600)
+        assert access_list.is_authorized('PACS2', '10.0.0.2')
+        write_white_list(folder / 'pacs2.yml', '10.0.0.22')
+        previous = signal.getsignal(signal.SIGHUP)
+        try:
+            access_list.reload_on_sighup()
+            os.kill(os.getpid(), signal.SIGHUP)
+        finally:
+            signal.signal(signal.SIGHUP, previous)
+        assert access_list.is_authorized('PACS2', '10.0.0.22')
+
+    def test_subfolders_ignored(self, folder):
+        """ only the files of the folder are read, as before the index"""
+        subfolder = folder / 'old'
+        subfolder.mkdir()
+        write_white_list(subfolder / 'pacs3.yml', '10.0.0.3', aet='PACS3')
+        access_list = AccessList(str(folder))
+        assert not access_list.is_authorized('PACS3', '10.0.0.3')
+        assert [os.path.basename(path) for path, _mtime, _size in
+                access_list.files_signature()] == ['pacs2.yml']
+
+    def test_missing_folder(self, tmp_path):
+        access_list = AccessList(str(tmp_path / 'missing'))
+        assert not access_list.is_authorized('PACS2', '10.0.0.2')
+
+    def test_invalid_file(self, folder):
+        """ a file which is not a dictionary is ignored"""
+        (folder / 'broken.yml').write_text('- not a dictionary\n')
+        access_list = AccessList(str(folder))
+        assert access_list.is_authorized('PACS2', '10.0.0.2')
+
+    def test_actions(self, folder):
+        """ the actions of an entry restrict the aet"""
+        write_white_list(folder / 'pacs2.yml', '10.0.0.2',
+                         actions=['cstore', 'CEcho'])
+        access_list = AccessList(str(folder))
+        assert access_list.is_authorized('PACS2', '10.0.0.2', 'CSTORE')
+        assert not access_list.is_authorized('PACS2', '10.0.0.2', 'CFIND')
+        assert access_list.authorized_actions('PACS2', '10.0.0.2') == \
+            {'CSTORE', 'CECHO'}
+
+    def test_all_actions(self, folder):
+        """ an entry without actions authorizes all the actions, the entries
+        of an aet in several files are merged"""
+        write_white_list(folder / 'pacs2_ct.yml', '10.0.0.3',
+                         actions=['CFIND'])
+        access_list = AccessList(str(folder))
+        assert access_list.authorized_actions('PACS2', '10.0.0.2') == \
+            frozenset(ACTIONS)
+        assert access_list.authorized_actions('PACS2', '10.0.0.3') == \
+            {'CFIND'}
+        assert access_list.authorized_actions('PACS2', '10.0.0.4') == \
+            frozenset()
+
+
+class FakeDNS:
+    """ socket.getaddrinfo answering {host: [IPs]}, counting the queries"""
+    def __init__(self, hosts):
+        self.hosts = hosts
+        self.queries = []
+        # Cleared to hold the answers
+        self.answer = threading.Event()
+        self.answer.set()
+
+    def getaddrinfo(self, host, port, proto=0):
+        self.queries.append(host)
+        self.answer.wait()
+        if host not in self.hosts:
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return [(socket.AF_INET, socket.SOCK_STREAM, proto, '', (ip, 0))
+                for ip in self.hosts[host]]
+
+
+@pytest.fixture
+def dns(monkeypatch):
+    """ The DNS of the module and its clock"""
+    dns = FakeDNS({'pacs2.local': ['10.0.0.2']})
+    monkeypatch.setattr(list_accessible_ae.socket, 'getaddrinfo',
+                        dns.getaddrinfo)
+    dns.clock = [1000.0]
+    monkeypatch.setattr(list_accessible_ae, 'time', SimpleNamespace(
+        monotonic=lambda: dns.clock[0]))
+    return dns
+
+
+def wait_resolutions(resolver):
+    """ Wait for the background resolutions"""
+    for event in list(resolver.pending.values()):
+        assert event.wait(5)
+
+
+class TestHostResolver:
+
+    def test_cache(self, dns):
+        """ the host is resolved once while the ttl is not expired"""
+        resolver = HostResolver(ttl=300, negative_ttl=30)
+        assert resolver.addresses('pacs2.local') == {'10.0.0.2'}
+        dns.clock[0] += 299
+        assert resolver.addresses('pacs2.local') == {'10.0.0.2'}
+        assert dns.queries == ['pacs2.local']
+
+    def test_ttl(self, dns):
+        """ an expired entry is used while it is resolved in background"""
+        resolver = HostResolver(ttl=300, negative_ttl=30)
+        assert resolver.addresses('pacs2.local') == {'10.0.0.2'}
+        dns.hosts['pacs2.local'] = ['10.0.0.22']
+        dns.clock[0] += 301
+        dns.answer.clear()
+        assert resolver.addresses('pacs2.local') == {'10.0.0.2'}
+        # Only one resolution in progress
+        assert resolver.addresses('pacs2.local') == {'10.0.0.2'}
+        dns.answer.set()
+        wait_resolutions(resolver)
+        assert resolver.addresses('pacs2.local') == {'10.0.0.22'}
+        assert dns.queries == ['pacs2.local'] * 2
+
+    def test_negative_ttl(self, dns):
+        """ a host not resolved is kept negative_ttl seconds"""
+        resolver = HostResolver(ttl=300, negative_ttl=30)
+        assert resolver.addresses('pacs3.local') == frozenset()
+        dns.clock[0] += 29
+        assert resolver.addresses('pacs3.local') == frozenset()
+        assert dns.queries == ['pacs3.local']
+        dns.hosts['pacs3.local'] = ['10.0.0.3']
+        dns.clock[0] += 2
+        resolver.addresses('pacs3.local')
+        wait_resolutions(resolver)
+        assert resolver.addresses('pacs3.local') == {'10.0.0.3'}
+
+    def test_timeout(self, dns):
+        """ the first check does not wait more than timeout for the DNS"""
+        resolver = HostResolver(ttl=300, negative_ttl=30, timeout=0.01)
+        dns.answer.clear()
+        assert resolver.addresses('pacs2.local') == frozenset()
+        dns.answer.set()
+        wait_resolutions(resolver)
+        assert resolver.addresses('pacs2.local') == {'10.0.0.2'}
+
+    def test_access_list(self, dns, folder, monkeypatch):
+        """ a host name of the white list is resolved by the cache"""
+        monkeypatch.setattr(list_accessible_ae, 'RESOLVER',
+                            HostResolver(ttl=300, negative_ttl=30))
+        write_white_list(folder / 'pacs2.yml', 'pacs2.local')
+        access_list = AccessList(str(folder))
+        assert access_list.is_authorized('PACS2', '10.0.0.2', 'CSTORE')
+        assert not access_list.is_authorized('PACS2', '10.0.0.3', 'CSTORE')
+        assert dns.queries == ['pacs2.local']
+
+
+@pytest.fixture
+def access_list(folder, monkeypatch):
+    """ The white list of the module: PACS2 from 127.0.0.1 for C-ECHO and
+    C-FIND"""
+    write_white_list(folder / 'pacs2.yml', '127.0.0.1',
+                     actions=['CECHO', 'CFIND'])
+    access_list = AccessList(str(folder))
+    monkeypatch.setattr(list_accessible_ae, 'ACCESS_LIST', access_list)
+    return access_list
+
+
+def requestor(ae_title=b'PACS2 ', address='127.0.0.1', actions=None):
+    """ An association requested by ae_title from address"""
+    assoc = SimpleNamespace(requestor=SimpleNamespace(
+        ae_title=ae_title, address=address, primitive=None))
+    if actions is not None:
+        assoc.sphere_actions = frozenset(actions)
+    return assoc
+
+
+class TestAssociationAuth:
+
+    def test_rejected_at_request(self, access_list):
+        """ an unknown aet is rejected before the association is
+        established"""
+        scp = AE(ae_title=b'SPHERE')
+        scp.add_supported_context(VerificationSOPClass)
+        server = scp.start_server(
+            ('127.0.0.1', 0), block=False,
+            evt_handlers=[(evt.EVT_REQUESTED, auth_association)])
+        try:
+            scu = AE(ae_title=b'PACS9')
+            scu.add_requested_context(VerificationSOPClass)
+            assoc = scu.associate(*server.server_address)
+            assert assoc.is_rejected
+            scu.ae_title = b'PACS2'
+            assoc = scu.associate(*server.server_address)
+            assert assoc.is_established
+            assert assoc.send_c_echo().Status == 0x0000
+            assoc.release()
+        finally:
+            server.shutdown()
+
+    def test_actions_cached(self, access_list, monkeypatch):
+        """ the white list is read once per association"""
+        assoc = requestor()
+        assert association_actions(assoc) == {'CECHO', 'CFIND'}
+
+        def authorized_actions(aet, ip):
+            raise AssertionError('The white list is read again')
+        monkeypatch.setattr(access_list, 'authorized_actions',
+                            authorized_actions)
+        assert auth_in(SimpleNamespace(assoc=assoc), 'CFIND')
+        assert not auth_in(SimpleNamespace(assoc=assoc), 'CMOVE')
+        assert assoc.sphere_actions == {'CECHO', 'CFIND'}
+
+    def test_calling_aet(self, access_list):
+        """ during the negotiation the aet is read in the A-ASSOCIATE-RQ"""
+        assoc = requestor(ae_title=b'')
+        assoc.requestor.primitive = SimpleNamespace(
+            calling_ae_title=b'PACS2           ')
+        assert association_actions(assoc) == {'CECHO', 'CFIND'}
+        assert association_actions(requestor(address='10.0.0.9')) == \
+            frozenset()
+
+    @pytest.mark.parametrize('handler, action', [
+        (CFind, 'CFIND'), (CMove, 'CMOVE')])
+    def test_handlers(self, handler, action, access_list):
+        """ the handlers only answer the actions cached on the
+        association"""
+        scp = handler(SimpleNamespace(ae_title=b'SPHERE'))
+        scp.console_verbose = 0
+        response = getattr(scp, action.lower() + '_response')
+        # The dataset without QueryRetrieveLevel fails after the check
+        event = SimpleNamespace(assoc=requestor(actions=[action]),
+                                identifier=Dataset(), is_cancelled=False)
+        assert list(response(event)) == [(0xC000, None)]
+        event.assoc = requestor(actions=['CECHO'])
+        assert list(response(event)) == []
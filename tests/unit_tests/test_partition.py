@@ -0,0 +1,188 @@
+""" Test the keys and the partitions of the partitioned tables"""
+from datetime import date
+
+import pytest
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table,
+                        UniqueConstraint, create_engine)
+
+from sphere import settings
+from sphere.dicmeta.insert_in_database import InsertData
+from sphere.dicmeta.models import partition
+from sphere.dicmeta.models.partition import (
+    TABLE_KEYS, conflict_target, month_start, partition_ddl, table_args)
+
+
+@pytest.fixture(params=['NONE', 'RANGE', 'HASH'])
+def method(request, monkeypatch):
+    """ Set the partitioning method"""
+    monkeypatch.setattr(partition, 'PARTITION_METHOD', request.param)
+    return request.param
+
+
+def make_table(table_name, schema=None):
+    """ Create a table with the arguments of table_args"""
+    args = table_args(table_name)
+    if isinstance(args, dict):
+        constraints, kwargs = (), args
+    else:
+        constraints, kwargs = args[:-1], args[-1]
+    kwargs = dict(kwargs, schema=schema)
+    id_name, uid_name = TABLE_KEYS[table_name]
+    return Table(table_name, MetaData(), Column(id_name, Integer),
+                 Column(uid_name, String), Column('study_uid', String),
+                 Column('d8ins', DateTime), *constraints, **kwargs)
+
+
+def unique_columns(table):
+    """ Return the columns of the unique constraints of a table"""
+    return [tuple(constraint.columns.keys())
+            for constraint in table.constraints
+            if isinstance(constraint, UniqueConstraint)]
+
+
+class TestTableArgs:
+
+    def test_instance(self, method):
+        """ the partition key is in the primary key and the unique uid"""
+        table = make_table('file_storage_metadata_dicom')
+        primary_key = table.primary_key.columns.keys()
+        partition_by = table.dialect_options['postgresql']['partition_by']
+        if method == 'NONE':
+            assert not primary_key
+            assert partition_by is None
+        elif method == 'RANGE':
+            assert primary_key == ['file_storage_metadata_dicom_id', 'd8ins']
+            assert partition_by == 'RANGE (d8ins)'
+            assert not unique_columns(table)
+        else:
+            assert primary_key == ['file_storage_metadata_dicom_id',
+                                   'study_uid']
+            assert partition_by == 'HASH (study_uid)'
+            assert unique_columns(table) == [('instance_uid', 'study_uid')]
+
+    def test_series(self, method):
+        """ the series are only partitioned by hash"""
+        table = make_table('series')
+        partition_by = table.dialect_options['postgresql']['partition_by']
+        if method == 'HASH':
+            assert table.primary_key.columns.keys() == ['series_id',
+                                                        'study_uid']
+            assert unique_columns(table) == [('series_uid', 'study_uid')]
+        else:
+            assert partition_by is None
+
+    def test_other_constraints(self, monkeypatch):
+        """ the constraints given are kept before the keys"""
+        monkeypatch.setattr(partition, 'PARTITION_METHOD', 'HASH')
+        constraint = object()
+        args = table_args('series', constraint)
+        assert args[0] is constraint
+        assert len(args) == 4
+
+
+class TestConflictTarget:
+
+    def test_conflict_target(self, method):
+        """ the uid alone, with the hash key, or no target (range)"""
+        target = conflict_target('file_storage_metadata_dicom',
+                                 'instance_uid')
+        assert target == {'NONE': ('instance_uid',),
+                          'RANGE': None,
+                          'HASH': ('instance_uid', 'study_uid')}[method]
+
+    def test_not_partitioned(self, method):
+        """ the tables not partitioned keep the uid alone"""
+        assert conflict_target('study', 'study_uid') == ('study_uid',)
+
+
+class TestMonthStart:
+
+    @pytest.mark.parametrize('day, months, expected', [
+        (date(2026, 10, 19), 0, date(2026, 10, 1)),
+        (date(2026, 10, 19), 1, date(2026, 11, 1)),
+        (date(2026, 12, 31), 1, date(2027, 1, 1)),
+        (date(2026, 11, 1), 14, date(2028, 1, 1)),
+        (date(2027, 1, 15), -1, date(2026, 12, 1)),
+    ])
+    def test_month_start(self, day, months, expected):
+        """ the months roll over the years"""
+        assert month_start(day, months) == expected
+
+
+class TestPartitionDDL:
+
+    def test_range(self, monkeypatch):
+        """ a monthly partition ends on the first day of the next month"""
+        monkeypatch.setattr(partition, 'PARTITION_METHOD', 'RANGE')
+        table = make_table('file_storage_metadata_dicom')
+        name, request = partition_ddl(table, date(2026, 12, 1))
+        assert name == 'file_storage_metadata_dicom_p202612'
+        assert request == (
+            "CREATE TABLE IF NOT EXISTS file_storage_metadata_dicom_p202612 "
+            "PARTITION OF file_storage_metadata_dicom "
+            "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')")
+
+    def test_range_default(self, monkeypatch):
+        """ the default partition gets the rows of the other months"""
+        monkeypatch.setattr(partition, 'PARTITION_METHOD', 'RANGE')
+        table = make_table('file_storage_metadata_dicom', schema='pacs')
+        name, request = partition_ddl(table)
+        assert name == 'file_storage_metadata_dicom_default'
+        assert request == (
+            "CREATE TABLE IF NOT EXISTS "
+            "pacs.file_storage_metadata_dicom_default "
+            "PARTITION OF pacs.file_storage_metadata_dicom DEFAULT")
+
+    def test_hash(self, monkeypatch):
+        """ a hash partition is one remainder of the modulus"""
+        monkeypatch.setattr(partition, 'PARTITION_METHOD', 'HASH')
+        monkeypatch.setattr(settings, 'DB_PARTITION_MODULUS', 4, raising=False)
+        table = make_table('series', schema='pacs')
+        name, request = partition_ddl(table, 3)
+        assert name == 'series_p3'
+        assert request == (
+            "CREATE TABLE IF NOT EXISTS pacs.series_p3 PARTITION OF "
+            "pacs.series FOR VALUES WITH (MODULUS 4, REMAINDER 3)")
+
+
+class InstanceModel:
+    """ The instance table of the upsert"""
+    __tablename__ = 'file_storage_metadata_dicom'
+
+    @staticmethod
+    def table_full_name():
+        return 'file_storage_metadata_dicom'
+
+
+class TestConflictClause:
+
+    def test_on_conflict(self, monkeypatch):
+        """ the tables with a unique uid skip the conflicts"""
+        monkeypatch.setattr(partition, 'PARTITION_METHOD', 'HASH')
+        assert InsertData.conflict_clause(
+            InstanceModel, 'instance_uid', 'tmp_instance') == \
+            "ON CONFLICT (instance_uid, study_uid) DO NOTHING"
+
+    def test_range_no_duplicate(self, monkeypatch):
+        """ without unique uid the rows already inserted are skipped"""
+        monkeypatch.setattr(partition, 'PARTITION_METHOD', 'RANGE')
+        engine = create_engine('sqlite://')
+        engine.execute('CREATE TABLE file_storage_metadata_dicom '
+                       '(instance_uid VARCHAR, d8ins VARCHAR)')
+        engine.execute('CREATE TABLE tmp_instance '
+                       '(instance_uid VARCHAR, d8ins VARCHAR)')
+        engine.execute("INSERT INTO file_storage_metadata_dicom "
+                       "VALUES ('1.1', '2026-09-01')")
+        engine.execute("INSERT INTO tmp_instance VALUES "
+                       "('1.1', '2026-10-19'), ('1.2', '2026-10-19')")
+        upsert = "INSERT INTO file_storage_metadata_dicom " \
+                 "SELECT instance_uid, d8ins FROM tmp_instance %s" % \
+                 InsertData.conflict_clause(InstanceModel, 'instance_uid',
+                                            'tmp_instance')
+        engine.execute(upsert)
+        engine.execute(upsert)
+        rows = engine.execute('SELECT instance_uid, d8ins FROM '
+                              'file_storage_metadata_dicom ORDER BY '
+                              'instance_uid').fetchall()
+        assert [tuple(row) for row in rows] == [('1.1', '2026-09-01'),
+                                                ('1.2', '2026-10-19')]
@@ -0,0 +1,80 @@
+""" Test the queries of the module query_planner"""
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from sphere.dicmeta.requests.query_planner import QueryPlanner
+
+# (patient id, patient name, study uid, study date, (modality of each series))
+STUDIES = (
+    ('P1', 'DOE^JOHN', '1.1', '20200101', ('MR', 'CT')),
+    ('P2', 'SMITH^ANN', '2.1', '20210101', ('CT',)),
+    ('P2', 'SMITH^ANN', '2.2', '20210601', ('US',)),
+)
+
+
+@pytest.fixture
+def session(sqlite_db):
+    """ A session on a database with the studies of STUDIES (the ids are
+    given: the BigInteger keys are not autoincremented by sqlite)"""
+    sqlite_db.create_tables()
+    session = sessionmaker(bind=sqlite_db.engine)()
+    patients = {}
+    series_id = 0
+    for study_id, (patient_id, name, study_uid, date, modalities) in \
+            enumerate(STUDIES, 1):
+        if patient_id not in patients:
+            patients[patient_id] = sqlite_db.PatientModel(
+                id=len(patients) + 1, patientID=patient_id, patientName=name)
+        patient = patients[patient_id]
+        study = sqlite_db.StudyModel(
+            id=study_id, studyUID=study_uid, patientID=patient_id,
+            dateStudy=date, patient=patient)
+        for number, modality in enumerate(modalities):
+            series_id += 1
+            sqlite_db.SeriesModel(
+                id=series_id, seriesUID='%s.%s' % (study_uid, number),
+                studyUID=study_uid,
+                patientID=patient_id, modality=modality, study=study,
+                patient=patient)
+        session.add(study)
+    session.commit()
+    yield session
+    session.close()
+
+
+class TestQueryPlanner:
+
+    def test_split_filter(self, sqlite_db):
+        """ each attribute goes to the level of its model"""
+        planner = QueryPlanner(sqlite_db)
+        assert planner.split_filter('study', {
+            'dateStudy': '20200101', 'patientID': 'P1', 'modality': 'MR',
+            'patientName': 'DOE*', 'seriesUID': '1.1.0'}) == {
+                'study': {'dateStudy': '20200101', 'patientID': 'P1'},
+                'series': {'modality': 'MR', 'seriesUID': '1.1.0'},
+                'patient': {'patientName': 'DOE*'}}
+
+    def test_child_filter(self, sqlite_db, session):
+        """ the studies with a series of the modalities, without duplicates"""
+        query = QueryPlanner(sqlite_db).search(session, 'study',
+                                               {'modality': 'MR\\CT'})
+        assert sorted(study.studyUID for study in query) == ['1.1', '2.1']
+
+    def test_parent_filter(self, sqlite_db, session):
+        """ the studies of the patients matching the name"""
+        query = QueryPlanner(sqlite_db).search(session, 'study',
+                                               {'patientName': 'SMITH*'})
+        assert sorted(study.studyUID for study in query) == ['2.1', '2.2']
+
+    def test_filters_on_all_levels(self, sqlite_db, session):
+        """ the filters of the parents, the level and the children"""
+        query = QueryPlanner(sqlite_db).search(session, 'study', {
+            'patientName': 'SMITH*', 'dateStudy': '20210101-',
+            'modality': 'US'})
+        assert [study.studyUID for study in query] == ['2.2']
+
+    def test_series_level(self, sqlite_db, session):
+        """ the series of the studies matching the date"""
+        query = QueryPlanner(sqlite_db).search(session, 'series', {
+            'dateStudy': '-20201231', 'modality': 'CT'})
+        assert [series.seriesUID for series in query] == ['1.1.1']
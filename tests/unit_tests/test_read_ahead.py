@@ -0,0 +1,110 @@
+""" Test the read ahead of the DICOM files sent"""
+import os
+
+import pytest
+
+from sphere.fsa import read_ahead
+from sphere.fsa.read_ahead import ReadAhead
+
+
+@pytest.fixture
+def advised(monkeypatch):
+    """ Record the paths given to will_need instead of reading them"""
+    paths = []
+    monkeypatch.setattr(read_ahead, 'will_need', paths.append)
+    return paths
+
+
+class TestIteration:
+
+    def test_sorted(self, advised):
+        """ the paths are sorted and each one is read ahead once"""
+        paths = ['/dicom/b', '/dicom/c', '/dicom/a']
+        assert list(ReadAhead(paths, depth=2)) == sorted(paths)
+        assert advised == sorted(paths)
+
+    def test_not_sorted(self, advised):
+        """ sort=False keeps the order of the paths"""
+        paths = ['/dicom/b', '/dicom/c', '/dicom/a']
+        assert list(ReadAhead(iter(paths), depth=2, sort=False)) == paths
+        assert advised == paths
+
+    def test_window(self, advised):
+        """ the depth files after the one yielded are already read ahead"""
+        paths = ['/dicom/%s' % index for index in range(6)]
+        for index, path in enumerate(ReadAhead(paths, depth=2)):
+            assert path == paths[index]
+            assert advised == paths[:min(index + 3, len(paths))]
+
+    def test_lazy(self, advised):
+        """ a generator is not consumed further than the window"""
+        taken = []
+
+        def paths():
+            for index in range(10):
+                taken.append(index)
+                yield '/dicom/%s' % index
+        iterator = iter(ReadAhead(paths(), depth=2, sort=False))
+        assert next(iterator) == '/dicom/0'
+        assert taken == [0, 1, 2]
+
+    def test_depth_zero(self, advised):
+        """ depth 0 disables the read ahead"""
+        paths = ['/dicom/a', '/dicom/b']
+        assert list(ReadAhead(paths, depth=0)) == paths
+        assert not advised
+
+
+class TestAdvance:
+
+    def test_first_path(self, advised):
+        """ the first call reads the path consumed and depth paths ahead"""
+        paths = ['/dicom/%s' % index for index in range(5)]
+        ahead = ReadAhead(paths, depth=2)
+        ahead.advance()
+        assert advised == paths[:3]
+
+    def test_each_path_once(self, advised):
+        """ all the paths are read ahead once, in order"""
+        paths = ['/dicom/%s' % index for index in range(5)]
+        ahead = ReadAhead(paths, depth=2)
+        called = []
+        send = ahead.wrap(called.append)
+        for path in ahead.paths:
+            send(path)
+        assert called == paths
+        assert advised == paths
+
+    def test_depth_zero(self, advised):
+        """ depth 0 disables the read ahead"""
+        ahead = ReadAhead(['/dicom/a', '/dicom/b'], depth=0)
+        ahead.advance()
+        assert not advised
+
+
+class TestReader:
+
+    def test_without_fadvise(self, monkeypatch):
+        """ without posix_fadvise one thread reads the files"""
+        read = []
+        monkeypatch.delattr(os, 'posix_fadvise', raising=False)
+        monkeypatch.setattr(read_ahead, 'read_file', read.append)
+        ahead = ReadAhead(['/dicom/a', '/dicom/b'], depth=1)
+        assert ahead.reader is not None
+        assert list(ahead) == ['/dicom/a', '/dicom/b']
+        ahead.reader.join()
+        assert read == ['/dicom/a', '/dicom/b']
+
+    def test_missing_file(self, tmp_path):
+        """ a missing file is not an error"""
+        path = str(tmp_path / 'missing.dcm')
+        read_ahead.will_need(path)
+        read_ahead.read_file(path)
+
+    def test_read_file(self, tmp_path):
+        """ the files are read or advised without error"""
+        path = tmp_path / 'file.dcm'
+        path.write_bytes(b'\x00' * (read_ahead.READ_SIZE + 1))
+        read_ahead.read_file(str(path))
+        if hasattr(os, 'posix_fadvise'):
+            read_ahead.will_need(str(path))
@@ -0,0 +1,118 @@
+""" Test the checkpoint and the queue of the module send_queue"""
+import json
+import threading
+
+from sphere.pacs.send_queue import Checkpoint, SendQueue
+
+
+class Progress:
+    """ Record the positions acknowledged"""
+    def __init__(self):
+        self.positions = []
+
+    def acknowledge(self, position):
+        self.positions.append(position)
+
+
+class TestCheckpoint:
+
+    def test_acknowledge_out_of_order(self):
+        """ the position is the first path not yet acknowledged"""
+        checkpoint = Checkpoint()
+        for position in (1, 2, 4):
+            checkpoint.acknowledge(position)
+        assert checkpoint.position == 0
+        checkpoint.acknowledge(0)
+        assert checkpoint.position == 3
+        checkpoint.acknowledge(3)
+        assert checkpoint.position == 5
+        assert not checkpoint.acknowledged
+
+    def test_save_and_load(self, tmp_path):
+        """ the position is saved every save_every paths and read again"""
+        path = str(tmp_path / 'checkpoint.json')
+        checkpoint = Checkpoint(path, save_every=2)
+        checkpoint.acknowledge(0)
+        assert not (tmp_path / 'checkpoint.json').exists()
+        checkpoint.acknowledge(1)
+        with open(path) as file:
+            assert json.load(file) == {'position': 2}
+        assert Checkpoint(path).position == 2
+
+    def test_invalid_file(self, tmp_path):
+        path = tmp_path / 'checkpoint.json'
+        path.write_text('{"other": 3}')
+        assert Checkpoint(str(path)).position == 0
+
+    def test_finish(self, tmp_path):
+        """ the file is removed when all the paths are acknowledged"""
+        path = tmp_path / 'checkpoint.json'
+        checkpoint = Checkpoint(str(path))
+        checkpoint.acknowledge(0)
+        checkpoint.finish(2)
+        assert json.loads(path.read_text()) == {'position': 1}
+        checkpoint.acknowledge(1)
+        checkpoint.finish(2, complete=False)
+        assert path.exists()
+        checkpoint.finish(2)
+        assert not path.exists()
+
+    def test_clear(self, tmp_path):
+        path = tmp_path / 'checkpoint.json'
+        checkpoint = Checkpoint(str(path))
+        checkpoint.save()
+        assert path.exists()
+        checkpoint.clear()
+        assert not path.exists()
+
+    def test_progress(self):
+        """ the progress is told of each acknowledged position"""
+        progress = Progress()
+        checkpoint = Checkpoint(progress=progress)
+        checkpoint.acknowledge(1)
+        checkpoint.acknowledge(0)
+        assert progress.positions == [1, 0]
+
+
+class TestSendQueue:
+
+    PATHS = ['/dicom/%s.dcm' % number for number in range(10)]
+
+    def test_positions(self):
+        send_queue = SendQueue(iter(self.PATHS), maxsize=2)
+        assert list(send_queue) == list(enumerate(self.PATHS))
+        send_queue.close()
+        assert send_queue.complete
+        assert send_queue.total == len(self.PATHS)
+
+    def test_start(self):
+        """ the paths already sent are skipped"""
+        send_queue = SendQueue(iter(self.PATHS), start=7)
+        assert list(send_queue) == list(enumerate(self.PATHS))[7:]
+        send_queue.close()
+        assert send_queue.total == len(self.PATHS)
+
+    def test_consumers(self):
+        """ each path goes to one consumer and all of them see the end"""
+        send_queue = SendQueue(iter(self.PATHS), maxsize=2)
+        consumed = [[] for _thread in range(3)]
+        threads = [threading.Thread(target=items.extend, args=(send_queue,))
+                   for items in consumed]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        assert not any(thread.is_alive() for thread in threads)
+        assert sorted(item for items in consumed for item in items) == \
+            list(enumerate(self.PATHS))
+        send_queue.close()
+
+    def test_close(self):
+        """ closing stops the producer waiting for free space"""
+        send_queue = SendQueue(iter(self.PATHS), maxsize=1)
+        iterator = iter(send_queue)
+        assert next(iterator) == (0, self.PATHS[0])
+        send_queue.close()
+        assert not send_queue.producer.is_alive()
+        assert not send_queue.complete
+        assert send_queue.total < len(self.PATHS)
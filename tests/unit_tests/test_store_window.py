@@ -0,0 +1,284 @@
+""" Test the C-STORE requests of the module store_window"""
+import queue
+import threading
+from types import SimpleNamespace
+
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian
+
+from sphere.pacs.store_window import (
+    StoreWindow, async_ops_negotiation, negotiated_window, read_file_meta)
+
+SOP_CLASS = '1.2.840.10008.5.1.4.1.1.4'
+
+
+class FakeDimse:
+    """ The DIMSE provider: the responses are chosen by ``answer``"""
+    def __init__(self, maximum_pdu_size=256):
+        self.maximum_pdu_size = maximum_pdu_size
+        self.sent = []
+        # Called with the outstanding Message IDs, returns the Message ID
+        # answered (None: no response)
+        self.answer = min
+
+    def send_msg(self, req, context_id):
+        self.sent.append((req, context_id))
+
+    def get_msg(self, block=True):
+        message_id = self.answer(sorted(self.window.outstanding))
+        if message_id is None:
+            return None, None
+        return 1, SimpleNamespace(MessageIDBeingRespondedTo=message_id,
+                                  Status=0x0000)
+
+
+class FakeDul:
+    """ The DUL: keep the P-DATA, fail after ``fail_after`` PDU"""
+    def __init__(self, fail_after=None):
+        self.to_provider_queue = queue.Queue()
+        self.pdus = []
+        self.fail_after = fail_after
+
+    def send_pdu(self, pdata):
+        if self.fail_after is not None and len(self.pdus) >= self.fail_after:
+            raise OSError('connection reset')
+        self.pdus.append(pdata)
+
+
+class FakeAssociation:
+    """ An established association accepting one transfer syntax"""
+    def __init__(self, transfer_syntax=ExplicitVRLittleEndian,
+                 async_ops=None, fail_after=None):
+        self._reactor_checkpoint = threading.Event()
+        self._reactor_checkpoint.set()
+        self._is_paused = True
+        self.is_established = True
+        self.aborted = False
+        self.no_response = False
+        self.transfer_syntax = transfer_syntax
+        self.acceptor = SimpleNamespace(asynchronous_operations=async_ops)
+        self.dimse = FakeDimse()
+        self.dul = FakeDul(fail_after)
+
+    def _get_valid_context(self, _sop_class, _transfer_syntax, _role):
+        return SimpleNamespace(context_id=1,
+                               transfer_syntax=[self.transfer_syntax])
+
+    @staticmethod
+    def _check_received_status(rsp):
+        status = Dataset()
+        status.Status = rsp.Status
+        return status
+
+    def _handle_no_response(self):
+        self.no_response = True
+
+    @staticmethod
+    def get_handlers(_event):
+        return []
+
+    def abort(self):
+        self.aborted = True
+        self.is_established = False
+
+
+def store_window(assoc, window=None):
+    """ A StoreWindow whose fake DIMSE answers its requests"""
+    window = StoreWindow(assoc, window)
+    assoc.dimse.window = window
+    return window
+
+
+def write_dicom(path, number=1, size=1000):
+    """ Write a DICOM file in explicit VR little endian"""
+    ds = Dataset()  # pylint: disable=invalid-name
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.MediaStorageSOPClassUID = SOP_CLASS
+    ds.file_meta.MediaStorageSOPInstanceUID = '1.2.3.%s' % number
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.SOPClassUID = SOP_CLASS
+    ds.SOPInstanceUID = '1.2.3.%s' % number
+    ds.PatientName = 'DOE^JOHN'
+    ds.ImageComments = 'x' * size
+    ds.save_as(str(path), write_like_original=False)
+    return str(path)
+
+
+class TestStoreWindow:
+
+    def test_message_ids(self, tmp_path):
+        """ each request has the next Message ID, 65535 is followed by 1"""
+        assoc = FakeAssociation(async_ops=(4, 4))
+        window = store_window(assoc, 4)
+        window._msg_id = 65534
+        paths = [write_dicom(tmp_path / ('%s.dcm' % number), number)
+                 for number in range(3)]
+        for number, path in enumerate(paths):
+            window.send_file(number, path)
+        assert window.outstanding == {
+            65535: (0, paths[0]), 1: (1, paths[1]), 2: (2, paths[2])}
+
+    def test_stream_file(self, tmp_path):
+        """ the same transfer syntax: the bytes of the file are streamed"""
+        path = write_dicom(tmp_path / 'a.dcm')
+        assoc = FakeAssociation(ExplicitVRLittleEndian)
+        store_window(assoc).send_file('a', path)
+        assert not assoc.dimse.sent
+        fragments = [pdata.presentation_data_value_list[0][1]
+                     for pdata in assoc.dul.pdus]
+        # Message control header: bit 0 command, bit 1 last fragment
+        commands = [fragment for fragment in fragments
+                    if fragment[0] & 0x01]
+        datasets = [fragment for fragment in fragments
+                    if not fragment[0] & 0x01]
+        assert commands[-1][0] == 0x03
+        assert [fragment[0] for fragment in datasets] == \
+            [0x00] * (len(datasets) - 1) + [0x02]
+        assert len(datasets) > 1
+        assert all(len(fragment) <= assoc.dimse.maximum_pdu_size - 5
+                   for fragment in datasets)
+        _file_meta, offset = read_file_meta(path)
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            assert b''.join(fragment[1:] for fragment in datasets) == \
+                file.read()
+
+    def test_encode_file(self, tmp_path):
+        """ another transfer syntax: the dataset is read and encoded"""
+        path = write_dicom(tmp_path / 'a.dcm')
+        assoc = FakeAssociation(ImplicitVRLittleEndian)
+        window = store_window(assoc)
+        window.send_file('a', path)
+        assert not assoc.dul.pdus
+        (req, context_id), = assoc.dimse.sent
+        assert context_id == 1
+        assert req.AffectedSOPInstanceUID == '1.2.3.1'
+        assert window.outstanding == {req.MessageID: ('a', path)}
+
+    def test_file_not_read(self, tmp_path):
+        """ a file failing before its first PDU: the next one is sent"""
+        path = write_dicom(tmp_path / 'a.dcm')
+        assoc = FakeAssociation()
+        statuses = []
+        unacknowledged = store_window(assoc).send_all(
+            [('missing', str(tmp_path / 'missing.dcm')), ('a', path)],
+            lambda key, status: statuses.append((key, status)))
+        assert unacknowledged is None
+        assert not assoc.aborted
+        assert statuses[0] == ('missing', None)
+        assert statuses[1][0] == 'a' and statuses[1][1].Status == 0
+
+    def test_abort(self, tmp_path):
+        """ a file failing after its first PDU aborts the association and
+        the requests without response are returned"""
+        paths = [write_dicom(tmp_path / ('%s.dcm' % number), number)
+                 for number in range(3)]
+        assoc = FakeAssociation(async_ops=(4, 4))
+        window = store_window(assoc, 4)
+        statuses = []
+        # The first file is sent, the second fails during its dataset
+        window.send_file(0, paths[0])
+        assoc.dul.fail_after = len(assoc.dul.pdus) + 1
+        items = iter([(1, paths[1]), (2, paths[2])])
+        unacknowledged = window.send_all(
+            items, lambda key, status: statuses.append((key, status)))
+        assert unacknowledged == [(0, paths[0])]
+        assert statuses == [(1, None)]
+        assert assoc.aborted
+        assert not window.outstanding
+        # The next file is left to the caller
+        assert next(items) == (2, paths[2])
+        assert assoc._reactor_checkpoint.is_set()
+
+
+class TestNegotiation:
+
+    def test_async_ops_negotiation(self):
+        assert async_ops_negotiation(1) == []
+        item, = async_ops_negotiation(8)
+        assert item.maximum_number_operations_invoked == 8
+        assert item.maximum_number_operations_performed == 1
+
+    def test_negotiated_window(self):
+        """ the window proposed, limited by the peer (0: unlimited)"""
+        assert negotiated_window(FakeAssociation(async_ops=None), 8) == 1
+        assert negotiated_window(FakeAssociation(async_ops=(8, 3)), 8) == 3
+        assert negotiated_window(FakeAssociation(async_ops=(8, 0)), 8) == 8
+        assert negotiated_window(FakeAssociation(async_ops=(8, 5)), 1) == 1
+        assert negotiated_window(FakeAssociation(async_ops=(0, 5)), 0) == 5
+        assert negotiated_window(FakeAssociation(async_ops=(0, 0)), 0) == 1
+
+
+class TestSendAll:
+
+    @staticmethod
+    def send_all(window, keys):
+        """ Send fake files, return the statuses and the maximum number of
+        outstanding requests"""
+        assoc = window.assoc
+        statuses = []
+        outstanding = []
+
+        def send_file(key, dcmpath):
+            outstanding.append(len(window.outstanding))
+            window.outstanding[window.next_msg_id()] = (key, dcmpath)
+        window.send_file = send_file
+        unacknowledged = window.send_all(
+            ((key, '%s.dcm' % key) for key in keys),
+            lambda key, status: statuses.append((key, status)))
+        assert unacknowledged is None
+        assert assoc._reactor_checkpoint.is_set()
+        return statuses, max(outstanding) + 1
+
+    def test_window_limit(self):
+        """ at most window requests without response"""
+        window = store_window(FakeAssociation(async_ops=(3, 3)), 3)
+        statuses, outstanding = self.send_all(window, range(10))
+        assert outstanding == 3
+        assert [key for key, _status in statuses] == list(range(10))
+
+    def test_no_window(self):
+        """ the peer refused the window: one request at a time"""
+        window = store_window(FakeAssociation(async_ops=None), 3)
+        _statuses, outstanding = self.send_all(window, range(5))
+        assert outstanding == 1
+
+    def test_out_of_order(self):
+        """ the responses are matched by Message ID"""
+        assoc = FakeAssociation(async_ops=(4, 4))
+        assoc.dimse.answer = max
+        window = store_window(assoc, 4)
+        statuses, _outstanding = self.send_all(window, range(6))
+        assert sorted(key for key, _status in statuses) == list(range(6))
+        assert [key for key, _status in statuses][:2] == [3, 4]
+        assert all(status.Status == 0 for _key, status in statuses)
+
+    def test_unexpected_response(self):
+        """ a response to an unknown Message ID is ignored"""
+        assoc = FakeAssociation()
+        window = store_window(assoc)
+        answers = iter([999, 1])
+        assoc.dimse.answer = lambda outstanding: next(answers)
+        statuses, _outstanding = self.send_all(window, ['a'])
+        assert [key for key, _status in statuses] == ['a']
+
+    def test_no_response(self):
+        """ no response: the requests and the item taken are given back with
+        an empty status, the next items are not taken"""
+        assoc = FakeAssociation(async_ops=(2, 2))
+        assoc.dimse.answer = lambda outstanding: None
+        window = store_window(assoc, 2)
+        statuses = []
+        items = iter([('a', 'a.dcm'), ('b', 'b.dcm'), ('c', 'c.dcm'),
+                      ('d', 'd.dcm')])
+        window.send_file = lambda key, dcmpath: window.outstanding.update(
+            {window.next_msg_id(): (key, dcmpath)})
+        assert window.send_all(items, lambda key, status: statuses.append(
+            (key, status))) is None
+        assert assoc.no_response
+        assert statuses == [('a', Dataset()), ('b', Dataset()),
+                            ('c', Dataset())]
+        assert not window.outstanding
+        assert list(items) == [('d', 'd.dcm')]
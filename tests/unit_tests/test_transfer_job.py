@@ -0,0 +1,127 @@
+""" Test the transfer jobs and the progress of each uid"""
+import pytest
+
+from sphere.pacs.transfer_job import (
+    STATUS_DONE, STATUS_FAILED, STATUS_PENDING, TransferJob, UidProgress)
+
+
+@pytest.fixture
+def job_path(tmp_path):
+    return str(tmp_path / 'jobs.sqlite')
+
+
+class TestTransferJob:
+
+    def test_start(self, job_path):
+        """ the uids are added once, in their order"""
+        job = TransferJob('store', job_path=job_path)
+        assert job.start(['1.2', '1.1', '1.2']) == ['1.2', '1.1']
+        assert job.summary() == {STATUS_PENDING: 2}
+
+    def test_resume(self, job_path):
+        """ the uids done are skipped, the failed ones are sent again"""
+        job = TransferJob('store', job_path=job_path)
+        job.start(['1.1', '1.2', '1.3'])
+        job.mark('1.1', True)
+        job.mark('1.2', False, 'refused')
+        resumed = TransferJob('store', job.job_id, job_path=job_path)
+        assert resumed.job_id == job.job_id
+        assert resumed.start(['1.1', '1.2', '1.3']) == ['1.2', '1.3']
+
+    def test_max_retries(self, job_path):
+        """ an uid failed max_retries times is not sent again"""
+        job = TransferJob('move', job_path=job_path, max_retries=2)
+        job.start(['1.1', '1.2'])
+        job.mark('1.1', False)
+        assert job.start(['1.1', '1.2']) == ['1.1', '1.2']
+        job.mark_all([('1.1', False, None), ('1.2', True, None)])
+        assert job.start(['1.1', '1.2']) == []
+
+    def test_unknown_job(self, job_path):
+        with pytest.raises(ValueError):
+            TransferJob('store', 'unknown', job_path=job_path)
+
+    def test_finish(self, job_path):
+        """ the job is done if all its uids are done"""
+        job = TransferJob('store', job_path=job_path)
+        job.start(['1.1', '1.2'])
+        job.mark_all([('1.1', True, None), ('1.2', False, 'refused')])
+        job.finish()
+        assert job_status(job) == STATUS_FAILED
+        job.mark('1.2', True)
+        job.finish()
+        assert job_status(job) == STATUS_DONE
+        assert job.summary() == {STATUS_DONE: 2}
+
+
+def job_status(job):
+    """ The status of a job in the jobs file"""
+    with job.connect() as connection:
+        (status,), = connection.execute(
+            "SELECT status FROM transfer_job WHERE id = ?", (job.job_id,))
+    return status
+
+
+class RecordingJob:
+    """ Keep the results recorded"""
+    def __init__(self):
+        self.marked = []
+
+    def mark(self, uid, success, message=None):
+        self.marked.append((uid, success, message))
+
+
+ITEMS = [('1.1', 'a1'), ('1.1', 'a2'), ('1.2', 'b1'), ('1.3', 'c1')]
+
+
+class TestUidProgress:
+
+    def test_results(self):
+        """ done, refused, not answered and not in the database"""
+        progress = UidProgress()
+        assert list(progress.paths(ITEMS)) == ['a1', 'a2', 'b1', 'c1']
+        # A refused file is counted failed before it is acknowledged
+        progress.fail('b1')
+        for position in (0, 1, 2):
+            progress.acknowledge(position)
+        results = {uid: (success, message) for uid, success, message in
+                   progress.results(['1.1', '1.2', '1.3', '1.4'])}
+        assert results == {
+            '1.1': (True, '2 instances, 0 failed'),
+            '1.2': (False, '1 instances, 1 failed'),
+            '1.3': (False, '1 instances, 1 failed'),
+            '1.4': (False, 'Not in the database'),
+        }
+
+    def test_record_when_acknowledged(self):
+        """ the result of an uid is recorded when its paths are all
+        acknowledged and the next uid started"""
+        job = RecordingJob()
+        progress = UidProgress(job=job)
+        paths = progress.paths(ITEMS)
+        next(paths)
+        next(paths)
+        progress.acknowledge(0)
+        progress.acknowledge(1)
+        # The uid may have other paths
+        assert job.marked == []
+        next(paths)
+        assert job.marked == [('1.1', True, '2 instances, 0 failed')]
+        assert next(paths) == 'c1'
+        progress.fail('b1')
+        progress.acknowledge(2)
+        assert job.marked[-1] == ('1.2', False, '1 instances, 1 failed')
+        list(paths)
+        # The results not yet recorded
+        assert progress.results(['1.1', '1.2', '1.3']) == [
+            ('1.3', False, '1 instances, 1 failed')]
+
+    def test_checkpoint(self):
+        """ the paths before the checkpoint were acknowledged before"""
+        job = RecordingJob()
+        progress = UidProgress(start=2, job=job)
+        paths = progress.paths(ITEMS)
+        assert next(paths) == 'a1'
+        assert next(paths) == 'a2'
+        assert next(paths) == 'b1'
+        assert job.marked == [('1.1', True, '2 instances, 0 failed')]
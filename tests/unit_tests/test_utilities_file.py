@@ -0,0 +1,29 @@
+""" Test the AppendBuffer of the module file"""
+import time
+
+from sphere.utilities import file
+from sphere.utilities.file import AppendBuffer
+
+
+class TestAppendBuffer:
+
+    def test_write_batch(self, tmp_path):
+        """ the lines are written when the batch is full"""
+        path = tmp_path / 'uid.txt'
+        buffer = AppendBuffer(str(path), flush_every=2)
+        buffer.write('a')
+        assert not path.exists()
+        buffer.write('b')
+        assert path.read_text() == 'a\nb\n'
+
+    def test_flush_idle(self, tmp_path, monkeypatch):
+        """ the lines of an idle buffer are written by the flush thread"""
+        monkeypatch.setattr(file, 'FLUSH_INTERVAL', 0.05)
+        monkeypatch.setattr(AppendBuffer, 'buffers', {})
+        monkeypatch.setattr(AppendBuffer, 'flusher', None)
+        path = tmp_path / 'uid.txt'
+        AppendBuffer.get(str(path)).write('a')
+        deadline = time.monotonic() + 2
+        while not path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert path.read_text() == 'a\n'
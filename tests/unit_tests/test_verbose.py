@@ -0,0 +1,97 @@
+""" Test the verbose of the quiet mode"""
+import logging
+
+import pytest
+from pydicom.dataset import Dataset
+
+from sphere.logs.verbose import NullVerbose, Verbose
+from sphere.utilities.log_tools import log_dataset
+
+
+def cstore_verbose(verbose, log, ds):
+    """ The verbose and the logs of one cstore_response"""
+    dict_verbose = verbose.init_verbose(context=None, **{
+        'action': 'CSTORE', 'service': 'SCP',
+        'log': 'Start cstore_response', 'aec': 'PACS1'})
+    log_dataset(log, ds)
+    if verbose.verbose_enabled(dict_verbose):
+        verbose.create_verbose(dict_verbose, **{
+            'study_uid': ds.StudyInstanceUID, 'log': 'Get dicom'})
+    for msg in ('Check Association', 'Start create FS Access',
+                'Start store', 'End store'):
+        verbose.create_verbose(dict_verbose, **{'log': msg})
+    verbose.create_verbose(dict_verbose, **{'final_status': 0x0000})
+    return dict_verbose
+
+
+@pytest.fixture
+def quiet():
+    """ The verbose in quiet mode, it must never commit"""
+    verbose = Verbose(ae=None)
+    verbose.console_verbose = 0
+
+    def commit_verbose(verbose_pacs, commit=False):
+        raise AssertionError('The quiet mode committed a verbose')
+    verbose.commit_verbose = commit_verbose
+    return verbose
+
+
+@pytest.fixture
+def info_log():
+    """ A logger without the debug level"""
+    log = logging.getLogger('quiet')
+    log.setLevel(logging.INFO)
+    return log
+
+
+class TestVerbose:
+
+    @staticmethod
+    def dataset():
+        ds = Dataset()  # pylint: disable=invalid-name
+        ds.StudyInstanceUID = '1.2.3'
+        ds.SeriesInstanceUID = '1.2.3.4'
+        ds.SOPInstanceUID = '1.2.3.4.5'
+        return ds
+
+    def test_quiet_mode(self, quiet, info_log):
+        """ the verbose of the quiet mode stays empty"""
+        dict_verbose = cstore_verbose(quiet, info_log, self.dataset())
+        assert isinstance(dict_verbose, NullVerbose)
+        assert not quiet.verbose_enabled(dict_verbose)
+        assert not dict_verbose
+
+    def test_null_verbose(self):
+        """ NullVerbose ignores the values set"""
+        dict_verbose = NullVerbose()
+        dict_verbose['log'] = 'Start store'
+        dict_verbose.update({'success': False}, final_status='0x0000')
+        assert not dict_verbose
+
+    def test_create_verbose_untouched(self, quiet):
+        """ create_verbose does not read the final status of the quiet
+        mode (an unknown code is not looked up)"""
+        dict_verbose = NullVerbose()
+        quiet.create_verbose(dict_verbose, final_status=0x1234, log='End')
+        assert not dict_verbose
+
+    def test_log_payload_not_built(self, info_log):
+        """ without the debug level the dataset is not read"""
+        log_dataset(info_log, Dataset())
+        info_log.setLevel(logging.DEBUG)
+        with pytest.raises(AttributeError):
+            log_dataset(info_log, Dataset())
+
+    def test_verbose_mode(self):
+        """ the verbose mode keeps the values"""
+        verbose = Verbose(ae=None)
+        verbose.console_verbose = 1
+        verbose.ae = type('AE', (), {'ae_title': b'SPHERE'})
+        committed = []
+        verbose.commit_verbose = lambda verbose_pacs, commit=False: \
+            committed.append(commit)
+        dict_verbose = verbose.init_verbose(action='CSTORE', service='SCP')
+        verbose.create_verbose(dict_verbose, log='Start store')
+        assert verbose.verbose_enabled(dict_verbose)
+        assert dict_verbose['log'] == 'Start store'
+        assert committed == [False, False]